@@ -2,6 +2,7 @@
 API dependencies
 """
 from typing import Generator
+from fastapi import Request
 from app.db.session import SessionLocal
 
 
@@ -12,3 +13,24 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+def get_query_engine(request: Request):
+    """
+    App-lifetime QueryEngine (created in the lifespan, see app.main). Built
+    on first use when the lifespan did not run (e.g. a test client).
+    """
+    state = request.app.state
+    if getattr(state, "query_engine", None) is None:
+        from app.services.query_engine import QueryEngine
+        state.query_engine = QueryEngine(vector_store=get_vector_store(request))
+    return state.query_engine
+
+
+def get_vector_store(request: Request):
+    """App-lifetime VectorStore (created in the lifespan, see app.main), or built on first use."""
+    state = request.app.state
+    if getattr(state, "vector_store", None) is None:
+        from app.services.vector_store import VectorStore
+        state.vector_store = VectorStore()
+    return state.vector_store
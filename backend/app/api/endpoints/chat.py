@@ -1,23 +1,61 @@
 """
 Chat API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Awaitable, Dict, Any, List, Optional, Tuple, TypeVar
+import asyncio
+import json
+import time
 import uuid
 from datetime import datetime
-from app.db.session import get_db
+from app.core.config import settings
+from app.db.session import SessionLocal, get_db
+from app.api.deps import get_query_engine, get_vector_store
 from app.schemas.chat import (
     ChatQueryRequest,
     ChatQueryResponse,
+    BatchSearchRequest,
+    BatchSearchResponse,
     ConversationCreate,
     Conversation,
     ChatMessage
 )
 from app.services.query_engine import QueryEngine
+from app.services.vector_store import VectorStore
+
+# Upper bounds for one batch search request
+MAX_BATCH_QUERIES = 100
+MAX_BATCH_K = 50
+
+# How often a running query checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+T = TypeVar("T")
 
 router = APIRouter()
 
+
+class ClientDisconnected(Exception):
+    """The client went away before its query finished"""
+
+
+async def _cancel_on_disconnect(http_request: Request, work: Awaitable[T]) -> T:
+    """Await work, cancelling it (and the LLM call inside) if the client disconnects."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        task.cancel()
+
 # In-memory conversation storage (replace with Redis/DB in production)
 conversations: Dict[str, Dict[str, Any]] = {}
 
@@ -25,41 +63,181 @@ conversations: Dict[str, Dict[str, Any]] = {}
 @router.post("/query", response_model=ChatQueryResponse)
 async def process_chat_query(
     request: ChatQueryRequest,
-    db: Session = Depends(get_db)
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    query_engine: QueryEngine = Depends(get_query_engine)
 ):
     """Process a chat query using RAG"""
     
     # Get conversation history if conversation_id provided
-    conversation_history = []
-    if request.conversation_id and request.conversation_id in conversations:
-        conversation_history = conversations[request.conversation_id]["messages"]
-    
-    # Process query
-    query_engine = QueryEngine(db)
-    response = await query_engine.process_query(
-        query=request.query,
-        fund_id=request.fund_id,
-        conversation_history=conversation_history
-    )
+    conversation_history, conversation_summary = _conversation_context(request.conversation_id)
     
-    # Update conversation history
-    if request.conversation_id:
-        if request.conversation_id not in conversations:
-            conversations[request.conversation_id] = {
-                "fund_id": request.fund_id,
-                "messages": [],
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-        
-        conversations[request.conversation_id]["messages"].extend([
-            {"role": "user", "content": request.query, "timestamp": datetime.utcnow()},
-            {"role": "assistant", "content": response["answer"], "timestamp": datetime.utcnow()}
-        ])
-        conversations[request.conversation_id]["updated_at"] = datetime.utcnow()
+    # Process query; abandoned if the client disconnects meanwhile
+    try:
+        response = await _cancel_on_disconnect(http_request, query_engine.process_query(
+            db=db,
+            query=request.query,
+            fund_id=request.fund_id,
+            conversation_history=conversation_history,
+            filters=request.filters,
+            use_cache=request.use_cache,
+            conversation_summary=conversation_summary,
+            summarize=request.summarize,
+            debug=request.debug
+        ))
+    except ClientDisconnected:
+        # Nobody is listening; 499 is the conventional "client closed request" status
+        return Response(status_code=499)
     
+    _record_exchange(request, response["answer"])
+    # Fold turns leaving the verbatim window into the summary, after responding
+    background_tasks.add_task(_compact_conversation, request.conversation_id, query_engine)
     return ChatQueryResponse(**response)
 
+# POST /query/stream — same as /query, as server-sent events
+@router.post("/query/stream")
+async def stream_chat_query(
+    request: ChatQueryRequest,
+    query_engine: QueryEngine = Depends(get_query_engine)
+):
+    """
+    Process a chat query, streaming the result as server-sent events:
+    "sources" (sources and metrics, once retrieval is done), "token" for each
+    piece of the answer, "error" if generation fails, and "done" with the
+    full answer (and whether it came from the answer cache or failed).
+    Closing the connection cancels the generation.
+    """
+    conversation_history, conversation_summary = _conversation_context(request.conversation_id)
+
+    async def events():
+        # The stream outlives the request's dependencies: use its own session
+        db = SessionLocal()
+        try:
+            async for event, data in query_engine.stream_query(
+                db=db,
+                query=request.query,
+                fund_id=request.fund_id,
+                conversation_history=conversation_history,
+                filters=request.filters,
+                use_cache=request.use_cache,
+                conversation_summary=conversation_summary,
+                summarize=request.summarize,
+                debug=request.debug
+            ):
+                if event == "done":
+                    # Like /query, a failed generation is recorded as its error,
+                    # not as the truncated answer
+                    _record_exchange(request, data["error"] if data.get("failed") else data["answer"])
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # No caching, and no proxy buffering (nginx) in front of the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_compact_conversation, request.conversation_id, query_engine)
+    )
+
+
+def _conversation_context(conversation_id: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """The conversation's turns not yet summarized, and the rolling summary of the older ones."""
+    conv = conversations.get(conversation_id) if conversation_id else None
+    if conv is None:
+        return [], None
+    return conv["messages"][conv.get("summarized", 0):], conv.get("summary")
+
+
+async def _compact_conversation(conversation_id: Optional[str], query_engine: QueryEngine) -> None:
+    """
+    Keep the last CONVERSATION_RECENT_TURNS turns verbatim and fold older
+    ones into the conversation's rolling summary, so prompts stay the same
+    size however long the conversation gets.
+    """
+    conv = conversations.get(conversation_id) if conversation_id else None
+    if conv is None or conv.get("compacting"):
+        return
+    summarized = conv.get("summarized", 0)
+    older = conv["messages"][summarized:len(conv["messages"]) - 2 * settings.CONVERSATION_RECENT_TURNS]
+    if not older:
+        return
+
+    conv["compacting"] = True
+    try:
+        summary = await query_engine.summarize_conversation(conv.get("summary"), older)
+        if summary is not None:
+            conv["summary"] = summary
+            conv["summarized"] = summarized + len(older)
+    finally:
+        conv["compacting"] = False
+
+
+def _record_exchange(request: ChatQueryRequest, answer: str) -> None:
+    """Append the question and answer to the request's conversation, if any."""
+    if not request.conversation_id:
+        return
+    if request.conversation_id not in conversations:
+        conversations[request.conversation_id] = {
+            "fund_id": request.fund_id,
+            "messages": [],
+            "summary": None,
+            "summarized": 0,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }
+
+    conversations[request.conversation_id]["messages"].extend([
+        {"role": "user", "content": request.query, "timestamp": datetime.utcnow()},
+        {"role": "assistant", "content": answer, "timestamp": datetime.utcnow()}
+    ])
+    conversations[request.conversation_id]["updated_at"] = datetime.utcnow()
+
+# POST /search/batch — retrieval only, many queries in one pass
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def batch_search(
+    request: BatchSearchRequest,
+    db: Session = Depends(get_db),
+    vector_store: VectorStore = Depends(get_vector_store)
+):
+    """Retrieve the top-k chunks for many queries (e.g. a standard question set) at once"""
+    if not request.queries or len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Provide 1 to {MAX_BATCH_QUERIES} queries")
+    if not 1 <= request.k <= MAX_BATCH_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {MAX_BATCH_K}")
+
+    start_time = time.time()
+    filter_metadata = dict(request.filters or {})
+    if request.fund_id:
+        filter_metadata["fund_id"] = request.fund_id
+
+    results = await vector_store.batch_similarity_search(
+        request.queries, k=request.k, filter_metadata=filter_metadata, db=db
+    )
+    return {
+        "results": [
+            {
+                "query": query,
+                "sources": [
+                    {
+                        "content": doc["content"],
+                        "score": doc.get("score"),
+                        "metadata": {
+                            "chunk_id": doc["id"],
+                            "document_id": doc.get("document_id"),
+                            "page": doc.get("page"),
+                            "pages": doc.get("pages"),
+                        },
+                    }
+                    for doc in docs
+                ],
+            }
+            for query, docs in zip(request.queries, results)
+        ],
+        "processing_time": round(time.time() - start_time, 2),
+    }
+
 # POST /conversations — create new conversation
 @router.post("/conversations", response_model=Conversation)
 async def create_conversation(request: ConversationCreate):
@@ -69,6 +247,9 @@ async def create_conversation(request: ConversationCreate):
     conversations[conversation_id] = {
         "fund_id": request.fund_id,
         "messages": [],
+        # Rolling summary of messages[:summarized] (see _compact_conversation)
+        "summary": None,
+        "summarized": 0,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
@@ -10,7 +10,7 @@ import io, re
 import shutil
 from datetime import datetime
 from app.db.session import get_db
-from app.models.document import Document
+from app.models.document import Document, DocumentChunk, DocumentTable
 from app.models.transaction import CapitalCall
 from app.models.transaction import Distribution
 from app.models.transaction import Adjustment
@@ -24,6 +24,9 @@ from app.services.document_processor import DocumentProcessor
 from app.services.table_parser import TableParser
 from app.core.config import settings
 from app.tasks.document_tasks import process_document_task
+from app.services import vector_index
+from app.services.vector_backends import refresh_active_index
+from app.services.retrieval_cache import bump_index_version, bump_transactions_version
 
 router = APIRouter()
 
@@ -87,6 +90,10 @@ async def upload_document(
         raise HTTPException(status_code=400, detail="No text can be extraced from PDF.")
 
     text = "\n".join(text_pages)
+    # Default fund when none is given; the document, its chunks and the
+    # imported transactions all belong to the same fund
+    fund_id = fund_id or 1
+
     # Create document record
     document = Document(
         fund_id=fund_id,
@@ -103,7 +110,7 @@ async def upload_document(
         DocumentProcessor(db).process_document,
         file_path,
         document.id,
-        fund_id or 1  # Default fund_id if not provided
+        fund_id
     )
 
     capital_calls = re.findall(r"(\d{4}-\d{2}-\d{2}).*?Call\s\d.*?\$([\d,]+)", text)
@@ -144,6 +151,8 @@ async def upload_document(
         ))
 
     db.commit()
+    if capital_calls or distributions or adjustments:
+        bump_transactions_version(fund_id)
 
 
     return DocumentUploadResponse(
@@ -229,7 +238,11 @@ async def list_documents(
 
 
 @router.delete("/{document_id}")
-async def delete_document(document_id: int, db: Session = Depends(get_db)):
+async def delete_document(
+    document_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
     """Delete a document"""
     document = db.query(Document).filter(Document.id == document_id).first()
     
@@ -240,8 +253,22 @@ async def delete_document(document_id: int, db: Session = Depends(get_db)):
     if document.file_path and os.path.exists(document.file_path):
         os.remove(document.file_path)
     
-    # Delete database record
+    # Chunks carry the fund they were indexed under (older documents may
+    # have none recorded themselves)
+    fund_ids = {
+        row.fund_id for row in
+        db.query(DocumentChunk.fund_id).filter(DocumentChunk.document_id == document_id).distinct()
+    }
+    fund_ids.add(document.fund_id)
+
+    # Delete chunks (their embeddings cascade), tables and the document record
+    db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete(synchronize_session=False)
+    db.query(DocumentTable).filter(DocumentTable.document_id == document_id).delete(synchronize_session=False)
     db.delete(document)
     db.commit()
+
+    vector_index.remove_document(document_id)
+    bump_index_version(*fund_ids)
+    background_tasks.add_task(refresh_active_index)
     
     return {"message": "Document deleted successfully"}
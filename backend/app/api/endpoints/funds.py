@@ -15,6 +15,7 @@ from app.schemas.transaction import (
     TransactionList
 )
 from app.services.metrics_calculator import MetricsCalculator
+from app.services.retrieval_cache import bump_index_version, bump_transactions_version
 
 router = APIRouter()
 
@@ -100,6 +101,8 @@ async def delete_fund(fund_id: int, db: Session = Depends(get_db)):
     
     db.delete(fund)
     db.commit()
+    bump_index_version(fund_id)
+    bump_transactions_version(fund_id)
     
     return {"message": "Fund deleted successfully"}
 
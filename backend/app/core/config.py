@@ -33,9 +33,22 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""
     OPENAI_MODEL: str = "gpt-4-turbo-preview"
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    OPENAI_BASE_URL: str = ""  # empty = api.openai.com; point at app.scripts.stub_server offline
     
     # Anthropic (optional)
     ANTHROPIC_API_KEY: str = ""
+
+    # LLM calls: generations in flight per worker (others queue), and the
+    # deadline of one call including its time in the queue
+    LLM_MAX_CONCURRENCY: int = 4
+    LLM_TIMEOUT_SECONDS: float = 120.0
+
+    # Prompt size: token budget for metrics, retrieved chunks and conversation
+    # (filled in that order); conversations keep the last few turns verbatim
+    # and fold older ones into a rolling summary of bounded length
+    PROMPT_TOKEN_BUDGET: int = 3000
+    CONVERSATION_RECENT_TURNS: int = 4
+    CONVERSATION_SUMMARY_WORDS: int = 150
     
     # Vector Store
     VECTOR_STORE_PATH: str = "./vector_store"
@@ -48,11 +61,71 @@ class Settings(BaseSettings):
     # Document Processing
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
-    
+    # Near-duplicate chunks of a document (repeated headers, footers,
+    # disclaimers) are stored once: MinHash over word 3-shingles, LSH bands
+    CHUNK_DEDUP_ENABLED: bool = True
+    CHUNK_DEDUP_THRESHOLD: float = 0.9
+    CHUNK_DEDUP_NUM_PERM: int = 128
+    CHUNK_DEDUP_BANDS: int = 32
+
+    # Embeddings
+    # Model, reduction and dimension used when bootstrapping the first embedding
+    # version; afterwards the active row in embedding_versions is authoritative.
+    EMBEDDING_MODEL: str = "intfloat/multilingual-e5-base"
+    EMBEDDING_BATCH_SIZE: int = 64
+    # Optional reduction of the 768-dim E5 vectors: "none", "truncate" or "pca".
+    # Changing it requires re-embedding existing chunks (app.scripts.reindex_embeddings).
+    EMBEDDING_REDUCTION: str = "none"
+    EMBEDDING_DIMENSION: int = 256
+    # OpenAI embedding client limits
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_MAX_BATCH_TOKENS: int = 100000
+    EMBEDDING_MAX_BATCH_SIZE: int = 2048
+    EMBEDDING_MAX_RETRIES: int = 6
+
     # RAG
     TOP_K_RESULTS: int = 5
     SIMILARITY_THRESHOLD: float = 0.7
 
+    # Vector search backend: "pgvector" (HNSW in PostgreSQL), "memory" (exact
+    # search over an in-process float32 matrix), "mmap" (exact search over a
+    # memory-mapped file in VECTOR_STORE_PATH, shared by all workers),
+    # "faiss_ivf" or "faiss_hnsw" (FAISS index in FAISS_INDEX_PATH), "int8" or
+    # "binary" (quantized in-process codes, candidates rescored exactly)
+    VECTOR_SEARCH_BACKEND: str = "pgvector"
+    VECTOR_INDEX_SYNC_SECONDS: int = 30
+    # In-process indexes are snapshotted to VECTOR_STORE_PATH/snapshots this
+    # often (and at shutdown) so restarts replay only recent changes; 0 = off
+    VECTOR_INDEX_SNAPSHOT_SECONDS: int = 600
+    # Quantized backends: candidates rescored against full-precision vectors
+    QUANTIZED_RESCORE_CANDIDATES: int = 200
+
+    # HNSW index (pgvector and FAISS)
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    HNSW_EF_SEARCH: int = 100
+    # FAISS IVF lists probed per query
+    FAISS_IVF_NPROBE: int = 16
+
+    # Retrieval mode: "vector", "hybrid" (vector + full-text, fused with
+    # reciprocal rank fusion) or "prefilter" (full-text hits restrict the
+    # vector candidates)
+    RETRIEVAL_MODE: str = "vector"
+    HYBRID_CANDIDATES: int = 50
+    RRF_K: int = 60
+    LEXICAL_PREFILTER_LIMIT: int = 1000
+
+    # Retrieval result cache (in-process LRU in front of Redis)
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_LRU_SIZE: int = 1024
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 86400
+
+    # Answer cache: QueryEngine answers per (normalized question, fund, data
+    # version, model, prompt version); requests can opt out with use_cache=false
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_LRU_SIZE: int = 256
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+
     model_config = ConfigDict(
         env_file=".env",
         case_sensitive=True
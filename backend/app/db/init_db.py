@@ -7,6 +7,7 @@ from app.db.session import engine
 from app.models.fund import Fund  # noqa: F401
 from app.models.transaction import CapitalCall, Distribution, Adjustment  # noqa: F401
 from app.models.document import Document  # noqa: F401
+from app.models.embedding import EmbeddingVersion, ChunkEmbedding  # noqa: F401
 
 
 def init_db():
@@ -9,6 +9,7 @@ from sqlalchemy import create_engine
 from alembic import context
 
 import app.models.document
+import app.models.embedding
 import app.models.fund
 
 
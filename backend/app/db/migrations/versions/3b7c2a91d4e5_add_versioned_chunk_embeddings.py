@@ -0,0 +1,84 @@
+"""add versioned chunk embeddings
+
+Revision ID: 3b7c2a91d4e5
+Revises: f84934a9120a
+Create Date: 2026-10-19 09:12:40.512031
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7c2a91d4e5'
+down_revision: Union[str, None] = 'f84934a9120a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('embedding_versions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('model_name', sa.String(length=255), nullable=False),
+    sa.Column('reduction', sa.String(length=20), nullable=False),
+    sa.Column('dimension', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('activated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_embedding_versions_id'), 'embedding_versions', ['id'], unique=False)
+    op.create_index('uq_embedding_versions_active', 'embedding_versions', ['status'], unique=True,
+                    postgresql_where=sa.text("status = 'active'"))
+
+    op.create_table('chunk_embeddings',
+    sa.Column('chunk_id', sa.Integer(), nullable=False),
+    sa.Column('version_id', sa.Integer(), nullable=False),
+    sa.Column('embedding', postgresql.ARRAY(sa.DOUBLE_PRECISION()), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['chunk_id'], ['document_chunks.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['version_id'], ['embedding_versions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('chunk_id', 'version_id')
+    )
+    op.create_index('ix_chunk_embeddings_version_id', 'chunk_embeddings', ['version_id'], unique=False)
+
+    # Existing vectors become the first, active version
+    op.execute(sa.text("""
+        INSERT INTO embedding_versions (name, model_name, reduction, dimension, status, created_at, activated_at)
+        SELECT 'default', :model_name, :reduction,
+               COALESCE((SELECT array_length(embedding, 1) FROM document_chunks
+                         WHERE embedding IS NOT NULL LIMIT 1), 768),
+               'active', now(), now()
+    """).bindparams(
+        model_name=settings.EMBEDDING_MODEL,
+        reduction=settings.EMBEDDING_REDUCTION,
+    ))
+    op.execute("""
+        INSERT INTO chunk_embeddings (chunk_id, version_id, embedding, updated_at)
+        SELECT dc.id, v.id, dc.embedding, now()
+        FROM document_chunks dc, embedding_versions v
+        WHERE dc.embedding IS NOT NULL AND v.name = 'default'
+    """)
+    op.drop_column('document_chunks', 'embedding')
+
+
+def downgrade() -> None:
+    op.add_column('document_chunks', sa.Column('embedding', postgresql.ARRAY(sa.DOUBLE_PRECISION()), nullable=True))
+    op.execute("""
+        UPDATE document_chunks dc
+        SET embedding = ce.embedding
+        FROM chunk_embeddings ce
+        JOIN embedding_versions v ON v.id = ce.version_id AND v.status = 'active'
+        WHERE ce.chunk_id = dc.id
+    """)
+    op.drop_index('ix_chunk_embeddings_version_id', table_name='chunk_embeddings')
+    op.drop_table('chunk_embeddings')
+    op.drop_index('uq_embedding_versions_active', table_name='embedding_versions')
+    op.drop_index(op.f('ix_embedding_versions_id'), table_name='embedding_versions')
+    op.drop_table('embedding_versions')
@@ -0,0 +1,36 @@
+"""document chunks full-text search column with gin index
+
+Revision ID: 4a9e7d3c1b58
+Revises: c5d2e8b1f346
+Create Date: 2026-10-19 16:03:18.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a9e7d3c1b58'
+down_revision: Union[str, None] = 'c5d2e8b1f346'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('document_chunks', sa.Column(
+        'content_tsv', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('english', coalesce(content, ''))", persisted=True),
+        nullable=True,
+    ))
+    op.create_index(
+        'ix_document_chunks_content_tsv', 'document_chunks', ['content_tsv'],
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_document_chunks_content_tsv', table_name='document_chunks')
+    op.drop_column('document_chunks', 'content_tsv')
@@ -0,0 +1,27 @@
+"""document chunks pages of deduplicated chunks
+
+Revision ID: 7b3f9a2e6d14
+Revises: 4a9e7d3c1b58
+Create Date: 2026-10-19 18:42:07.315902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b3f9a2e6d14'
+down_revision: Union[str, None] = '4a9e7d3c1b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('document_chunks', sa.Column('pages', postgresql.ARRAY(sa.Integer()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('document_chunks', 'pages')
@@ -0,0 +1,46 @@
+"""chunk embeddings as pgvector with hnsw index
+
+Revision ID: 8e1f4c6a2d07
+Revises: 3b7c2a91d4e5
+Create Date: 2026-10-19 13:47:02.184455
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e1f4c6a2d07'
+down_revision: Union[str, None] = '3b7c2a91d4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _versions():
+    return op.get_bind().execute(sa.text("SELECT id, dimension FROM embedding_versions")).fetchall()
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.execute("ALTER TABLE chunk_embeddings ALTER COLUMN embedding TYPE vector USING embedding::vector")
+
+    # One partial HNSW (cosine) index per version, on the typed expression
+    # VectorStore orders by: embedding::vector(<dimension>) <=> :query
+    for version in _versions():
+        op.execute(
+            f"CREATE INDEX ix_chunk_embeddings_hnsw_v{version.id} ON chunk_embeddings "
+            f"USING hnsw ((embedding::vector({version.dimension})) vector_cosine_ops) "
+            f"WITH (m = 16, ef_construction = 64) "
+            f"WHERE version_id = {version.id}"
+        )
+
+
+def downgrade() -> None:
+    for version in _versions():
+        op.execute(f"DROP INDEX IF EXISTS ix_chunk_embeddings_hnsw_v{version.id}")
+    op.execute(
+        "ALTER TABLE chunk_embeddings ALTER COLUMN embedding TYPE double precision[] "
+        "USING embedding::real[]::double precision[]"
+    )
@@ -0,0 +1,47 @@
+"""document chunk search filters: fund_id, chunk_type, table_type
+
+Revision ID: c5d2e8b1f346
+Revises: 8e1f4c6a2d07
+Create Date: 2026-10-19 15:12:40.520913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d2e8b1f346'
+down_revision: Union[str, None] = '8e1f4c6a2d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('document_chunks', sa.Column('fund_id', sa.Integer(), nullable=True))
+    op.add_column('document_chunks', sa.Column(
+        'chunk_type', sa.String(length=50), nullable=False, server_default='text'
+    ))
+    op.create_foreign_key(
+        'document_chunks_fund_id_fkey', 'document_chunks', 'funds', ['fund_id'], ['id']
+    )
+    op.add_column('document_tables', sa.Column('table_type', sa.String(length=50), nullable=True))
+
+    # Denormalize the owning fund onto existing chunks
+    op.execute(
+        "UPDATE document_chunks dc SET fund_id = d.fund_id "
+        "FROM documents d WHERE d.id = dc.document_id"
+    )
+
+    op.create_index('ix_document_chunks_fund_id_page', 'document_chunks', ['fund_id', 'page'])
+    op.create_index('ix_document_chunks_document_id_page', 'document_chunks', ['document_id', 'page'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_document_chunks_document_id_page', table_name='document_chunks')
+    op.drop_index('ix_document_chunks_fund_id_page', table_name='document_chunks')
+    op.drop_column('document_tables', 'table_type')
+    op.drop_constraint('document_chunks_fund_id_fkey', 'document_chunks', type_='foreignkey')
+    op.drop_column('document_chunks', 'chunk_type')
+    op.drop_column('document_chunks', 'fund_id')
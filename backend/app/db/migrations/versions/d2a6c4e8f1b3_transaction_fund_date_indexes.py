@@ -0,0 +1,30 @@
+"""transaction (fund_id, date) indexes for listings
+
+Revision ID: d2a6c4e8f1b3
+Revises: 7b3f9a2e6d14
+Create Date: 2026-10-19 21:05:33.184276
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a6c4e8f1b3'
+down_revision: Union[str, None] = '7b3f9a2e6d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_capital_calls_fund_id_call_date', 'capital_calls', ['fund_id', 'call_date'])
+    op.create_index('ix_distributions_fund_id_distribution_date', 'distributions', ['fund_id', 'distribution_date'])
+    op.create_index('ix_adjustments_fund_id_adjustment_date', 'adjustments', ['fund_id', 'adjustment_date'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_adjustments_fund_id_adjustment_date', table_name='adjustments')
+    op.drop_index('ix_distributions_fund_id_distribution_date', table_name='distributions')
+    op.drop_index('ix_capital_calls_fund_id_call_date', table_name='capital_calls')
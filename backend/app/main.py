@@ -1,11 +1,35 @@
 """
 FastAPI main application entry point
 """
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.endpoints import documents, funds, chat, metrics
 from app.api.routes import document_routes
+from app.services.query_engine import QueryEngine
+from app.services.vector_index import save_index_snapshots
+from app.services.vector_store import VectorStore
+
+try:
+    from prometheus_client import make_asgi_app
+except ImportError:  # optional: no /metrics endpoint without it
+    make_asgi_app = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the long-lived services once per worker, before serving requests."""
+    app.state.vector_store = VectorStore()
+    # Embedding model and search index (from its snapshot, for in-process backends)
+    await asyncio.to_thread(app.state.vector_store.warm_up)
+    app.state.query_engine = QueryEngine(vector_store=app.state.vector_store)
+    yield
+    await app.state.query_engine.aclose()
+    # Snapshot in-process indexes so the next start only replays recent changes
+    await asyncio.to_thread(save_index_snapshots)
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -13,6 +37,7 @@ app = FastAPI(
     description="Fund Performance Analysis System API",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -31,6 +56,10 @@ app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
 app.include_router(document_routes.router, prefix="/api/document_routes", tags=["document_routes"])
 
+if make_asgi_app is not None:
+    # Prometheus scrape endpoint: chat pipeline stage histograms (app.services.pipeline_timings)
+    app.mount("/metrics", make_asgi_app())
+
 
 @app.get("/")
 async def root():
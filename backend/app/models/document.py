@@ -1,8 +1,8 @@
 """
 Document database model
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
-from sqlalchemy.dialects.postgresql import ARRAY, DOUBLE_PRECISION
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, Computed
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base import Base
@@ -30,12 +30,28 @@ class DocumentChunk(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"))
+    # Copied from documents.fund_id so fund-scoped search needs no join
+    fund_id = Column(Integer, ForeignKey("funds.id"))
     page = Column(Integer)
+    # Every page a near-duplicate of this chunk appears on (set when the
+    # ingest dedup merged several chunks into this one; page is the first)
+    pages = Column(ARRAY(Integer))
+    chunk_type = Column(String(50), nullable=False, default="text")  # text, or the table type
     content = Column(Text)
-    embedding = Column(ARRAY(DOUBLE_PRECISION))
+    # Full-text search vector for lexical/hybrid retrieval
+    content_tsv = Column(
+        TSVECTOR, Computed("to_tsvector('english', coalesce(content, ''))", persisted=True)
+    )
+    # Embeddings live in chunk_embeddings, one row per embedding version
 
     document = relationship("Document", backref="chunks")
 
+    __table_args__ = (
+        Index("ix_document_chunks_fund_id_page", "fund_id", "page"),
+        Index("ix_document_chunks_document_id_page", "document_id", "page"),
+        Index("ix_document_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
+
 
 class DocumentTable(Base):
     """Store extracted tables from documents"""
@@ -44,6 +60,7 @@ class DocumentTable(Base):
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"))
     page = Column(Integer)
+    table_type = Column(String(50))  # capital_call, distribution, adjustment, unknown
     table_data = Column(Text)
 
     document = relationship("Document", backref="tables")
\ No newline at end of file
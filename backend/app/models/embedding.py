@@ -0,0 +1,50 @@
+"""
+Embedding version database models
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, text
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.db.base import Base
+
+
+class EmbeddingVersion(Base):
+    """An embedding model configuration whose vectors are stored side by side with others"""
+
+    __tablename__ = "embedding_versions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False, unique=True)
+    model_name = Column(String(255), nullable=False)
+    reduction = Column(String(20), nullable=False, default="none")  # none, truncate, pca
+    dimension = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="building")  # building, active, retired
+    created_at = Column(DateTime, default=datetime.utcnow)
+    activated_at = Column(DateTime)
+
+    __table_args__ = (
+        # At most one version serves queries at any time
+        Index(
+            "uq_embedding_versions_active", "status",
+            unique=True, postgresql_where=text("status = 'active'"),
+        ),
+    )
+
+
+class ChunkEmbedding(Base):
+    """Embedding of one document chunk under one embedding version"""
+
+    __tablename__ = "chunk_embeddings"
+
+    chunk_id = Column(Integer, ForeignKey("document_chunks.id", ondelete="CASCADE"), primary_key=True)
+    version_id = Column(Integer, ForeignKey("embedding_versions.id", ondelete="CASCADE"), primary_key=True)
+    # Untyped vector so versions of different dimensions share the table; each
+    # version gets a partial HNSW index on embedding::vector(<dimension>)
+    embedding = Column(Vector(), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    version = relationship("EmbeddingVersion")
+
+    __table_args__ = (
+        Index("ix_chunk_embeddings_version_id", "version_id"),
+    )
@@ -1,7 +1,7 @@
 """
 Transaction database models (Capital Calls, Distributions, Adjustments)
 """
-from sqlalchemy import Column, Integer, String, Date, Numeric, Boolean, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, Numeric, Boolean, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base import Base
@@ -11,6 +11,10 @@ class CapitalCall(Base):
     """Capital Call model"""
     
     __tablename__ = "capital_calls"
+    __table_args__ = (
+        # Per-fund listings and cash flows in date order
+        Index("ix_capital_calls_fund_id_call_date", "fund_id", "call_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     fund_id = Column(Integer, ForeignKey("funds.id"), nullable=False)
@@ -28,6 +32,10 @@ class Distribution(Base):
     """Distribution model"""
     
     __tablename__ = "distributions"
+    __table_args__ = (
+        # Per-fund listings and cash flows in date order
+        Index("ix_distributions_fund_id_distribution_date", "fund_id", "distribution_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     fund_id = Column(Integer, ForeignKey("funds.id"), nullable=False)
@@ -46,6 +54,10 @@ class Adjustment(Base):
     """Adjustment model"""
     
     __tablename__ = "adjustments"
+    __table_args__ = (
+        # Per-fund listings and cash flows in date order
+        Index("ix_adjustments_fund_id_adjustment_date", "fund_id", "adjustment_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     fund_id = Column(Integer, ForeignKey("funds.id"), nullable=False)
@@ -18,6 +18,14 @@ class ChatQueryRequest(BaseModel):
     query: str
     fund_id: Optional[int] = None
     conversation_id: Optional[str] = None
+    # Extra retrieval filters: document_id, page_from, page_to, table_type
+    filters: Optional[Dict[str, Any]] = None
+    # False to skip the answer cache and always generate a fresh answer
+    use_cache: bool = True
+    # True to add a short LLM summary to transaction listings
+    summarize: bool = False
+    # True to return per-stage timings (response "timings")
+    debug: bool = False
 
 
 class SourceDocument(BaseModel):
@@ -33,6 +41,34 @@ class ChatQueryResponse(BaseModel):
     sources: List[SourceDocument] = []
     metrics: Optional[Dict[str, Any]] = None
     processing_time: Optional[float] = None
+    # Calculation breakdown per metric, for metric questions answered from SQL
+    calculation: Optional[Dict[str, Any]] = None
+    # Matching rows, count and total, for transaction listings answered from SQL
+    transactions: Optional[Dict[str, Any]] = None
+    # True when the answer came from the answer cache
+    cached: bool = False
+    # Per-stage durations (ms), intent and token counts, when requested with debug
+    timings: Optional[Dict[str, Any]] = None
+
+
+class BatchSearchRequest(BaseModel):
+    """Batch retrieval request: many queries against the same scope"""
+    queries: List[str]
+    fund_id: Optional[int] = None
+    filters: Optional[Dict[str, Any]] = None
+    k: int = 5
+
+
+class BatchSearchResult(BaseModel):
+    """Retrieved chunks for one query of a batch"""
+    query: str
+    sources: List[SourceDocument] = []
+
+
+class BatchSearchResponse(BaseModel):
+    """Batch retrieval response, results in query order"""
+    results: List[BatchSearchResult] = []
+    processing_time: Optional[float] = None
 
 
 class ConversationCreate(BaseModel):
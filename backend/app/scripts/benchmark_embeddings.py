@@ -0,0 +1,47 @@
+"""
+Throughput benchmark for the OpenAI embedding client
+
+Runs EmbeddingService against OPENAI_BASE_URL (or --base-url), normally the
+local stub from app.scripts.stub_server, and reports texts/s and retries.
+
+Usage:
+    python -m app.scripts.benchmark_embeddings --base-url http://localhost:8100/v1 --texts 20000
+"""
+import argparse
+import asyncio
+import time
+
+from app.services.embedding_service import EmbeddingService
+
+
+async def run(base_url: str, texts: int, concurrency: int, batch_tokens: int) -> None:
+    inputs = [f"Capital call {i} for fund {i % 37}: notice of drawdown, amount ${i * 1000:,}" for i in range(texts)]
+    service = EmbeddingService(
+        base_url=base_url,
+        max_concurrency=concurrency,
+        max_batch_tokens=batch_tokens,
+    )
+    try:
+        start = time.perf_counter()
+        embeddings = await service.generate_embeddings(inputs)
+        elapsed = time.perf_counter() - start
+    finally:
+        await service.close()
+
+    assert len(embeddings) == len(inputs)
+    print(f"{len(inputs)} texts in {elapsed:.2f}s ({len(inputs) / elapsed:,.0f} texts/s), "
+          f"{service.stats['requests']} requests, {service.stats['retries']} retries")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embedding client throughput benchmark")
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--texts", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-tokens", type=int, default=8000)
+    args = parser.parse_args()
+    asyncio.run(run(args.base_url, args.texts, args.concurrency, args.batch_tokens))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Recall / latency benchmark for the in-process vector search backends
+
+Generates a synthetic corpus of clustered, L2-normalized vectors per size,
+computes exact ground truth, and reports for every index configuration:
+build time, index memory, recall@k against exact search, and single-query
+QPS (the serving pattern: one query per request).
+
+    exact       InMemoryVectorIndex (memory / mmap backends)
+    ivf         FAISS IVF-Flat, swept over --nprobe
+    hnsw        FAISS HNSW, swept over --ef-search
+    int8        QuantizedVectorIndex int8 codes + exact rescoring, swept over --rescore
+    binary      QuantizedVectorIndex 1-bit codes + exact rescoring, swept over --rescore
+
+Quantized rescoring reads the candidates' float32 rows from the corpus here;
+the int8/binary backends read them from chunk_embeddings, so their memory
+column is the in-process footprint only.
+
+pgvector is not included: its HNSW has the same recall/ef_search trade-off as
+FAISS HNSW, and timing it here would mostly measure the round trip.
+Memory is about size * dim * 4 bytes per copy (10^7 x 256 needs ~10 GB for
+the corpus plus the same again for a FAISS index).
+
+Usage:
+    python -m app.scripts.benchmark_vector_backends --sizes 10000 100000 1000000
+    python -m app.scripts.benchmark_vector_backends --sizes 100000 --dim 768 --backends ivf hnsw
+    python -m app.scripts.benchmark_vector_backends --sizes 1000000 --backends exact int8 binary
+"""
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from app.services import faiss_vector_index
+from app.services.quantized_vector_index import QuantizedVectorIndex
+from app.services.vector_index import InMemoryVectorIndex, top_k
+
+
+def synthetic_corpus(size: int, dim: int, clusters: int, seed: int = 0, block: int = 100000) -> np.ndarray:
+    """Gaussian clusters around random unit centroids, normalized (block-wise to bound peak memory)."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    corpus = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, block):
+        n = min(block, size - start)
+        noise = rng.standard_normal((n, dim)).astype(np.float32) * (1.4 / np.sqrt(dim))
+        rows = centroids[rng.integers(0, clusters, n)] + noise
+        corpus[start:start + n] = rows / np.linalg.norm(rows, axis=1, keepdims=True)
+    return corpus
+
+
+def make_queries(corpus: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    """Perturbed corpus rows: queries land near, not on, stored vectors."""
+    rng = np.random.default_rng(seed)
+    queries = corpus[rng.choice(len(corpus), count, replace=False)]
+    queries = queries + rng.standard_normal(queries.shape).astype(np.float32) * (0.4 / np.sqrt(corpus.shape[1]))
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int, block: int = 200000) -> np.ndarray:
+    """Ground-truth row ids, computed block-wise over the corpus."""
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), k), dtype=np.int64)
+    for start in range(0, len(corpus), block):
+        scores = queries @ corpus[start:start + block].T
+        ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, ids], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    return best_ids
+
+
+def recall_at_k(found: List[List[int]], truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth.tolist())]))
+
+
+def report(size: int, name: str, params: str, build_s: float, nbytes: int, found, truth, elapsed: float) -> None:
+    print(f"{size:>10,}  {name:<6} {params:<24} build {build_s:8.2f}s  mem {nbytes / 2**20:9.1f} MB  "
+          f"recall@{truth.shape[1]} {recall_at_k(found, truth):.3f}  "
+          f"{len(found) / elapsed:10,.0f} QPS")
+
+
+def rescored(index: QuantizedVectorIndex, corpus: np.ndarray, query: np.ndarray, k: int, candidates: int) -> List[int]:
+    """Quantized candidates, rescored exactly against the float32 rows."""
+    ids = index.candidates(query, max(k, candidates))
+    return [i for i, _ in top_k(corpus[ids] @ query, ids, k, -1.0)]
+
+
+def run(args) -> None:
+    print(f"dim={args.dim} k={args.k} queries={args.queries} clusters={args.clusters}")
+    for size in args.sizes:
+        started = time.perf_counter()
+        corpus = synthetic_corpus(size, args.dim, args.clusters)
+        queries = make_queries(corpus, args.queries)
+        truth = exact_top_k(corpus, queries, args.k)
+        print(f"--- {size:,} vectors (generated + ground truth in {time.perf_counter() - started:.1f}s)")
+        ids = np.arange(size, dtype=np.int64)
+
+        if "exact" in args.backends:
+            started = time.perf_counter()
+            index = InMemoryVectorIndex(args.dim, capacity=size)
+            index.add(ids.tolist(), corpus, np.zeros(size, dtype=np.int64).tolist())
+            build_s = time.perf_counter() - started
+            started = time.perf_counter()
+            found = [[i for i, _ in index.search(q, args.k)] for q in queries]
+            report(size, "exact", "-", build_s, corpus.nbytes, found, truth, time.perf_counter() - started)
+            del index
+
+        for method in ("int8", "binary"):
+            if method not in args.backends:
+                continue
+            started = time.perf_counter()
+            index = QuantizedVectorIndex(args.dim, method, capacity=size)
+            index.add(ids.tolist(), corpus, np.zeros(size, dtype=np.int64).tolist())
+            build_s = time.perf_counter() - started
+            for candidates in args.rescore:
+                started = time.perf_counter()
+                found = [rescored(index, corpus, q, args.k, candidates) for q in queries]
+                report(size, method, f"rescore={candidates}", build_s, index.nbytes, found, truth,
+                       time.perf_counter() - started)
+            del index
+
+        for kind, sweep, label in (("ivf", args.nprobe, "nprobe"), ("hnsw", args.ef_search, "ef_search")):
+            if kind not in args.backends:
+                continue
+            started = time.perf_counter()
+            index = faiss_vector_index.create_index(kind, corpus, ids, hnsw_m=args.hnsw_m)
+            build_s = time.perf_counter() - started
+            extra = f"nlist={faiss_vector_index.default_nlist(size)}" if kind == "ivf" else f"M={args.hnsw_m}"
+            nbytes = len(faiss_vector_index.faiss.serialize_index(index))
+            for value in sweep:
+                params = (faiss_vector_index.search_params(kind, nprobe=value) if kind == "ivf"
+                          else faiss_vector_index.search_params(kind, ef_search=max(value, args.k)))
+                started = time.perf_counter()
+                found = [index.search(q[None, :], args.k, params=params)[1][0].tolist() for q in queries]
+                report(size, kind, f"{extra} {label}={value}", build_s, nbytes, found, truth,
+                       time.perf_counter() - started)
+            del index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vector search backend recall/latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--backends", nargs="+", default=["exact", "ivf", "hnsw", "int8", "binary"],
+                        choices=["exact", "ivf", "hnsw", "int8", "binary"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[32, 100, 256])
+    parser.add_argument("--hnsw-m", type=int, default=16)
+    parser.add_argument("--rescore", type=int, nargs="+", default=[50, 200, 800],
+                        help="quantized candidates rescored at full precision")
+    args = parser.parse_args()
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Build or refresh a persisted vector index (mmap, faiss_ivf, faiss_hnsw), or
+write a startup snapshot of an in-process one (memory, int8, binary)
+
+The mmap index is refreshed by ingestion after every document; run this
+after a bulk reindex, an embedding version switch, or to seed an index on a
+new host. FAISS indexes are only built here: schedule a periodic rebuild
+to fold newly written rows (served from an exact delta) into the ANN index.
+Snapshots are also written by the service itself; writing one at deploy time
+lets fresh hosts start from it.
+
+Usage:
+    python -m app.scripts.build_vector_index                        # configured backend
+    python -m app.scripts.build_vector_index --backend faiss_hnsw
+    python -m app.scripts.build_vector_index --full                 # mmap: rebuild from the database
+    python -m app.scripts.build_vector_index --version e5-large
+"""
+import argparse
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+import app.models.document  # noqa: F401
+import app.models.fund  # noqa: F401
+import app.models.transaction  # noqa: F401
+from app.services.embedding_versions import get_active_version, get_version
+from app.services.vector_backends import BACKENDS, get_backend
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a persisted vector index")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=settings.VECTOR_SEARCH_BACKEND,
+                        help="backend whose index to build (default: VECTOR_SEARCH_BACKEND)")
+    parser.add_argument("--version", default=None,
+                        help="embedding version (default: the active version)")
+    parser.add_argument("--full", action="store_true",
+                        help="mmap: rebuild from the database instead of the previous generation")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        version = get_version(db, args.version) if args.version else get_active_version(db)
+        get_backend(args.backend).build(db, version, full=args.full)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
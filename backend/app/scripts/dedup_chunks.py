@@ -0,0 +1,85 @@
+"""
+Collapse near-duplicate chunks of already ingested documents
+
+Ingestion deduplicates new documents (app.services.chunk_dedup); this applies
+the same grouping to documents stored before that. For every group the first
+chunk is kept with the group's pages, and the other chunks are deleted along
+with their embeddings (chunk_embeddings cascades).
+
+Usage:
+    python -m app.scripts.dedup_chunks --dry-run
+    python -m app.scripts.dedup_chunks
+    python -m app.scripts.dedup_chunks --fund-id 3
+"""
+import argparse
+
+from app.db.session import SessionLocal
+from app.models.document import Document, DocumentChunk
+import app.models.fund  # noqa: F401  (register Fund for the Document relationship)
+import app.models.transaction  # noqa: F401
+from app.services.chunk_dedup import chunk_groups
+from app.services.retrieval_cache import bump_index_version
+from app.services.vector_backends import refresh_active_index
+
+
+def dedup_document(db, document_id: int, dry_run: bool = False) -> int:
+    """Collapse one document's duplicate chunks. Returns the number of chunks removed."""
+    records = (
+        db.query(DocumentChunk)
+        .filter(DocumentChunk.document_id == document_id)
+        .order_by(DocumentChunk.page, DocumentChunk.id)
+        .all()
+    )
+    chunks = [
+        {"chunk": r.content or "", "metadata": {"page": r.page, "type": r.chunk_type}}
+        for r in records
+    ]
+    removed = 0
+    for group in chunk_groups(chunks):
+        if len(group) < 2:
+            continue
+        keep = records[group[0]]
+        pages = set(keep.pages or [keep.page])
+        for i in group[1:]:
+            pages.update(records[i].pages or [records[i].page])
+            if not dry_run:
+                db.delete(records[i])
+            removed += 1
+        if not dry_run:
+            keep.pages = sorted(pages)
+    if not dry_run:
+        db.commit()
+    return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Collapse near-duplicate document chunks")
+    parser.add_argument("--fund-id", type=int, default=None, help="only this fund's documents")
+    parser.add_argument("--dry-run", action="store_true", help="report without changing anything")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(Document.id, Document.fund_id).order_by(Document.id)
+        if args.fund_id is not None:
+            query = query.filter(Document.fund_id == args.fund_id)
+
+        total, fund_ids = 0, set()
+        for document_id, fund_id in query.all():
+            removed = dedup_document(db, document_id, dry_run=args.dry_run)
+            if removed:
+                print(f"[Dedup] Document {document_id}: {removed} duplicate chunks")
+                total += removed
+                fund_ids.add(fund_id)
+    finally:
+        db.close()
+
+    action = "would be removed" if args.dry_run else "removed"
+    print(f"[Dedup] {total} duplicate chunks {action}")
+    if total and not args.dry_run:
+        bump_index_version(*fund_ids)
+        refresh_active_index()
+
+
+if __name__ == "__main__":
+    main()
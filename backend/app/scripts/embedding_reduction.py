@@ -0,0 +1,202 @@
+"""
+Fit and benchmark reduced-dimension embeddings
+
+fit:        fit a PCA projection on full-dimension chunk embeddings and save it
+            where LocalEmbeddingService loads it (EMBEDDING_REDUCTION=pca)
+benchmark:  embed a sample corpus once at full dimension, then report recall@k,
+            storage and scoring latency of each reduction against the full vectors
+
+Usage:
+    python -m app.scripts.embedding_reduction fit --dimension 256 --limit 20000
+    python -m app.scripts.embedding_reduction benchmark --pdf ../files/Sample_Fund_Performance_Report.pdf
+"""
+import argparse
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.document import DocumentChunk
+import app.models.fund  # noqa: F401
+import app.models.transaction  # noqa: F401
+from app.services.embedding_reducer import EmbeddingReducer
+
+DEFAULT_PDF = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..", "files", "Sample_Fund_Performance_Report.pdf"
+)
+
+# Standard analyst questions used as benchmark queries
+SAMPLE_QUERIES = [
+    "What is the current DPI of this fund?",
+    "What is the IRR?",
+    "How much paid-in capital has been called?",
+    "Show me all capital calls in 2024",
+    "What distributions were made and when?",
+    "Were any distributions recallable?",
+    "What does DPI mean?",
+    "Explain the difference between gross and net IRR",
+    "What is the total commitment?",
+    "List all adjustments",
+    "What is the management fee?",
+    "Which investments were exited?",
+]
+
+
+def _load_db_texts(limit: int) -> List[str]:
+    engine = create_engine(settings.DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    try:
+        rows = db.execute(
+            select(DocumentChunk.content)
+            .where(DocumentChunk.content.isnot(None))
+            .order_by(DocumentChunk.id)
+            .limit(limit)
+        ).all()
+        return [row.content for row in rows if row.content.strip()]
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _load_pdf_texts(paths: List[str]) -> List[str]:
+    import pdfplumber
+    from app.services.document_processor import DocumentProcessor
+
+    pages = []
+    for path in paths:
+        with pdfplumber.open(path) as pdf:
+            for page_number, page in enumerate(pdf.pages, start=1):
+                text = page.extract_text()
+                if text and text.strip():
+                    pages.append({"page": page_number, "text": text})
+    return [c["chunk"] for c in DocumentProcessor()._chunk_text(pages) if c["chunk"]]
+
+
+def _top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    """Exact top-k ids per query by inner product (vectors are unit length)."""
+    scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _recall(reference: np.ndarray, candidate: np.ndarray) -> float:
+    hits = [len(set(ref) & set(cand)) / len(ref) for ref, cand in zip(reference, candidate)]
+    return float(np.mean(hits))
+
+
+def _latency_ms(queries: np.ndarray, corpus: np.ndarray, k: int, repeat: int) -> float:
+    corpus = np.ascontiguousarray(corpus, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _top_k(queries, corpus, k)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+
+# -------------------------------------------------------------------------
+# Commands
+# -------------------------------------------------------------------------
+def fit(dimension: int, limit: int, pdfs: List[str]) -> str:
+    from app.services.local_embedding_service import LocalEmbeddingService
+
+    texts = _load_pdf_texts(pdfs) if pdfs else _load_db_texts(limit)
+    print(f"Fitting PCA({dimension}) on {len(texts)} chunks...")
+
+    service = LocalEmbeddingService(reduction="none")
+    embeddings = service.embed_texts(texts, reduce=False)
+    reducer = EmbeddingReducer("pca", dimension).fit(embeddings)
+
+    path = EmbeddingReducer.default_path(service.model_name, dimension)
+    reducer.save(path)
+    print(f"Saved PCA projection to {path}")
+    return path
+
+
+def benchmark(pdfs: List[str], dimensions: List[int], ks: List[int], repeat: int) -> List[Dict]:
+    from app.services.local_embedding_service import LocalEmbeddingService
+
+    texts = _load_pdf_texts(pdfs)
+    service = LocalEmbeddingService(reduction="none")
+    corpus = service.embed_texts(texts, reduce=False)
+    queries = service.embed_texts(SAMPLE_QUERIES, reduce=False)
+    full_dim = corpus.shape[1]
+    print(f"Corpus: {len(texts)} chunks, {len(SAMPLE_QUERIES)} queries, model dim {full_dim}")
+
+    max_k = max(ks)
+    reference = _top_k(queries, corpus, max_k)
+    full_latency = _latency_ms(queries, corpus, max_k, repeat)
+
+    results = [{
+        "method": "full", "dimension": full_dim,
+        "bytes_per_vector": full_dim * 8,
+        "latency_ms": full_latency,
+        **{f"recall@{k}": 1.0 for k in ks},
+    }]
+
+    for dimension in dimensions:
+        for method in ("truncate", "pca"):
+            if method == "pca":
+                path = EmbeddingReducer.default_path(service.model_name, dimension)
+                if os.path.exists(path):
+                    reducer = EmbeddingReducer.load(path)
+                elif len(texts) >= dimension:
+                    reducer = EmbeddingReducer("pca", dimension).fit(corpus)
+                else:
+                    print(f"Skipping pca/{dimension}: no saved projection and only {len(texts)} samples")
+                    continue
+            else:
+                reducer = EmbeddingReducer(method, dimension)
+
+            reduced_corpus = reducer.transform(corpus)
+            reduced_queries = reducer.transform(queries)
+            candidate = _top_k(reduced_queries, reduced_corpus, max_k)
+            results.append({
+                "method": method, "dimension": dimension,
+                "bytes_per_vector": dimension * 8,
+                "latency_ms": _latency_ms(reduced_queries, reduced_corpus, max_k, repeat),
+                **{f"recall@{k}": _recall(reference[:, :k], candidate[:, :k]) for k in ks},
+            })
+
+    header = f"{'method':<10}{'dim':>6}{'bytes/vec':>11}{'storage':>9}{'ms/query':>10}"
+    header += "".join(f"{'recall@' + str(k):>11}" for k in ks)
+    print(header)
+    for row in results:
+        line = (f"{row['method']:<10}{row['dimension']:>6}{row['bytes_per_vector']:>11}"
+                f"{row['bytes_per_vector'] / (full_dim * 8):>8.0%}{row['latency_ms']:>10.4f}")
+        line += "".join(f"{row[f'recall@{k}']:>11.3f}" for k in ks)
+        print(line)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embedding dimensionality reduction tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fit_parser = sub.add_parser("fit", help="fit and save a PCA projection")
+    fit_parser.add_argument("--dimension", type=int, default=settings.EMBEDDING_DIMENSION)
+    fit_parser.add_argument("--limit", type=int, default=20000,
+                            help="maximum document_chunks sampled from the database")
+    fit_parser.add_argument("--pdf", nargs="*", default=[],
+                            help="fit on these PDFs instead of the database")
+
+    bench_parser = sub.add_parser("benchmark", help="recall/storage/latency report")
+    bench_parser.add_argument("--pdf", nargs="+", default=[DEFAULT_PDF])
+    bench_parser.add_argument("--dimensions", type=int, nargs="+", default=[128, 256])
+    bench_parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    bench_parser.add_argument("--repeat", type=int, default=50)
+
+    args = parser.parse_args()
+    if args.command == "fit":
+        fit(args.dimension, args.limit, args.pdf)
+    else:
+        benchmark(args.pdf, args.dimensions, args.k, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Manage embedding versions (model upgrades without downtime)
+
+Typical upgrade:
+    python -m app.scripts.embedding_versions create e5-large --model intfloat/multilingual-e5-large
+    python -m app.scripts.embedding_versions build e5-large --workers 4
+    python -m app.scripts.embedding_versions activate e5-large
+
+While "e5-large" is building, searches keep using the active version and new
+documents are embedded under both. "activate" flips the serving version in a
+single transaction once every chunk has an embedding in the new version.
+"""
+import argparse
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+import app.models.document  # noqa: F401
+import app.models.fund  # noqa: F401
+import app.models.transaction  # noqa: F401
+from app.models.embedding import EmbeddingVersion, ChunkEmbedding
+from app.services.embedding_versions import (
+    activate_version,
+    create_version,
+    ensure_vector_index,
+    get_active_version,
+    get_version,
+    missing_count,
+)
+from app.scripts.reindex_embeddings import reindex_all_embeddings
+
+
+def list_versions() -> None:
+    db = SessionLocal()
+    try:
+        get_active_version(db)
+        for version in db.query(EmbeddingVersion).order_by(EmbeddingVersion.id).all():
+            count = db.query(ChunkEmbedding).filter(ChunkEmbedding.version_id == version.id).count()
+            print(f"{version.name:<20}{version.status:<10}{version.model_name:<40}"
+                  f"{version.reduction}/{version.dimension:<8}{count} chunks, "
+                  f"{missing_count(db, version)} missing")
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage embedding versions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="show versions and their coverage")
+
+    create = sub.add_parser("create", help="register a new version in building state")
+    create.add_argument("name")
+    create.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    create.add_argument("--reduction", default="none", choices=["none", "truncate", "pca"])
+    create.add_argument("--dimension", type=int, default=None,
+                        help="stored dimension (default: the model's own, or EMBEDDING_DIMENSION when reduced)")
+
+    build = sub.add_parser("build", help="embed all chunks missing from a version")
+    build.add_argument("name")
+    build.add_argument("--workers", type=int, default=1)
+    build.add_argument("--batch-size", type=int, default=256)
+
+    activate = sub.add_parser("activate", help="atomically switch searches to a version")
+    activate.add_argument("name")
+    activate.add_argument("--force", action="store_true",
+                          help="activate even if some chunks are not embedded yet")
+
+    retire = sub.add_parser("retire", help="stop dual-writing to a building version")
+    retire.add_argument("name")
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        list_versions()
+        return
+
+    if args.command == "build":
+        reindex_all_embeddings(
+            version_name=args.name,
+            batch_size=args.batch_size,
+            workers=max(1, args.workers),
+            only_missing=True,
+            checkpoint_dir=f".reindex_checkpoint_{args.name}",
+        )
+        db = SessionLocal()
+        try:
+            print(f"Building HNSW index for '{args.name}'...")
+            ensure_vector_index(db, get_version(db, args.name))
+        finally:
+            db.close()
+        return
+
+    db = SessionLocal()
+    try:
+        if args.command == "create":
+            version = create_version(db, args.name, args.model, args.reduction, args.dimension)
+            print(f"Created version '{version.name}' (building)")
+        elif args.command == "activate":
+            version = activate_version(db, args.name, force=args.force)
+            print(f"Version '{version.name}' is now active")
+        elif args.command == "retire":
+            version = get_version(db, args.name)
+            if version.status == "active":
+                raise SystemExit("Activate another version before retiring the active one")
+            version.status = "retired"
+            db.commit()
+            print(f"Version '{version.name}' retired")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Load test for the chat API at a fixed request rate
+
+Sends questions to /api/chat/query (or /api/chat/query/stream) at a fixed
+rate, open loop: request i starts at i / rps whether or not earlier ones
+have finished, and its latency is measured from that scheduled start, so a
+slow server shows up as growing latency instead of a lower request rate.
+Reports throughput and p50/p95/p99 latency (plus time to first token when
+streaming), and with --debug the median of each pipeline stage as reported
+by the server (see app.services.pipeline_timings).
+
+Point the API at the stub LLM for reproducible runs:
+
+    python -m app.scripts.stub_server --port 11434 --ttft-ms 200 --tokens-per-second 50
+    OLLAMA_BASE_URL=http://localhost:11434 uvicorn app.main:app --port 8000
+
+Usage:
+    python -m app.scripts.load_test_chat --rps 5 --duration 60 --fund-id 1
+    python -m app.scripts.load_test_chat --rps 20 --duration 30 --stream --questions questions.txt
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+# Mix of RAG, metric and listing questions
+DEFAULT_QUESTIONS = [
+    "What is the current DPI?",
+    "What is the IRR of the fund?",
+    "Show me all capital calls in 2024",
+    "What does recallable distribution mean?",
+    "Summarize the fund's investment strategy",
+    "What are the management fee terms?",
+    "List distributions over $1,000,000",
+    "Who is the general partner of the fund?",
+]
+
+
+async def _send(
+    client: httpx.AsyncClient,
+    payload: Dict[str, Any],
+    stream: bool,
+    scheduled: float,
+) -> Dict[str, Any]:
+    """One request; latencies in seconds from its scheduled start."""
+    result: Dict[str, Any] = {"ok": False, "latency": None, "ttft": None, "timings": None}
+    try:
+        if not stream:
+            response = await client.post("/api/chat/query", json=payload)
+            result["latency"] = time.perf_counter() - scheduled
+            result["ok"] = response.status_code == 200
+            if result["ok"]:
+                result["timings"] = response.json().get("timings")
+            return result
+
+        async with client.stream("POST", "/api/chat/query/stream", json=payload) as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    if event == "token" and result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - scheduled
+                    elif event == "error":
+                        return result
+                    elif event == "done":
+                        result["timings"] = json.loads(line[len("data: "):]).get("timings")
+            result["latency"] = time.perf_counter() - scheduled
+            result["ok"] = response.status_code == 200
+    except httpx.HTTPError:
+        result["latency"] = time.perf_counter() - scheduled
+    return result
+
+
+def _percentiles(values: List[float]) -> str:
+    if not values:
+        return "n/a"
+    p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+    return f"p50 {p50:,.0f} ms  p95 {p95:,.0f} ms  p99 {p99:,.0f} ms"
+
+
+async def run(
+    base_url: str,
+    rps: float,
+    duration: float,
+    questions: List[str],
+    fund_id: Optional[int],
+    stream: bool,
+    use_cache: bool,
+    debug: bool,
+    timeout: float,
+) -> None:
+    total = int(rps * duration)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            scheduled = start + i / rps
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            payload = {
+                "query": questions[i % len(questions)],
+                "fund_id": fund_id,
+                "use_cache": use_cache,
+                "debug": debug,
+            }
+            tasks.append(asyncio.create_task(_send(client, payload, stream, scheduled)))
+        results = await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["ok"]]
+    print(f"{total} requests at {rps:g} rps over {elapsed:.1f}s: "
+          f"{len(ok)} ok, {total - len(ok)} failed, throughput {len(ok) / elapsed:.2f} req/s")
+    print(f"latency  {_percentiles([r['latency'] for r in ok])}")
+    if stream:
+        print(f"ttft     {_percentiles([r['ttft'] for r in ok if r['ttft'] is not None])}")
+
+    if debug:
+        stages: Dict[str, List[float]] = {}
+        for r in ok:
+            for stage, ms in ((r["timings"] or {}).get("stages_ms") or {}).items():
+                stages.setdefault(stage, []).append(ms)
+        for stage, values in sorted(stages.items(), key=lambda item: -np.median(item[1])):
+            print(f"  {stage:<10} median {np.median(values):>9,.1f} ms  ({len(values)} requests)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fixed-rate load test for the chat API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--rps", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of sending")
+    parser.add_argument("--questions", default=None, help="file with one question per line")
+    parser.add_argument("--fund-id", type=int, default=None)
+    parser.add_argument("--stream", action="store_true", help="use /api/chat/query/stream")
+    parser.add_argument("--cache", action="store_true", help="allow answer cache hits (off by default)")
+    parser.add_argument("--debug", action="store_true", help="collect server-side stage timings")
+    parser.add_argument("--timeout", type=float, default=180.0)
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    asyncio.run(run(
+        args.base_url, args.rps, args.duration, questions, args.fund_id,
+        args.stream, args.cache, args.debug, args.timeout,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,263 @@
 """
-Re-generate all embeddings in document_chunks using the new E5-base model
+Re-generate chunk embeddings for an embedding version
+
+Builds (or rebuilds) the chunk_embeddings rows of one embedding version,
+by default the active one. Pointed at a "building" version this is the
+shadow re-embedding job: the active version keeps serving searches until
+app.scripts.embedding_versions activates the new one.
+
+Streams chunks with keyset pagination (WHERE id > :last_id ORDER BY id LIMIT n),
+embeds each page in one batched forward pass and writes it back with a single
+bulk upsert, so memory stays bounded by the batch size. After every committed
+batch the worker checkpoints its last id, so an interrupted run resumes where
+it stopped instead of starting over.
+
+Usage:
+    python -m app.scripts.reindex_embeddings
+    python -m app.scripts.reindex_embeddings --workers 4 --batch-size 256
+    python -m app.scripts.reindex_embeddings --only-missing
+    python -m app.scripts.reindex_embeddings --version e5-large --workers 4
+    python -m app.scripts.reindex_embeddings --reset      # ignore old checkpoint
 """
-import asyncio
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, func, select
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+
 from app.core.config import settings
 from app.models.document import DocumentChunk
-from app.models.transaction import CapitalCall
-from app.models.transaction import Distribution
-from app.models.transaction import Adjustment
-from app.models.fund import Fund
+from app.models.embedding import ChunkEmbedding, EmbeddingVersion
+from app.services.retrieval_cache import bump_index_version
+from app.services.embedding_versions import (
+    get_active_version,
+    get_version,
+    get_embedding_service,
+    save_chunk_embeddings,
+)
+import app.models.fund  # noqa: F401  (register Fund for the Document relationship)
+import app.models.transaction  # noqa: F401
 
-from app.services.local_embedding_service import LocalEmbeddingService
+DEFAULT_CHECKPOINT_DIR = ".reindex_checkpoint"
 
 
-async def reindex_all_embeddings():
-    print("Start re-embedding process all document_chunks...")
-    
-    # Setup DB session
-    engine = create_engine(settings.DATABASE_URL)
+# -------------------------------------------------------------------------
+# Checkpoint helpers
+# -------------------------------------------------------------------------
+def _write_json(path: str, payload: Dict) -> None:
+    """Write JSON atomically so a crash never leaves a torn checkpoint."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _worker_checkpoint_path(checkpoint_dir: str, worker_idx: int) -> str:
+    return os.path.join(checkpoint_dir, f"worker_{worker_idx}.json")
+
+
+def _split_id_range(min_id: int, max_id: int, workers: int) -> List[Tuple[int, int]]:
+    """Split [min_id, max_id] into contiguous (exclusive_start, inclusive_end) ranges."""
+    span = max_id - min_id + 1
+    step = max(1, -(-span // workers))
+    ranges = []
+    start = min_id - 1
+    while start < max_id:
+        end = min(start + step, max_id)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _missing_only(stmt, version_id: int):
+    """Restrict a document_chunks select to chunks without an embedding in the version."""
+    return stmt.outerjoin(
+        ChunkEmbedding,
+        (ChunkEmbedding.chunk_id == DocumentChunk.id) & (ChunkEmbedding.version_id == version_id),
+    ).where(ChunkEmbedding.chunk_id.is_(None))
+
+
+def _plan(db, checkpoint_dir: str, workers: int, only_missing: bool, version_id: int) -> List[Tuple[int, int]]:
+    """Load the id-range plan from the checkpoint, or create a new one."""
+    plan_path = os.path.join(checkpoint_dir, "plan.json")
+    plan = _read_json(plan_path)
+    if plan and plan.get("only_missing") == only_missing and plan.get("version_id") == version_id:
+        print(f"Resuming from checkpoint in {checkpoint_dir}")
+        return [tuple(r) for r in plan["ranges"]]
+
+    stmt = select(func.min(DocumentChunk.id), func.max(DocumentChunk.id))
+    if only_missing:
+        stmt = _missing_only(stmt, version_id)
+    min_id, max_id = db.execute(stmt).one()
+    if min_id is None:
+        return []
+
+    ranges = _split_id_range(min_id, max_id, workers)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    _write_json(plan_path, {"ranges": ranges, "only_missing": only_missing, "version_id": version_id})
+    return ranges
+
+
+# -------------------------------------------------------------------------
+# Worker
+# -------------------------------------------------------------------------
+def _reindex_range(
+    worker_idx: int,
+    start_id: int,
+    end_id: int,
+    version_id: int,
+    batch_size: int,
+    only_missing: bool,
+    checkpoint_dir: str,
+    threads: Optional[int] = None,
+) -> int:
+    """Re-embed chunks with start_id < id <= end_id. Returns the number updated."""
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
     SessionLocal = sessionmaker(bind=engine)
     db = SessionLocal()
+    version = db.get(EmbeddingVersion, version_id)
+    embedding_service = get_embedding_service(version)
+
+    checkpoint_path = _worker_checkpoint_path(checkpoint_dir, worker_idx)
+    checkpoint = _read_json(checkpoint_path) or {}
+    last_id = max(start_id, checkpoint.get("last_id", start_id))
+    updated = checkpoint.get("updated", 0)
+
+    try:
+        while last_id < end_id:
+            stmt = (
+                select(DocumentChunk.id, DocumentChunk.content)
+                .where(DocumentChunk.id > last_id, DocumentChunk.id <= end_id)
+                .order_by(DocumentChunk.id)
+                .limit(batch_size)
+            )
+            if only_missing:
+                stmt = _missing_only(stmt, version_id)
+            rows = db.execute(stmt).all()
+            if not rows:
+                break
+
+            batch = [row for row in rows if row.content]
+            if batch:
+                batch_start = time.time()
+                embeddings = embedding_service.embed_texts(
+                    [row.content for row in batch], batch_size=batch_size
+                )
+                save_chunk_embeddings(db, version, [row.id for row in batch], embeddings)
+                db.commit()
+                updated += len(batch)
+                rate = len(batch) / max(time.time() - batch_start, 1e-6)
+                print(f"[worker {worker_idx}] Progress: id {rows[-1].id}/{end_id}, "
+                      f"{updated} updated ({rate:.0f} chunks/s)")
+
+            last_id = rows[-1].id
+            _write_json(checkpoint_path, {"last_id": last_id, "updated": updated})
+    finally:
+        db.close()
+        engine.dispose()
+
+    return updated
+
+
+def _run_worker(args: Tuple) -> int:
+    return _reindex_range(*args)
+
+
+# -------------------------------------------------------------------------
+# Entrypoint
+# -------------------------------------------------------------------------
+def reindex_all_embeddings(
+    version_name: Optional[str] = None,
+    batch_size: int = 256,
+    workers: int = 1,
+    only_missing: bool = False,
+    checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR,
+    reset: bool = False,
+) -> int:
+    if reset and os.path.isdir(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
+
+    engine = create_engine(settings.DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    try:
+        version = get_version(db, version_name) if version_name else get_active_version(db)
+        version_id = version.id
+        print(f"Start re-embedding document_chunks for version '{version.name}' "
+              f"({version.model_name}, {version.status})...")
+        ranges = _plan(db, checkpoint_dir, workers, only_missing, version_id)
+    finally:
+        db.close()
+        engine.dispose()
 
-    embedding_service = LocalEmbeddingService()
+    if not ranges:
+        print("Nothing to re-embed.")
+        return 0
 
-    # get all chunks
-    chunks = db.query(DocumentChunk).all()
-    print(f"Total chunks: {len(chunks)}")
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    threads = max(1, (os.cpu_count() or 1) // len(ranges)) if len(ranges) > 1 else None
+    jobs = [
+        (idx, start, end, version_id, batch_size, only_missing, checkpoint_dir, threads)
+        for idx, (start, end) in enumerate(ranges)
+    ]
+    print(f"Re-embedding ids {ranges[0][0] + 1}..{ranges[-1][1]} with {len(jobs)} worker(s)")
 
-    updated = 0
+    if len(jobs) == 1:
+        results = [_run_worker(jobs[0])]
+    else:
+        # spawn: each worker loads its own model and DB engine
+        with multiprocessing.get_context("spawn").Pool(len(jobs)) as pool:
+            results = pool.map(_run_worker, jobs)
 
-    for chunk in chunks:
-        if not chunk.content:
-            continue
-        
-        # Generate new embedding
-        embedding = embedding_service.embed_text(chunk.content)
-        if embedding is not None and len(embedding) > 0:
-            chunk.embedding = embedding.tolist()
-            updated += 1
+    total = sum(results)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    if total:
+        # Vectors of the serving version may have changed under cached results
+        bump_index_version(corpus=True)
+    print(f"Re-embedding done. Total fixed: {total}")
+    return total
 
-        if updated % 10 == 0:
-            db.commit()
-            print(f"Progress: {updated}/{len(chunks)} fixing chunks ...")
 
-    # Commit all changes
-    db.commit()
-    db.close()
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-embed document_chunks")
+    parser.add_argument("--version", default=None,
+                        help="embedding version to build (default: the active version)")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="chunks fetched, embedded and updated per batch")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="parallel worker processes, each owning an id range")
+    parser.add_argument("--only-missing", action="store_true",
+                        help="only embed chunks without an embedding in the version")
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR,
+                        help="directory holding the resume checkpoint")
+    parser.add_argument("--reset", action="store_true",
+                        help="discard any existing checkpoint and start over")
+    args = parser.parse_args()
 
-    print(f"Re-embedding done. Total fixed: {updated}")
+    reindex_all_embeddings(
+        version_name=args.version,
+        batch_size=args.batch_size,
+        workers=max(1, args.workers),
+        only_missing=args.only_missing,
+        checkpoint_dir=args.checkpoint_dir,
+        reset=args.reset,
+    )
 
 
 if __name__ == "__main__":
-    asyncio.run(reindex_all_embeddings())
+    main()
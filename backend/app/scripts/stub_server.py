@@ -0,0 +1,314 @@
+"""
+Local stub of the OpenAI and Ollama APIs for offline tests and throughput runs
+
+Implements, with configurable latency and injected 429/500 failures:
+
+    POST /v1/embeddings        deterministic vectors (seeded by a hash of each
+                               input, so the same text always gets the same
+                               unit vector)
+    POST /v1/chat/completions  OpenAI chat completions, streamed (SSE) or not
+    POST /api/generate         Ollama completions, streamed (NDJSON) or not
+    POST /api/chat             Ollama chat, streamed (NDJSON) or not
+
+Completions are deterministic filler text (seeded by a hash of the prompt)
+of a fixed number of tokens, produced after a time-to-first-token delay at a
+fixed tokens/s, so runs against the chat API measure our own pipeline rather
+than generation variance.
+
+Usage:
+    python -m app.scripts.stub_server --port 8100 --latency-ms 40 --error-rate 0.05
+    OPENAI_BASE_URL=http://localhost:8100/v1 python -m app.scripts.benchmark_embeddings
+
+    python -m app.scripts.stub_server --port 11434 --ttft-ms 200 --tokens-per-second 50
+    OLLAMA_BASE_URL=http://localhost:11434 uvicorn app.main:app
+    python -m app.scripts.load_test_chat --rps 5 --duration 60
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+# Words of the filler completions
+_VOCABULARY = (
+    "the fund reported capital calls distributions during period net asset value "
+    "paid-in commitments investors portfolio companies performance remained stable "
+    "according to quarterly report based on provided context"
+).split()
+
+
+class StubConfig(BaseModel):
+    """Behaviour of the stub server"""
+    dimension: int = 1536
+    latency_ms: float = 20.0           # fixed latency per request
+    per_input_latency_ms: float = 0.1  # extra latency per input text
+    error_rate: float = 0.0            # fraction of requests failing with 429/500
+    seed: Optional[int] = None
+    # Completions
+    ttft_ms: float = 200.0             # time to first token
+    tokens_per_second: float = 50.0    # generation speed after the first token
+    completion_tokens: int = 64        # length of every completion
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+
+class ChatCompletionRequest(BaseModel):
+    """OpenAI /v1/chat/completions"""
+    model: str
+    messages: List[ChatMessage]
+    stream: bool = False
+    max_tokens: Optional[int] = None
+
+
+class OllamaGenerateRequest(BaseModel):
+    """Ollama /api/generate (streams unless told otherwise)"""
+    model: str
+    prompt: str
+    stream: bool = True
+    options: Optional[Dict[str, Any]] = None
+
+
+class OllamaChatRequest(BaseModel):
+    """Ollama /api/chat"""
+    model: str
+    messages: List[ChatMessage]
+    stream: bool = True
+    options: Optional[Dict[str, Any]] = None
+
+
+class EmbeddingRequest(BaseModel):
+    model: str
+    input: Union[str, List[str]]
+    dimensions: Optional[int] = None
+
+
+def stub_embedding(text: str, dimension: int) -> List[float]:
+    """Deterministic unit vector for a text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def stub_completion(prompt: str, tokens: int) -> List[str]:
+    """Deterministic completion of a prompt, as one piece per token."""
+    seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "little")
+    rng = random.Random(seed)
+    return [rng.choice(_VOCABULARY) + " " for _ in range(tokens)]
+
+
+def create_app(config: Optional[StubConfig] = None) -> FastAPI:
+    """Build the stub app; request statistics are kept on app.state.stats."""
+    config = config or StubConfig()
+    rng = random.Random(config.seed)
+    app = FastAPI(title="OpenAI / Ollama stub")
+    app.state.config = config
+    app.state.stats = {"requests": 0, "failures": 0, "inputs": 0, "in_flight": 0,
+                       "max_in_flight": 0, "max_batch": 0, "completions": 0, "completion_tokens": 0}
+
+    def injected_error() -> Optional[JSONResponse]:
+        """A 429 or 500 response for error_rate of the requests."""
+        if not config.error_rate or rng.random() >= config.error_rate:
+            return None
+        app.state.stats["failures"] += 1
+        if rng.random() < 0.5:
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "0"},
+                content={"error": {"message": "Rate limit reached", "type": "requests"}},
+            )
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Stub server error", "type": "server_error"}},
+        )
+
+    def completion_tokens(max_tokens: Optional[int] = None) -> int:
+        return min(config.completion_tokens, max_tokens or config.completion_tokens)
+
+    async def generate(prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Completion pieces at the configured time to first token and tokens/s."""
+        stats = app.state.stats
+        pieces = stub_completion(prompt, completion_tokens(max_tokens))
+        stats["completions"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(config.ttft_ms / 1000)
+            for n, piece in enumerate(pieces):
+                if n and config.tokens_per_second:
+                    await asyncio.sleep(1 / config.tokens_per_second)
+                stats["completion_tokens"] += 1
+                yield piece
+        finally:
+            stats["in_flight"] -= 1
+
+    async def complete(prompt: str, max_tokens: Optional[int] = None) -> str:
+        return "".join([piece async for piece in generate(prompt, max_tokens)])
+
+    def prompt_tokens(prompt: str) -> int:
+        return len(prompt) // 4 + 1
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: EmbeddingRequest):
+        stats = app.state.stats
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            inputs = [request.input] if isinstance(request.input, str) else request.input
+            await asyncio.sleep(
+                (config.latency_ms + config.per_input_latency_ms * len(inputs)) / 1000
+            )
+
+            error = injected_error()
+            if error is not None:
+                return error
+
+            stats["inputs"] += len(inputs)
+            stats["max_batch"] = max(stats["max_batch"], len(inputs))
+            dimension = request.dimensions or config.dimension
+            tokens = sum(len(text) // 4 + 1 for text in inputs)
+            return {
+                "object": "list",
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": stub_embedding(text, dimension)}
+                    for i, text in enumerate(inputs)
+                ],
+                "model": request.model,
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: ChatCompletionRequest):
+        app.state.stats["requests"] += 1
+        error = injected_error()
+        if error is not None:
+            return error
+        prompt = "\n".join(message.content for message in request.messages)
+        completion_id = f"chatcmpl-stub-{app.state.stats['requests']}"
+        created = int(time.time())
+
+        if not request.stream:
+            content = await complete(prompt, request.max_tokens)
+            tokens = completion_tokens(request.max_tokens)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": request.model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens(prompt),
+                    "completion_tokens": tokens,
+                    "total_tokens": prompt_tokens(prompt) + tokens,
+                },
+            }
+
+        async def events():
+            def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+                return "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": request.model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }) + "\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            async for piece in generate(prompt, request.max_tokens):
+                yield chunk({"content": piece})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def ollama_response(request: Union[OllamaGenerateRequest, OllamaChatRequest], prompt: str, chat: bool):
+        """Ollama's reply shape for /api/generate and /api/chat (NDJSON when streaming)."""
+        app.state.stats["requests"] += 1
+        error = injected_error()
+        if error is not None:
+            return error
+
+        def line(piece: str, done: bool) -> Dict[str, Any]:
+            body: Dict[str, Any] = {"model": request.model,
+                                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                                    "done": done}
+            if chat:
+                body["message"] = {"role": "assistant", "content": piece}
+            else:
+                body["response"] = piece
+            if done:
+                body.update({"prompt_eval_count": prompt_tokens(prompt), "eval_count": config.completion_tokens})
+            return body
+
+        if not request.stream:
+            return line(await complete(prompt), True)
+
+        async def lines():
+            async for piece in generate(prompt):
+                yield json.dumps(line(piece, False)) + "\n"
+            yield json.dumps(line("", True)) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def ollama_generate(request: OllamaGenerateRequest):
+        return await ollama_response(request, request.prompt, chat=False)
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: OllamaChatRequest):
+        return await ollama_response(request, "\n".join(m.content for m in request.messages), chat=True)
+
+    @app.get("/stats")
+    async def get_stats():
+        return app.state.stats
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI / Ollama-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--per-input-latency-ms", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        dimension=args.dimension,
+        latency_ms=args.latency_ms,
+        per_input_latency_ms=args.per_input_latency_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Near-duplicate chunk detection (MinHash + LSH)
+
+Fund reports repeat headers, footers and disclaimers on every page, and the
+50-character chunk overlap produces more near-copies. Those chunks inflate the
+vector index and crowd the top-k with the same text, so ingestion keeps one
+chunk per group of near-duplicates and records every page the text appears on
+(document_chunks.pages).
+
+Text chunks are compared by the Jaccard similarity of their word 3-shingles:
+a 128-permutation MinHash signature is banded for locality-sensitive hashing,
+and each candidate pair is confirmed with the exact Jaccard similarity. Page
+numbers ("Page 3 of 12") are dropped before comparing, and any other number
+must match exactly: two passages that differ only in an amount or a date are
+not duplicates. Table chunks only merge when their normalized text is identical, since rows
+that differ in a single amount are different facts.
+"""
+import hashlib
+import re
+from typing import Any, Dict, List, Set
+import numpy as np
+from app.core.config import settings
+
+SHINGLE_SIZE = 3
+# Mersenne prime for the (a * x + b) mod p permutations; with 32-bit shingle
+# hashes and a < 2^31 the products stay inside uint64
+_PRIME = np.uint64((1 << 61) - 1)
+
+_token_pattern = re.compile(r"\w+")
+_page_number_pattern = re.compile(r"\bpage\s+\d+(\s+of\s+\d+)?\b")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_token_pattern.findall(_page_number_pattern.sub("page", text.lower())))
+
+
+def numbers(text: str) -> Set[str]:
+    return {token for token in normalize(text).split() if any(ch.isdigit() for ch in token)}
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Word n-grams of the normalized text (the whole text if it is shorter)."""
+    tokens = normalize(text).split()
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures with a fixed, seeded set of permutations"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: Set[str]) -> np.ndarray:
+        if not shingle_set:
+            return np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+             for s in shingle_set),
+            dtype=np.uint64, count=len(shingle_set),
+        )
+        permuted = (hashes[:, None] * self.a[None, :] + self.b[None, :]) % _PRIME
+        return permuted.min(axis=0)
+
+
+def duplicate_groups(
+    texts: List[str],
+    threshold: float = 0.9,
+    num_perm: int = 128,
+    bands: int = 32,
+) -> List[List[int]]:
+    """
+    Partition text indices into groups of near-duplicates (Jaccard >= threshold),
+    each group in index order. Singletons are groups of one.
+    """
+    hasher = MinHasher(num_perm)
+    rows = num_perm // bands
+    shingle_sets = [shingles(t) for t in texts]
+    number_sets = [numbers(t) for t in texts]
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: Dict[tuple, List[int]] = {}
+    for i, shingle_set in enumerate(shingle_sets):
+        if not shingle_set:
+            continue
+        signature = hasher.signature(shingle_set)
+        candidates = set()
+        for band in range(bands):
+            key = (band, signature[band * rows:(band + 1) * rows].tobytes())
+            candidates.update(buckets.setdefault(key, []))
+            buckets[key].append(i)
+        for j in candidates:
+            if (
+                find(i) != find(j)
+                and number_sets[i] == number_sets[j]
+                and jaccard(shingle_sets[i], shingle_sets[j]) >= threshold
+            ):
+                parent[find(i)] = find(j)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values(), key=lambda group: group[0])
+
+
+def chunk_groups(chunks: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    Near-duplicate groups of one document's chunks (DocumentProcessor chunk
+    dicts: "chunk" text, metadata "type" and "page"), in chunk order.
+    """
+    groups: List[List[int]] = []
+    text_indices = [i for i, c in enumerate(chunks) if c["metadata"]["type"] == "text"]
+    for group in duplicate_groups(
+        [chunks[i]["chunk"] for i in text_indices],
+        threshold=settings.CHUNK_DEDUP_THRESHOLD,
+        num_perm=settings.CHUNK_DEDUP_NUM_PERM,
+        bands=settings.CHUNK_DEDUP_BANDS,
+    ):
+        groups.append([text_indices[i] for i in group])
+
+    exact: Dict[tuple, List[int]] = {}
+    for i, c in enumerate(chunks):
+        if c["metadata"]["type"] != "text":
+            exact.setdefault((c["metadata"]["type"], normalize(c["chunk"])), []).append(i)
+    groups.extend(exact.values())
+    return sorted(groups, key=lambda group: group[0])
+
+
+def dedup_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Keep the first chunk of each near-duplicate group; its metadata["pages"]
+    lists every page of the group when the group has more than one chunk.
+    """
+    if not settings.CHUNK_DEDUP_ENABLED or len(chunks) < 2:
+        return chunks
+
+    deduped = []
+    for group in chunk_groups(chunks):
+        chunk = chunks[group[0]]
+        if len(group) > 1:
+            pages = sorted({chunks[i]["metadata"]["page"] for i in group})
+            chunk = {**chunk, "metadata": {**chunk["metadata"], "pages": pages}}
+        deduped.append(chunk)
+    return deduped
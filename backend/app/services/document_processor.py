@@ -3,6 +3,7 @@ Document processing service using pdfplumber
 with automatic DB persistence for tables and text chunks.
 """
 
+import asyncio
 from typing import Dict, List, Any
 import pdfplumber
 import re
@@ -11,8 +12,15 @@ from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.models.document import Document, DocumentChunk, DocumentTable
 from app.services.table_parser import TableParser
-# from app.services.embedding_service import EmbeddingService
-from app.services.local_embedding_service import LocalEmbeddingService
+from app.services.chunk_dedup import dedup_chunks
+from app.services.embedding_versions import (
+    get_writable_versions,
+    get_embedding_service,
+    save_chunk_embeddings,
+)
+from app.services import vector_index
+from app.services.vector_backends import refresh_active_index
+from app.services.retrieval_cache import bump_index_version
 
 logger = logging.getLogger(__name__)
 
@@ -55,20 +63,19 @@ class DocumentProcessor:
                     if text and text.strip():
                         text_content.append({"page": page_number, "text": text})
 
-            # === STEP 2: Chunk text ===
-            chunks = self._chunk_text(text_content)
+            # === STEP 2: Chunk text and tables ===
+            chunks = self._chunk_text(text_content) + self._chunk_tables(tables)
+            # Repeated boilerplate is stored (and embedded) once, with all its pages
+            chunks = dedup_chunks(chunks)
 
             # === STEP 3: Persist results ===
-            self._save_to_db(document_id, tables, chunks)
+            chunk_records = self._save_to_db(document_id, fund_id, tables, chunks)
 
-            # === STEP 4: Mark completed ===
-            # embedding_service = EmbeddingService() # for openai
-            embedding_service = LocalEmbeddingService() # for local only
-
-            texts = [c["chunk"] for c in chunks]
-            if texts:
-                embeddings = await embedding_service.generate_embeddings(texts)
-                self._save_embeddings(document_id, embeddings)
+            # === STEP 4: Generate embeddings ===
+            if chunk_records:
+                await self._save_embeddings(chunk_records)
+                # New chunks are searchable: invalidate cached results for the fund
+                bump_index_version(fund_id)
 
             # === STEP 5: Mark completed ===
             document.parsing_status = "completed"
@@ -79,6 +86,8 @@ class DocumentProcessor:
 
         except Exception as e:
             logger.exception(f"Error processing document {document_id}: {e}")
+            # Chunks may have been committed before the failure
+            bump_index_version(fund_id)
             if self.db:
                 document = self.db.query(Document).filter(Document.id == document_id).first()
                 if document:
@@ -89,41 +98,66 @@ class DocumentProcessor:
     # -------------------------------------------------------------------------
     # Helper: Save extracted data to DB
     # -------------------------------------------------------------------------
-    def _save_to_db(self, document_id: int, tables: List[Dict[str, Any]], chunks: List[Dict[str, Any]]):
-        """Save extracted tables and text chunks to their respective tables."""
+    def _save_to_db(
+        self, document_id: int, fund_id: int, tables: List[Dict[str, Any]], chunks: List[Dict[str, Any]]
+    ) -> List[DocumentChunk]:
+        """Save extracted tables and chunks; returns the chunk records in chunk order."""
         # Save tables
         for t in tables:
             record = DocumentTable(
                 document_id=document_id,
                 page=t["page"],
+                table_type=t["type"],
                 table_data=str(t["table"])  # you may convert to JSON if needed
             )
             self.db.add(record)
 
-        # Save text chunks
+        # Save chunks, with the fund and chunk type used as search filters
+        records = []
         for c in chunks:
             record = DocumentChunk(
                 document_id=document_id,
+                fund_id=fund_id,
                 page=c["metadata"]["page"],
+                pages=c["metadata"].get("pages"),
+                chunk_type=c["metadata"]["type"],
                 content=c["chunk"]
             )
             self.db.add(record)
+            records.append(record)
 
         self.db.commit()
+        return records
 
 
     # -------------------------------------------------------------------------
     # Helper: Save Embedding
     # -------------------------------------------------------------------------
-    def _save_embeddings(self, document_id: int, embeddings: List[List[float]]):
-        """Save generated embeddings into document_chunks table"""
-        chunks = self.db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).all()
-
-        for chunk, embedding in zip(chunks, embeddings):
-            chunk.embedding = embedding
+    async def _save_embeddings(self, chunk_records: List[DocumentChunk]):
+        """
+        Embed chunks under every active or building embedding version, so a
+        version being built in the background never misses new documents.
+        """
+        chunk_ids = [record.id for record in chunk_records]
+        document_ids = [record.document_id for record in chunk_records]
+        texts = [record.content for record in chunk_records]
+
+        saved = []
+        for version in get_writable_versions(self.db):
+            embedding_service = get_embedding_service(version)
+            embeddings = await embedding_service.generate_embeddings(texts)
+            save_chunk_embeddings(self.db, version, chunk_ids, embeddings)
+            saved.append((version.id, embeddings))
 
         self.db.commit()
 
+        # Make the new chunks searchable in this process's in-memory index right away
+        for version_id, embeddings in saved:
+            vector_index.index_embeddings(version_id, chunk_ids, document_ids, embeddings)
+
+        # Refresh the shared on-disk index, if the configured backend has one
+        await asyncio.to_thread(refresh_active_index)
+
 
     # -------------------------------------------------------------------------
     # Helper: Text chunking
@@ -162,3 +196,35 @@ class DocumentProcessor:
                 })
 
         return chunks
+
+    def _chunk_tables(self, tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Render tables row by row into chunks typed by their table type."""
+        chunks = []
+        chunk_size = 500
+
+        for t in tables:
+            rows = [
+                " | ".join(str(cell).strip() for cell in row if cell not in (None, ""))
+                for row in t["table"] if row
+            ]
+            buffer = ""
+            for row in filter(None, rows):
+                if buffer and len(buffer) + len(row) >= chunk_size:
+                    chunks.append(self._table_chunk(buffer, t))
+                    buffer = ""
+                buffer += row + "\n"
+            if buffer.strip():
+                chunks.append(self._table_chunk(buffer, t))
+
+        return chunks
+
+    @staticmethod
+    def _table_chunk(buffer: str, table: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "chunk": buffer.strip(),
+            "metadata": {
+                "page": table["page"],
+                "chunk_size": len(buffer),
+                "type": table["type"]
+            }
+        }
@@ -0,0 +1,109 @@
+"""
+Dimensionality reduction for embedding vectors
+
+Two methods are supported:
+- "truncate": keep the first N components and re-normalize
+- "pca": project onto the top N principal components of a fitted sample,
+  persisted as an .npz file next to the vector store
+"""
+import os
+import re
+from typing import Optional
+import numpy as np
+from app.core.config import settings
+
+REDUCTION_METHODS = ("none", "truncate", "pca")
+
+
+class EmbeddingReducer:
+    """Reduce embeddings from the model dimension to a smaller target dimension"""
+
+    def __init__(self, method: str = "none", dimension: Optional[int] = None):
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"Unknown reduction method '{method}', expected one of {REDUCTION_METHODS}")
+        if method != "none" and (not dimension or dimension <= 0):
+            raise ValueError("A positive target dimension is required for reduction")
+        self.method = method
+        self.dimension = dimension
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.method != "pca" or self.components is not None
+
+    def fit(self, embeddings: np.ndarray) -> "EmbeddingReducer":
+        """Fit the PCA projection on a (n_samples, model_dim) matrix."""
+        if self.method != "pca":
+            return self
+
+        matrix = np.asarray(embeddings, dtype=np.float64)
+        if matrix.ndim != 2 or matrix.shape[0] < self.dimension:
+            raise ValueError(
+                f"PCA to {self.dimension} dims needs at least {self.dimension} samples, "
+                f"got {matrix.shape[0] if matrix.ndim == 2 else 0}"
+            )
+
+        self.mean = matrix.mean(axis=0)
+        # Rows of vt are the principal axes, ordered by explained variance
+        _, _, vt = np.linalg.svd(matrix - self.mean, full_matrices=False)
+        self.components = vt[:self.dimension].astype(np.float64)
+        return self
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """Reduce a single vector or a matrix of row vectors, re-normalized to unit length."""
+        vectors = np.asarray(embeddings, dtype=np.float64)
+        if self.method == "none" or vectors.size == 0:
+            return vectors
+
+        single = vectors.ndim == 1
+        matrix = vectors[np.newaxis, :] if single else vectors
+
+        if self.method == "truncate":
+            reduced = matrix[:, :self.dimension]
+        else:
+            if self.components is None:
+                raise ValueError("PCA reducer must be fitted or loaded before transform")
+            reduced = (matrix - self.mean) @ self.components.T
+
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        reduced = reduced / norms
+        return reduced[0] if single else reduced
+
+    # ---------------------------------------------------------------------
+    # Persistence
+    # ---------------------------------------------------------------------
+    @staticmethod
+    def default_path(model_name: str, dimension: int) -> str:
+        """Location of the fitted projection for a given model and dimension."""
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", model_name).strip("_")
+        return os.path.join(settings.VECTOR_STORE_PATH, f"pca_{slug}_{dimension}.npz")
+
+    def save(self, path: str) -> None:
+        if self.method != "pca" or self.components is None:
+            raise ValueError("Only a fitted PCA reducer can be saved")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingReducer":
+        with np.load(path) as data:
+            reducer = cls("pca", int(data["components"].shape[0]))
+            reducer.mean = data["mean"]
+            reducer.components = data["components"]
+        return reducer
+
+    @classmethod
+    def load_for_model(cls, model_name: str, dimension: int) -> "EmbeddingReducer":
+        """
+        The fitted projection at default_path(). Missing is an error: falling
+        back to full-dimension vectors would not match the reduced index.
+        """
+        path = cls.default_path(model_name, dimension)
+        if not os.path.exists(path):
+            raise RuntimeError(
+                f"PCA projection for {model_name} ({dimension} dims) not found at {path}. "
+                f"Run `python -m app.scripts.embedding_reduction fit --dimension {dimension}` first."
+            )
+        return cls.load(path)
@@ -1,17 +1,111 @@
 """
 Embedding service using OpenAI API
+
+Inputs are split into batches bounded by an estimated token count and input
+count, the batches run concurrently on an AsyncOpenAI client behind a
+semaphore, and rate-limit/server errors are retried with jittered exponential
+backoff. Results are returned in input order.
 """
-import os
+import asyncio
+import random
+from typing import List, Optional
+import httpx
 import openai
-from typing import List
+from app.core.config import settings
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+)
+
+
+def token_counter():
+    """Exact counts via tiktoken when it is available, else ~4 characters per token."""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        return lambda text: len(text) // 4 + 1
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
 class EmbeddingService:
     """Handles text embedding generation"""
 
-    def __init__(self, model: str = "text-embedding-3-small"):
-        self.model = model
+    def __init__(
+        self,
+        model: str = None,
+        api_key: str = None,
+        base_url: str = None,
+        max_concurrency: int = None,
+        max_batch_tokens: int = None,
+        max_batch_size: int = None,
+        max_retries: int = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.model = model or settings.OPENAI_EMBEDDING_MODEL
+        self.max_batch_tokens = max_batch_tokens or settings.EMBEDDING_MAX_BATCH_TOKENS
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_MAX_BATCH_SIZE
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+        self.semaphore = asyncio.Semaphore(max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY)
+        self.count_tokens = token_counter()
+        self.stats = {"requests": 0, "retries": 0}
+
+        # Retries are handled here (with jitter), not by the SDK
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key or settings.OPENAI_API_KEY or "not-needed",
+            base_url=base_url or settings.OPENAI_BASE_URL or None,
+            max_retries=0,
+            http_client=http_client,
+        )
+
+    def _batches(self, texts: List[str]) -> List[List[int]]:
+        """Group input indices into batches under the token and size limits."""
+        batches, current, current_tokens = [], [], 0
+        for idx, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_size
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(idx)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Retry-After when the server sends one, else full-jitter exponential backoff."""
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            try:
+                if retry_after is not None:
+                    return float(retry_after) + random.uniform(0, 0.25)
+            except ValueError:
+                pass
+        return random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch, retrying on 429/5xx/connection errors."""
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    self.stats["requests"] += 1
+                    response = await self.client.embeddings.create(model=self.model, input=texts)
+                # The API reports an index per item; don't rely on response order
+                return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
 
     async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
@@ -20,16 +114,21 @@ class EmbeddingService:
             texts: List of text strings
 
         Returns:
-            List of embedding vectors
+            List of embedding vectors, in the same order as texts
         """
         if not texts:
             return []
-        
-        # Call OpenAI embedding API
-        response = await openai.embeddings.create(
-            model=self.model,
-            input=texts
+
+        batches = self._batches(texts)
+        results = await asyncio.gather(
+            *(self._embed_batch([texts[i] for i in batch]) for batch in batches)
         )
 
-        embeddings = [item.embedding for item in response.data]
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, vectors in zip(batches, results):
+            for idx, vector in zip(batch, vectors):
+                embeddings[idx] = vector
         return embeddings
+
+    async def close(self) -> None:
+        await self.client.close()
@@ -0,0 +1,211 @@
+"""
+Embedding version registry
+
+Every embedding model configuration (model, reduction, dimension) is an
+EmbeddingVersion with its own rows in chunk_embeddings. Exactly one version is
+"active" and serves queries; a new version is built in the background with
+status "building" while the active one keeps serving, and activate_version()
+flips the two in a single transaction.
+"""
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.document import DocumentChunk
+from app.models.embedding import EmbeddingVersion, ChunkEmbedding
+
+DEFAULT_VERSION_NAME = "default"
+
+_services: Dict[Tuple[str, str, int], "LocalEmbeddingService"] = {}
+_services_lock = Lock()
+
+
+def get_active_version(db: Session) -> EmbeddingVersion:
+    """Return the serving version, registering one from settings on a fresh database."""
+    version = db.query(EmbeddingVersion).filter(EmbeddingVersion.status == "active").first()
+    if version:
+        return version
+
+    if db.query(EmbeddingVersion).count() == 0:
+        version = EmbeddingVersion(
+            name=DEFAULT_VERSION_NAME,
+            model_name=settings.EMBEDDING_MODEL,
+            reduction=settings.EMBEDDING_REDUCTION,
+            dimension=settings.EMBEDDING_DIMENSION,
+            status="active",
+            activated_at=datetime.utcnow(),
+        )
+        if version.reduction == "none":
+            version.dimension = get_embedding_service(version).dimension
+        db.add(version)
+        db.commit()
+        db.refresh(version)
+        ensure_vector_index(db, version)
+        return version
+
+    raise ValueError("No active embedding version. Activate one with app.scripts.embedding_versions.")
+
+
+def get_version(db: Session, name: str) -> EmbeddingVersion:
+    version = db.query(EmbeddingVersion).filter(EmbeddingVersion.name == name).first()
+    if not version:
+        raise ValueError(f"Embedding version '{name}' not found")
+    return version
+
+
+def get_writable_versions(db: Session) -> List[EmbeddingVersion]:
+    """Versions that must receive embeddings for newly ingested chunks."""
+    get_active_version(db)
+    return (
+        db.query(EmbeddingVersion)
+        .filter(EmbeddingVersion.status.in_(["active", "building"]))
+        .order_by(EmbeddingVersion.id)
+        .all()
+    )
+
+
+def get_embedding_service(version: EmbeddingVersion):
+    """Shared LocalEmbeddingService for a version; the model is loaded once per process."""
+    from app.services.local_embedding_service import LocalEmbeddingService
+
+    key = (version.model_name, version.reduction, version.dimension)
+    with _services_lock:
+        if key not in _services:
+            _services[key] = LocalEmbeddingService(
+                model_name=version.model_name,
+                reduction=version.reduction,
+                dimension=version.dimension,
+            )
+        return _services[key]
+
+
+def create_version(
+    db: Session,
+    name: str,
+    model_name: str,
+    reduction: str = "none",
+    dimension: Optional[int] = None,
+) -> EmbeddingVersion:
+    """
+    Register a new version in "building" state; it receives dual writes from
+    ingestion. Without reduction the dimension is the model's own (a
+    different dimension is rejected); with one it defaults to
+    EMBEDDING_DIMENSION.
+    """
+    version = EmbeddingVersion(
+        name=name,
+        model_name=model_name,
+        reduction=reduction,
+        dimension=dimension or settings.EMBEDDING_DIMENSION,
+        status="building",
+    )
+    if reduction == "none":
+        model_dimension = get_embedding_service(version).dimension
+        if dimension and dimension != model_dimension:
+            raise ValueError(
+                f"{model_name} produces {model_dimension}-dim vectors, not {dimension}; "
+                f"use a reduction to store fewer dimensions"
+            )
+        version.dimension = model_dimension
+    db.add(version)
+    db.commit()
+    db.refresh(version)
+    return version
+
+
+def missing_count(db: Session, version: EmbeddingVersion) -> int:
+    """Number of chunks that have no embedding under the given version."""
+    return db.execute(
+        select(func.count(DocumentChunk.id))
+        .outerjoin(
+            ChunkEmbedding,
+            (ChunkEmbedding.chunk_id == DocumentChunk.id)
+            & (ChunkEmbedding.version_id == version.id),
+        )
+        .where(ChunkEmbedding.chunk_id.is_(None), DocumentChunk.content.isnot(None))
+    ).scalar()
+
+
+def activate_version(db: Session, name: str, force: bool = False) -> EmbeddingVersion:
+    """
+    Atomically make a version the serving one.
+
+    The previously active version is retired in the same transaction, so readers
+    see either the old or the new version, never neither.
+    """
+    version = get_version(db, name)
+    if version.status == "active":
+        return version
+
+    if not force:
+        missing = missing_count(db, version)
+        if missing:
+            raise ValueError(f"Version '{name}' is missing embeddings for {missing} chunks")
+
+    # Normally built at the end of the background build; a no-op if it exists
+    ensure_vector_index(db, version)
+
+    db.query(EmbeddingVersion).filter(
+        EmbeddingVersion.status == "active"
+    ).update({"status": "retired"}, synchronize_session=False)
+    db.flush()
+    version.status = "active"
+    version.activated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(version)
+    return version
+
+
+def save_chunk_embeddings(
+    db: Session,
+    version: EmbeddingVersion,
+    chunk_ids: List[int],
+    embeddings,
+) -> None:
+    """Upsert embeddings for the given chunks under one version (no commit)."""
+    rows = [
+        {
+            "chunk_id": chunk_id,
+            "version_id": version.id,
+            "embedding": [float(x) for x in embedding],
+            "updated_at": datetime.utcnow(),
+        }
+        for chunk_id, embedding in zip(chunk_ids, embeddings)
+    ]
+    if not rows:
+        return
+
+    stmt = insert(ChunkEmbedding).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ChunkEmbedding.chunk_id, ChunkEmbedding.version_id],
+        set_={"embedding": stmt.excluded.embedding, "updated_at": stmt.excluded.updated_at},
+    )
+    db.execute(stmt)
+
+
+def vector_index_name(version: EmbeddingVersion) -> str:
+    return f"ix_chunk_embeddings_hnsw_v{version.id}"
+
+
+def ensure_vector_index(db: Session, version: EmbeddingVersion) -> None:
+    """
+    Create the version's HNSW (cosine) index if it does not exist yet.
+
+    The index is partial (one version) and on embedding::vector(<dimension>);
+    VectorStore queries use the same expression so the planner can pick it.
+    Built CONCURRENTLY, so ingestion keeps writing while it builds. That waits
+    for every open transaction, so the session's own transaction is committed first.
+    """
+    dimension = int(version.dimension)
+    statement = text(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {vector_index_name(version)} "
+        f"ON chunk_embeddings USING hnsw ((embedding::vector({dimension})) vector_cosine_ops) "
+        f"WITH (m = {int(settings.HNSW_M)}, ef_construction = {int(settings.HNSW_EF_CONSTRUCTION)}) "
+        f"WHERE version_id = {int(version.id)}"
+    )
+    db.commit()
+    with db.get_bind().connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(statement)
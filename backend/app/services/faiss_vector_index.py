@@ -0,0 +1,224 @@
+"""
+FAISS approximate vector index (IVF-Flat or HNSW)
+
+Built from chunk_embeddings by app.scripts.build_vector_index and persisted
+under FAISS_INDEX_PATH as v<version_id>_<kind>.faiss plus a JSON manifest
+holding the build watermark. Each worker loads the index on first use.
+
+Rows written after the build watermark are held in a small exact in-process
+index (InMemoryVectorIndex) and merged into every result, so new documents
+are searchable before the next rebuild. Rebuild periodically (cron/deploy)
+to fold the delta back into the ANN index.
+"""
+import json
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.embedding import EmbeddingVersion
+from app.services.vector_index import InMemoryVectorIndex, iter_embedding_batches
+
+try:
+    import faiss
+except ImportError:  # optional: only the faiss_* backends need it
+    faiss = None
+
+KINDS = ("ivf", "hnsw")
+
+
+def _require_faiss() -> None:
+    if faiss is None:
+        raise RuntimeError("FAISS is not installed (pip install faiss-cpu)")
+
+
+def index_path(version_id: int, kind: str) -> str:
+    return os.path.join(settings.FAISS_INDEX_PATH, f"v{version_id}_{kind}")
+
+
+def default_nlist(count: int) -> int:
+    """IVF list count: ~4*sqrt(n), with at least 39 training points per list."""
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def create_index(
+    kind: str,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    nlist: Optional[int] = None,
+    hnsw_m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+):
+    """Build an inner-product FAISS index over L2-normalized vectors, keyed by chunk id."""
+    _require_faiss()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    count, dimension = vectors.shape
+
+    if kind == "ivf":
+        nlist = nlist or default_nlist(count)
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        # 256 points per list is plenty for k-means
+        sample = vectors
+        if count > nlist * 256:
+            rows = np.random.default_rng(0).choice(count, nlist * 256, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(sample)
+        index.add_with_ids(vectors, ids)
+        return index
+
+    if kind == "hnsw":
+        graph = faiss.IndexHNSWFlat(dimension, hnsw_m or settings.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        graph.hnsw.efConstruction = ef_construction or settings.HNSW_EF_CONSTRUCTION
+        index = faiss.IndexIDMap2(graph)
+        index.add_with_ids(vectors, ids)
+        return index
+
+    raise ValueError(f"Unknown FAISS index kind: {kind}")
+
+
+def search_params(kind: str, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    if kind == "ivf":
+        return faiss.SearchParametersIVF(nprobe=nprobe or settings.FAISS_IVF_NPROBE)
+    return faiss.SearchParametersHNSW(efSearch=ef_search or settings.HNSW_EF_SEARCH)
+
+
+# -------------------------------------------------------------------------
+# Build (offline)
+# -------------------------------------------------------------------------
+def build_faiss_index(db: Session, version: EmbeddingVersion, kind: str) -> str:
+    """Build the version's index from the database and publish it atomically."""
+    _require_faiss()
+    started = time.time()
+    chunk_ids, vectors, watermark = [], [], None
+    for batch_ids, _, batch_vectors, updated_at in iter_embedding_batches(db, version.id, None):
+        chunk_ids.extend(batch_ids)
+        vectors.append(batch_vectors)
+        if updated_at and (watermark is None or updated_at > watermark):
+            watermark = updated_at
+    if not chunk_ids:
+        raise ValueError(f"No embeddings stored for version {version.id}")
+
+    matrix = np.concatenate(vectors)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    index = create_index(kind, matrix, np.asarray(chunk_ids, dtype=np.int64))
+
+    path = index_path(version.id, kind)
+    os.makedirs(settings.FAISS_INDEX_PATH, exist_ok=True)
+    # Index before manifest: a reader that sees the new manifest also sees the
+    # new index, and an old manifest only makes its delta overlap more rows
+    faiss.write_index(index, path + ".faiss.tmp")
+    os.replace(path + ".faiss.tmp", path + ".faiss")
+    with open(path + ".json.tmp", "w") as f:
+        json.dump({
+            "version_id": version.id,
+            "kind": kind,
+            "dimension": int(version.dimension),
+            "count": len(chunk_ids),
+            "watermark": watermark.isoformat() if watermark else None,
+            "built_at": datetime.utcnow().isoformat(),
+        }, f)
+    os.replace(path + ".json.tmp", path + ".json")
+
+    print(f"[VectorIndex] Built FAISS {kind} index for version {version.id}: "
+          f"{len(chunk_ids)} vectors in {time.time() - started:.1f}s")
+    return path
+
+
+# -------------------------------------------------------------------------
+# Serving
+# -------------------------------------------------------------------------
+class FaissVectorIndex:
+    """A loaded FAISS index plus the exact delta of rows written since its build"""
+
+    def __init__(self, path: str, kind: str):
+        _require_faiss()
+        self.kind = kind
+        # Manifest first (see build_faiss_index)
+        with open(path + ".json") as f:
+            self.manifest = json.load(f)
+        self.index = faiss.read_index(path + ".faiss")
+        self.dimension = self.manifest["dimension"]
+        self.delta = InMemoryVectorIndex(self.dimension)
+        watermark = self.manifest.get("watermark")
+        self.watermark = datetime.fromisoformat(watermark) if watermark else None
+        self.synced_at = 0.0
+
+    def sync(self, db: Session) -> None:
+        """Add rows written since the watermark to the delta."""
+        # Overlap the watermark so rows committed late are re-read, not missed
+        since = self.watermark - timedelta(seconds=30) if self.watermark else None
+        for chunk_ids, document_ids, vectors, updated_at in iter_embedding_batches(
+            db, self.manifest["version_id"], since
+        ):
+            self.delta.add(chunk_ids, vectors, document_ids)
+            if updated_at and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+        self.synced_at = time.monotonic()
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Approximate top-k (chunk_id, cosine similarity), merged with the exact delta."""
+        query = np.asarray(query, dtype=np.float32).reshape(1, self.dimension)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        scores, ids = self.index.search(query, k, params=search_params(self.kind))
+        # Re-embedded chunks: the delta holds the current vector
+        hits = {
+            int(i): float(s) for i, s in zip(ids[0], scores[0])
+            if i >= 0 and int(i) not in self.delta
+        }
+        hits.update(dict(self.delta.search(query[0], k)))
+        return sorted(hits.items(), key=lambda hit: hit[1], reverse=True)[:k]
+
+    def search_batch(self, queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """search() for many queries in one FAISS call (one multi-query probe)."""
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        scores, ids = self.index.search(queries, k, params=search_params(self.kind))
+        delta_hits = self.delta.search_batch(queries, k)
+        results = []
+        for row_ids, row_scores, row_delta in zip(ids, scores, delta_hits):
+            hits = {
+                int(i): float(s) for i, s in zip(row_ids, row_scores)
+                if i >= 0 and int(i) not in self.delta
+            }
+            hits.update(dict(row_delta))
+            results.append(sorted(hits.items(), key=lambda hit: hit[1], reverse=True)[:k])
+        return results
+
+
+_indexes: Dict[Tuple[int, str], Tuple[FaissVectorIndex, float]] = {}
+_indexes_lock = Lock()
+
+
+def get_faiss_index(db: Session, version: EmbeddingVersion, kind: str) -> Optional[FaissVectorIndex]:
+    """
+    Loaded index for a version, or None if none has been built. The manifest
+    and the delta are re-checked at most every VECTOR_INDEX_SYNC_SECONDS.
+    """
+    path = index_path(version.id, kind)
+    with _indexes_lock:
+        cached = _indexes.get((version.id, kind))
+        if cached and time.monotonic() - cached[0].synced_at < settings.VECTOR_INDEX_SYNC_SECONDS:
+            return cached[0]
+        try:
+            mtime = os.path.getmtime(path + ".json")
+        except FileNotFoundError:
+            return None
+
+        if cached and cached[1] == mtime:
+            index = cached[0]
+        else:
+            started = time.time()
+            index = FaissVectorIndex(path, kind)
+            print(f"[VectorIndex] Loaded FAISS {kind} index for version {version.id}: "
+                  f"{index.index.ntotal} vectors in {time.time() - started:.1f}s")
+        index.sync(db)
+        _indexes[(version.id, kind)] = (index, mtime)
+        return index
@@ -0,0 +1,64 @@
+"""
+Async Ollama client
+
+A minimal replacement for the langchain Ollama wrapper, which opens a new
+HTTP connection for every call and has no native async path. This client
+keeps one httpx.AsyncClient (and its keep-alive pool) for the life of the
+app, so generations never block the event loop and cancelling the awaiting
+task aborts the HTTP request.
+"""
+import json
+from typing import AsyncIterator, Optional
+import httpx
+
+
+class OllamaLLM:
+    """Text completion against Ollama's /api/generate"""
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        timeout: float = 120.0,
+        temperature: float = 0.0,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.model = model
+        self.temperature = temperature
+        self.client = http_client or httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=5.0),
+        )
+
+    async def ainvoke(self, prompt: str) -> str:
+        response = await self.client.post("/api/generate", json={
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {"temperature": self.temperature},
+        })
+        response.raise_for_status()
+        return response.json()["response"]
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Answer pieces as Ollama generates them (one JSON object per line)."""
+        async with self.client.stream("POST", "/api/generate", json={
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+            "options": {"temperature": self.temperature},
+        }) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(data["error"])
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    return
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -2,23 +2,46 @@
 Local embedding service using multilingual e5-base model
 Optimized for semantic search in English and Indonesian.
 """
+import asyncio
+from typing import List
 from sentence_transformers import SentenceTransformer
 import numpy as np
+from app.core.config import settings
+from app.services.embedding_reducer import EmbeddingReducer
 
 
 class LocalEmbeddingService:
-    def __init__(self):
+    def __init__(self, model_name: str = None, reduction: str = None, dimension: int = None):
         # Load multilingual model for semantic retrieval
-        self.model_name = "intfloat/multilingual-e5-base"
+        self.model_name = model_name or settings.EMBEDDING_MODEL
         print(f"[EmbeddingService] Loading model: {self.model_name}")
         self.model = SentenceTransformer(self.model_name)
+        self.reducer = self._load_reducer(
+            reduction or settings.EMBEDDING_REDUCTION,
+            dimension or settings.EMBEDDING_DIMENSION,
+        )
 
-    def embed_text(self, text: str):
+    @property
+    def dimension(self) -> int:
+        """Length of the vectors this service produces."""
+        if self.reducer.method != "none":
+            return self.reducer.dimension
+        return self.model.get_sentence_embedding_dimension()
+
+    def _load_reducer(self, method: str, dimension: int) -> EmbeddingReducer:
+        """Build the optional reduction stage (EMBEDDING_REDUCTION by default)."""
+        if method == "pca":
+            print(f"[EmbeddingService] Loading PCA projection ({dimension} dims)")
+            return EmbeddingReducer.load_for_model(self.model_name, dimension)
+        return EmbeddingReducer(method, dimension if method != "none" else None)
+
+    def embed_text(self, text: str, reduce: bool = True):
         """
         Generate embedding for given text using multilingual e5-base model.
 
         Args:
             text (str): input text or query
+            reduce (bool): apply the configured dimensionality reduction
 
         Returns:
             np.ndarray: embedding vector (float64)
@@ -34,9 +57,45 @@ class LocalEmbeddingService:
 
             # Convert to numpy array float64 for compatibility with PostgreSQL float8[]
             vec = np.array(embedding[0], dtype=np.float64)
+            if reduce:
+                vec = self.reducer.transform(vec)
             print(f"[EmbeddingService] Embedding generated len={len(vec)} norm={np.linalg.norm(vec):.3f}")
             return vec
 
         except Exception as e:
             print(f"[EmbeddingService] Error generating embedding: {e}")
             return np.array([])
+
+    def embed_texts(self, texts: List[str], batch_size: int = None, reduce: bool = True) -> np.ndarray:
+        """
+        Generate embeddings for many texts in batched forward passes.
+
+        Args:
+            texts: input texts, embedded with the same prefix as embed_text
+            batch_size: texts per forward pass (defaults to EMBEDDING_BATCH_SIZE)
+            reduce: apply the configured dimensionality reduction
+
+        Returns:
+            np.ndarray: (len(texts), dim) matrix (float64), rows in input order
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float64)
+
+        formatted = [f"query: {(t or '').strip()}" for t in texts]
+        embeddings = self.model.encode(
+            formatted,
+            batch_size=batch_size or settings.EMBEDDING_BATCH_SIZE,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        embeddings = np.asarray(embeddings, dtype=np.float64)
+        return self.reducer.transform(embeddings) if reduce else embeddings
+
+    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Same interface as EmbeddingService.generate_embeddings (OpenAI). The
+        forward pass runs in a worker thread so the event loop keeps serving.
+        """
+        if not texts:
+            return []
+        return (await asyncio.to_thread(self.embed_texts, texts)).tolist()
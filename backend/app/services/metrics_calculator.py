@@ -274,4 +274,28 @@ class MetricsCalculator:
                 }
             }
         
+        elif metric == "total_distributions":
+            distributions = self.db.query(Distribution).filter(
+                Distribution.fund_id == fund_id
+            ).order_by(Distribution.distribution_date).all()
+
+            total_distributions = self.calculate_total_distributions(fund_id)
+
+            return {
+                "metric": "Total Distributions",
+                "formula": "Sum of Distributions",
+                "result": float(total_distributions) if total_distributions else 0,
+                "explanation": f"Total Distributions = sum of {len(distributions)} distributions = {total_distributions}",
+                "transactions": {
+                    "distributions": [
+                        {
+                            "date": str(dist.distribution_date),
+                            "amount": float(dist.amount),
+                            "is_recallable": dist.is_recallable,
+                            "description": dist.description
+                        } for dist in distributions
+                    ]
+                }
+            }
+
         return {"error": "Unknown metric"}
@@ -0,0 +1,340 @@
+"""
+Memory-mapped on-disk vector index
+
+The ingestion side writes the active version's normalized embeddings to a raw
+float32 file under VECTOR_STORE_PATH, with chunk/document id sidecars and a
+manifest. Every API worker opens the same file with np.memmap, so all workers
+share one copy of the vectors through the OS page cache and start serving
+without scanning the database.
+
+Layout:
+    <VECTOR_STORE_PATH>/mmap_v<version_id>/
+        CURRENT                   name of the live generation
+        build.lock                serializes writers
+        gen_<n>/manifest.json     format, version, dimension, count, watermark
+        gen_<n>/vectors.f32       (count, dimension) float32, C order
+        gen_<n>/ids.npy           int64 chunk ids
+        gen_<n>/document_ids.npy  int64 document ids
+
+Generations are immutable; a refresh writes a new one and swaps CURRENT
+atomically, so readers never see a half-written file. When a refresh only
+adds chunks, the new generation hard-links the previous vectors.f32 and
+appends to it: readers of the previous generation map only its first
+`count` rows, so the rows after them are invisible to them, and ingesting a
+document costs O(new chunks) instead of rewriting the whole corpus.
+"""
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.embedding import ChunkEmbedding, EmbeddingVersion
+from app.services.vector_index import iter_embedding_batches, top_k, top_k_batch
+
+FORMAT_VERSION = 1
+KEEP_GENERATIONS = 2
+
+
+def index_dir(version_id: int) -> str:
+    return os.path.join(settings.VECTOR_STORE_PATH, f"mmap_v{version_id}")
+
+
+def _current_generation(base: str) -> Optional[str]:
+    try:
+        with open(os.path.join(base, "CURRENT")) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(base, name) if name else None
+
+
+class MmapVectorIndex:
+    """Read-only view of one index generation, backed by np.memmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector index format in {path}")
+
+        self.dimension = self.manifest["dimension"]
+        count = self.manifest["count"]
+        if count:
+            self.vectors = np.memmap(
+                os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r",
+                shape=(count, self.dimension),
+            )
+        else:
+            self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.document_ids = np.load(os.path.join(path, "document_ids.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        min_score: float = -1.0,
+        document_id: Optional[int] = None,
+        chunk_ids: Optional[Iterable[int]] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (chunk_id, cosine similarity) pairs, best first. With chunk_ids,
+        only those candidates are scored (and paged in).
+        """
+        if len(self.ids) == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(self.dimension)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if document_id is None and chunk_ids is None:
+            return top_k(self.vectors @ query, self.ids, k, min_score)
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        if document_id is not None:
+            mask &= self.document_ids == document_id
+        if chunk_ids is not None:
+            mask &= np.isin(self.ids, np.fromiter(chunk_ids, dtype=np.int64))
+        candidates = np.flatnonzero(mask)
+        return top_k(self.vectors[candidates] @ query, self.ids[candidates], k, min_score)
+
+    def search_batch(
+        self,
+        queries: np.ndarray,
+        k: int,
+        min_score: float = -1.0,
+        document_id: Optional[int] = None,
+        chunk_ids: Optional[Iterable[int]] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """search() for many queries in one pass over the mapped vectors."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        if len(self.ids) == 0:
+            return [[] for _ in range(len(queries))]
+
+        if document_id is None and chunk_ids is None:
+            return top_k_batch(queries, self.vectors, self.ids, k, min_score)
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        if document_id is not None:
+            mask &= self.document_ids == document_id
+        if chunk_ids is not None:
+            mask &= np.isin(self.ids, np.fromiter(chunk_ids, dtype=np.int64))
+        candidates = np.flatnonzero(mask)
+        return top_k_batch(queries, self.vectors[candidates], self.ids[candidates], k, min_score)
+
+
+# -------------------------------------------------------------------------
+# Writer (ingestion side)
+# -------------------------------------------------------------------------
+@contextmanager
+def _build_lock(base: str):
+    os.makedirs(base, exist_ok=True)
+    with open(os.path.join(base, "build.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class _GenerationWriter:
+    """
+    Streams rows into a new generation directory. With extend, the new
+    generation starts with all rows of that one, sharing its vector file.
+    """
+
+    def __init__(self, path: str, dimension: int, extend: Optional[MmapVectorIndex] = None):
+        self.path = path
+        self.dimension = dimension
+        os.makedirs(path)
+        vectors_path = os.path.join(path, "vectors.f32")
+        self._ids: List[np.ndarray] = []
+        self._document_ids: List[np.ndarray] = []
+        self.count = 0
+        if extend is None:
+            self._vectors = open(vectors_path, "wb")
+            return
+
+        os.link(os.path.join(extend.path, "vectors.f32"), vectors_path)
+        self._vectors = open(vectors_path, "r+b")
+        # Drop anything a failed refresh appended after the previous rows
+        self._vectors.truncate(len(extend) * dimension * np.dtype(np.float32).itemsize)
+        self._vectors.seek(0, os.SEEK_END)
+        self._ids.append(np.asarray(extend.ids))
+        self._document_ids.append(np.asarray(extend.document_ids))
+        self.count = len(extend)
+
+    def write(self, ids, document_ids, vectors: np.ndarray) -> None:
+        if len(ids) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._vectors.write(np.ascontiguousarray(vectors / norms).tobytes())
+        self._ids.append(np.asarray(ids, dtype=np.int64))
+        self._document_ids.append(np.asarray(document_ids, dtype=np.int64))
+        self.count += len(ids)
+
+    def close(self, version_id: int, watermark: Optional[datetime]) -> None:
+        self._vectors.flush()
+        os.fsync(self._vectors.fileno())
+        self._vectors.close()
+        empty = np.zeros(0, dtype=np.int64)
+        np.save(os.path.join(self.path, "ids.npy"),
+                np.concatenate(self._ids) if self._ids else empty)
+        np.save(os.path.join(self.path, "document_ids.npy"),
+                np.concatenate(self._document_ids) if self._document_ids else empty)
+        with open(os.path.join(self.path, "manifest.json"), "w") as f:
+            json.dump({
+                "format": FORMAT_VERSION,
+                "version_id": version_id,
+                "dimension": self.dimension,
+                "count": self.count,
+                "watermark": watermark.isoformat() if watermark else None,
+                "built_at": datetime.utcnow().isoformat(),
+            }, f)
+
+
+def _publish(base: str, generation: str) -> None:
+    """Point CURRENT at the new generation and drop old ones."""
+    tmp_path = os.path.join(base, "CURRENT.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(os.path.basename(generation))
+    os.replace(tmp_path, os.path.join(base, "CURRENT"))
+
+    # Readers may still map the previous generation for a while; keep it
+    generations = sorted(
+        (d for d in os.listdir(base) if d.startswith("gen_")),
+        key=lambda d: int(d.split("_")[1]),
+    )
+    for old in generations[:-KEEP_GENERATIONS]:
+        shutil.rmtree(os.path.join(base, old), ignore_errors=True)
+
+
+def _drop_unchanged(previous: MmapVectorIndex, changed: Dict[int, Tuple]) -> None:
+    """
+    Remove rows re-read because of the watermark overlap that the previous
+    generation already holds with the same vector.
+    """
+    if not changed:
+        return
+    positions = np.flatnonzero(np.isin(previous.ids, np.fromiter(changed, dtype=np.int64)))
+    for position in positions:
+        chunk_id = int(previous.ids[position])
+        vector = np.asarray(changed[chunk_id][1], dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        if (int(previous.document_ids[position]) == changed[chunk_id][0]
+                and np.allclose(previous.vectors[position], vector, atol=1e-6)):
+            del changed[chunk_id]
+
+
+def refresh_mmap_index(db: Session, version: EmbeddingVersion, full: bool = False) -> str:
+    """
+    Write a new generation for a version and publish it.
+
+    Incremental by default: rows changed since the previous generation's
+    watermark are read from the database. If they are all new chunks and
+    none was deleted, they are appended to the previous vector file;
+    otherwise its rows are copied minus deleted or re-embedded chunks and
+    the changed rows added. full=True rebuilds from the database alone.
+    """
+    base = index_dir(version.id)
+    version_id, dimension = version.id, int(version.dimension)
+
+    with _build_lock(base):
+        previous_path = None if full else _current_generation(base)
+        previous = MmapVectorIndex(previous_path) if previous_path else None
+        if previous is not None and not previous.manifest.get("watermark"):
+            previous = None
+
+        generation = os.path.join(base, f"gen_{time.time_ns()}")
+        if previous is None:
+            writer = _GenerationWriter(generation, dimension)
+            watermark = None
+            for chunk_ids, document_ids, vectors, updated_at in iter_embedding_batches(db, version_id, None):
+                writer.write(chunk_ids, document_ids, vectors)
+                if updated_at and (watermark is None or updated_at > watermark):
+                    watermark = updated_at
+        else:
+            watermark = datetime.fromisoformat(previous.manifest["watermark"])
+            # Overlap so rows committed late with an earlier updated_at are not missed
+            since = watermark - timedelta(seconds=30)
+            changed: Dict[int, Tuple] = {}
+            for chunk_ids, document_ids, vectors, updated_at in iter_embedding_batches(db, version_id, since):
+                for i, chunk_id in enumerate(chunk_ids):
+                    changed[chunk_id] = (document_ids[i], vectors[i])
+                if updated_at and updated_at > watermark:
+                    watermark = updated_at
+
+            live = np.fromiter(
+                (row.chunk_id for row in db.execute(
+                    select(ChunkEmbedding.chunk_id).where(ChunkEmbedding.version_id == version_id)
+                )),
+                dtype=np.int64,
+            )
+            _drop_unchanged(previous, changed)
+            changed_ids = np.fromiter(changed, dtype=np.int64, count=len(changed))
+            stale = ~np.isin(previous.ids, live) | np.isin(previous.ids, changed_ids)
+
+            if not stale.any():
+                writer = _GenerationWriter(generation, dimension, extend=previous)
+            else:
+                writer = _GenerationWriter(generation, dimension)
+                block = 65536
+                for start in range(0, len(previous), block):
+                    keep = ~stale[start:start + block]
+                    writer.write(previous.ids[start:start + block][keep],
+                                 previous.document_ids[start:start + block][keep],
+                                 previous.vectors[start:start + block][keep])
+            if changed:
+                ids = list(changed)
+                writer.write(ids, [changed[i][0] for i in ids], np.stack([changed[i][1] for i in ids]))
+
+        writer.close(version_id, watermark)
+        _publish(base, generation)
+
+    print(f"[VectorIndex] Published mmap index for version {version_id}: "
+          f"{writer.count} vectors at {generation}")
+    return generation
+
+
+# -------------------------------------------------------------------------
+# Reader (API workers)
+# -------------------------------------------------------------------------
+_readers: Dict[int, Tuple[str, MmapVectorIndex, float]] = {}
+_readers_lock = Lock()
+
+
+def get_mmap_index(version: EmbeddingVersion) -> Optional[MmapVectorIndex]:
+    """
+    Current generation for a version, or None if none has been built yet.
+    CURRENT is re-checked at most every VECTOR_INDEX_SYNC_SECONDS.
+    """
+    with _readers_lock:
+        cached = _readers.get(version.id)
+        now = time.monotonic()
+        if cached and now - cached[2] < settings.VECTOR_INDEX_SYNC_SECONDS:
+            return cached[1]
+
+        path = _current_generation(index_dir(version.id))
+        if path is None:
+            return None
+        if cached and cached[0] == path:
+            _readers[version.id] = (path, cached[1], now)
+            return cached[1]
+
+        reader = MmapVectorIndex(path)
+        _readers[version.id] = (path, reader, now)
+        return reader
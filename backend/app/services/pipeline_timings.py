@@ -0,0 +1,121 @@
+"""
+Per-stage timings of the chat pipeline
+
+QueryEngine opens a StageTimings for each question (start()); code anywhere
+below it records a stage with `with timed("embed"):`. The current timings
+are found through a context variable, which asyncio tasks and
+asyncio.to_thread workers inherit, so stages running concurrently or in
+threads are attributed to the right question. Outside a question timed() is
+a no-op. A stage that runs more than once (e.g. search in hybrid mode) is
+summed.
+
+    intent    keyword intent classification
+    route     metric / transaction listing answered from SQL
+    cache     answer cache lookup
+    embed     query embedding
+    search    vector top-k (backend)
+    lexical   full-text search (hybrid / prefilter modes)
+    retrieve  similarity_search as a whole (embed + search + chunk fetch)
+    metrics   MetricsCalculator
+    prompt    prompt assembly
+    llm       generation
+
+finish() exports them as Prometheus histograms labeled by stage and intent,
+served at /metrics when prometheus_client is installed:
+
+    rag_stage_duration_seconds{stage, intent}
+    rag_llm_tokens{direction="in"|"out", intent}
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    from prometheus_client import Histogram
+except ImportError:  # optional: timings are still returned in debug responses
+    Histogram = None
+
+if Histogram is not None:
+    STAGE_SECONDS = Histogram(
+        "rag_stage_duration_seconds",
+        "Duration of one chat pipeline stage",
+        ["stage", "intent"],
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+    )
+    LLM_TOKENS = Histogram(
+        "rag_llm_tokens",
+        "Prompt (in) and answer (out) tokens of one chat question",
+        ["direction", "intent"],
+        buckets=(32, 64, 128, 256, 512, 1024, 2048, 4096, 8192),
+    )
+
+
+class StageTimings:
+    """Stage durations and token counts of one question"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.intent = "unknown"
+        self.tokens_in: Optional[int] = None
+        self.tokens_out: Optional[int] = None
+        self._lock = Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Debug breakdown (milliseconds)."""
+        with self._lock:
+            stages = {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()}
+        return {
+            "intent": self.intent,
+            "stages_ms": stages,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+        }
+
+    def finish(self) -> None:
+        """Export to the Prometheus histograms (once per question)."""
+        if Histogram is None:
+            return
+        with self._lock:
+            stages = list(self.stages.items())
+        for stage, seconds in stages:
+            STAGE_SECONDS.labels(stage=stage, intent=self.intent).observe(seconds)
+        if self.tokens_in is not None:
+            LLM_TOKENS.labels(direction="in", intent=self.intent).observe(self.tokens_in)
+        if self.tokens_out is not None:
+            LLM_TOKENS.labels(direction="out", intent=self.intent).observe(self.tokens_out)
+
+
+_current: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+
+
+def start() -> StageTimings:
+    """New timings for the question being handled in this context."""
+    timings = StageTimings()
+    _current.set(timings)
+    return timings
+
+
+def current() -> Optional[StageTimings]:
+    return _current.get()
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Add the duration of the block to the current question's stage, if any."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - started)
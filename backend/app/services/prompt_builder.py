@@ -0,0 +1,109 @@
+"""
+Token-budgeted prompt assembly
+
+The prompt gets a fixed token budget (settings.PROMPT_TOKEN_BUDGET) so its
+size, and with it generation latency, stays flat however many chunks are
+retrieved or however long the conversation gets. After the instructions and
+the question, the budget is filled by priority:
+
+    1. fund metrics
+    2. retrieved chunks, best first
+    3. the conversation: its rolling summary, then the most recent turns
+
+Anything that does not fit is left out. Older turns are not lost: chat
+conversations fold them into the rolling summary (see
+QueryEngine.summarize_conversation).
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.services.embedding_service import token_counter
+
+TEMPLATE = """
+You are a fund analysis assistant with access to financial documents.
+
+Use ONLY the following context extracted from PDF documents:
+{context}
+
+Metrics (if available): {metrics}
+
+Previous conversation (if any):
+{conversation}
+
+Question: {query}
+
+Answer clearly and concisely based only on the provided context.
+If the context doesn't have enough information, say so explicitly.
+"""
+
+
+def page_label(doc: Dict[str, Any]) -> str:
+    """'Page 3', or 'Pages 1, 2, 5' for a chunk that repeats across pages."""
+    pages = doc.get("pages") or []
+    if len(pages) > 1:
+        return "Pages " + ", ".join(str(page) for page in pages)
+    return f"Page {doc.get('page', '?')}"
+
+
+def format_turn(message: Dict[str, Any]) -> str:
+    """'User: ...' / 'Assistant: ...' (no timestamps or other metadata)."""
+    role = "User" if message.get("role") == "user" else "Assistant"
+    return f"{role}: {message.get('content', '')}"
+
+
+class PromptBuilder:
+    """Builds the RAG prompt within a token budget"""
+
+    def __init__(self, budget_tokens: Optional[int] = None, count_tokens: Optional[Callable[[str], int]] = None):
+        self.budget_tokens = budget_tokens or settings.PROMPT_TOKEN_BUDGET
+        self.count_tokens = count_tokens or token_counter()
+
+    def build(
+        self,
+        query: str,
+        context: List[Dict[str, Any]],
+        metrics: Optional[Dict[str, Any]],
+        conversation_history: List[Dict[str, Any]],
+        conversation_summary: Optional[str] = None,
+    ) -> str:
+        remaining = self.budget_tokens - self.count_tokens(
+            TEMPLATE.format(context="", metrics="None", conversation="None", query=query)
+        )
+
+        def fits(text: str) -> bool:
+            nonlocal remaining
+            tokens = self.count_tokens(text) + 1  # + separator
+            if tokens > remaining:
+                return False
+            remaining -= tokens
+            return True
+
+        # 1. Metrics (without the ones not calculated)
+        metrics_text = "None"
+        if metrics:
+            compact = json.dumps({k: v for k, v in metrics.items() if v is not None}, default=str)
+            if fits(compact):
+                metrics_text = compact
+
+        # 2. Chunks, best first; a long chunk is skipped rather than cut mid-sentence
+        blocks = [f"[{page_label(doc)}]\n{doc['content']}" for doc in context]
+        context_text = "\n\n".join(block for block in blocks if fits(block))
+
+        # 3. Summary of the older turns, then the most recent turns that fit
+        conversation = []
+        if conversation_summary and fits(conversation_summary):
+            conversation.append(f"Summary of earlier conversation: {conversation_summary}")
+        recent = []
+        for message in reversed(conversation_history):
+            turn = format_turn(message)
+            if not fits(turn):
+                break
+            recent.append(turn)
+        conversation.extend(reversed(recent))
+
+        return TEMPLATE.format(
+            context=context_text,
+            metrics=metrics_text,
+            conversation="\n".join(conversation) or "None",
+            query=query,
+        )
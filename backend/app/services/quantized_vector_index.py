@@ -0,0 +1,197 @@
+"""
+Quantized in-process vector index
+
+Holds compressed codes instead of float32 vectors and only ranks candidates;
+the best few hundred are then rescored against the full-precision vectors in
+chunk_embeddings (see QuantizedBackend in app.services.vector_backends).
+
+    int8    per-vector scalar quantization: round(v / max|v| * 127) plus one
+            float32 scale per row (dimension + 4 bytes, ~4x smaller than float32)
+    binary  1 sign bit per component, ranked by Hamming distance
+            (dimension / 8 bytes, 32x smaller)
+"""
+from threading import RLock
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+
+METHODS = ("int8", "binary")
+
+# Bits set in each byte value, for Hamming distances without np.bitwise_count (NumPy < 2)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Rows scored per step: the float32 copy of an int8 block stays in cache
+_BLOCK_ROWS = 4096
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(int8 codes, float32 per-row scales) with vectors ~= codes * scales[:, None]."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits packed 8 per byte."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def hamming(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """Hamming distance of every packed code row to the query code."""
+    if codes.shape[1] % 8 == 0:
+        # 64 bits per XOR when the row width allows it
+        codes, query_code = codes.view(np.uint64), query_code.view(np.uint64)
+    xor = np.bitwise_xor(codes, query_code)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[xor.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+class QuantizedVectorIndex:
+    """Candidate generation over int8 or binary codes (same row layout as InMemoryVectorIndex)"""
+
+    def __init__(self, dimension: int, method: str = "int8", capacity: int = 1024):
+        if method not in METHODS:
+            raise ValueError(f"Unknown quantization method '{method}', expected one of {METHODS}")
+        self.dimension = dimension
+        self.method = method
+        width = dimension if method == "int8" else (dimension + 7) // 8
+        self._codes = np.zeros((capacity, width), dtype=np.int8 if method == "int8" else np.uint8)
+        self._scales = np.zeros(capacity, dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._document_ids = np.zeros(capacity, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self._size = 0
+        self._lock = RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return chunk_id in self._positions
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the codes (and int8 scales) of the stored rows."""
+        per_row = self._codes.shape[1] + (4 if self.method == "int8" else 0)
+        return self._size * per_row
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= len(self._ids):
+            return
+        new_capacity = max(capacity, 2 * len(self._ids))
+        for name in ("_codes", "_scales", "_ids", "_document_ids"):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.method == "int8":
+            return quantize_int8(vectors)
+        return quantize_binary(vectors), None
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray, document_ids: Iterable[int]) -> None:
+        """Insert or replace vectors by chunk id."""
+        ids = list(ids)
+        if not ids:
+            return
+        codes, scales = self._encode(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension))
+        document_ids = list(document_ids)
+
+        with self._lock:
+            self._reserve(self._size + len(ids))
+            for n, (chunk_id, document_id) in enumerate(zip(ids, document_ids)):
+                row = self._positions.get(chunk_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._positions[chunk_id] = row
+                    self._ids[row] = chunk_id
+                self._codes[row] = codes[n]
+                if scales is not None:
+                    self._scales[row] = scales[n]
+                self._document_ids[row] = document_id or 0
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """Remove rows by chunk id (swap with the last row). Returns the number removed."""
+        removed = 0
+        with self._lock:
+            for chunk_id in ids:
+                row = self._positions.pop(int(chunk_id), None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    for array in (self._codes, self._scales, self._ids, self._document_ids):
+                        array[row] = array[last]
+                    self._positions[int(self._ids[row])] = row
+                self._size -= 1
+                removed += 1
+        return removed
+
+    def remove_document(self, document_id: int) -> int:
+        with self._lock:
+            ids = self._ids[:self._size][self._document_ids[:self._size] == document_id]
+            return self.remove(ids.tolist())
+
+    def export(self) -> Dict[str, np.ndarray]:
+        """Copies of the stored rows, for snapshots."""
+        with self._lock:
+            return {
+                "ids": self._ids[:self._size].copy(),
+                "document_ids": self._document_ids[:self._size].copy(),
+                "codes": self._codes[:self._size].copy(),
+                "scales": self._scales[:self._size].copy(),
+            }
+
+    def restore(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Replace the contents with exported rows."""
+        with self._lock:
+            self._ids = np.array(arrays["ids"], dtype=np.int64)
+            self._document_ids = np.array(arrays["document_ids"], dtype=np.int64)
+            self._codes = np.array(arrays["codes"], dtype=self._codes.dtype).reshape(-1, self._codes.shape[1])
+            self._scales = np.array(arrays["scales"], dtype=np.float32)
+            self._size = len(self._ids)
+            self._positions = {int(chunk_id): row for row, chunk_id in enumerate(self._ids.tolist())}
+
+    def _scores(self, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Approximate similarity of the query to the given rows, or all rows (higher is closer)."""
+        codes = self._codes[:self._size] if rows is None else self._codes[rows]
+        if self.method == "int8":
+            scales = self._scales[:self._size] if rows is None else self._scales[rows]
+            scores = np.empty(len(codes), dtype=np.float32)
+            for start in range(0, len(codes), _BLOCK_ROWS):
+                block = codes[start:start + _BLOCK_ROWS].astype(np.float32)
+                scores[start:start + len(block)] = block @ query
+            return scores * scales
+        query_code = quantize_binary(query[None, :])[0]
+        return -hamming(codes, query_code).astype(np.float32)
+
+    def candidates(
+        self,
+        query: np.ndarray,
+        n: int,
+        document_id: Optional[int] = None,
+        chunk_ids: Optional[Iterable[int]] = None,
+    ) -> np.ndarray:
+        """Chunk ids of the n best rows by approximate score, to be rescored exactly."""
+        query = np.asarray(query, dtype=np.float32).reshape(self.dimension)
+        with self._lock:
+            rows = None
+            if chunk_ids is not None:
+                rows = np.asarray([self._positions[i] for i in chunk_ids if i in self._positions],
+                                  dtype=np.int64)
+            if document_id is not None:
+                rows = np.arange(self._size) if rows is None else rows
+                rows = rows[self._document_ids[rows] == document_id]
+            ids = self._ids[:self._size] if rows is None else self._ids[rows]
+            if len(ids) <= n:
+                return ids.copy()
+            scores = self._scores(rows, query)
+            return ids[np.argpartition(-scores, n - 1)[:n]].copy()
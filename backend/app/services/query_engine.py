@@ -1,97 +1,472 @@
 """
 Query engine service for RAG-based question answering
 """
+import asyncio
 import os
-from typing import Dict, Any, List, Optional
+import re
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Set, Tuple, TypeVar
 import time
 from langchain_openai import ChatOpenAI
-from langchain_community.llms import Ollama
 from langchain.prompts import ChatPromptTemplate
 from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services import pipeline_timings
+from app.services.llm_client import OllamaLLM
+from app.services.pipeline_timings import timed
 from app.services.vector_store import VectorStore
 from app.services.metrics_calculator import MetricsCalculator
+from app.services.prompt_builder import PromptBuilder, format_turn
+from app.services.query_router import (
+    answer_metric_question,
+    answer_transaction_question,
+    metric_question,
+    transaction_question,
+)
+from app.services.retrieval_cache import get_answer_cache
 from sqlalchemy.orm import Session
 
+# Bump whenever the prompt (app.services.prompt_builder) changes, so cached
+# answers from the old prompt are not served
+PROMPT_VERSION = 2
+
+ERROR_PREFIX = "Error generating response"
+
+_whitespace_pattern = re.compile(r"\s+")
+
+T = TypeVar("T")
+
+# Searches whose caller stopped waiting, kept referenced until they finish
+_background: Set[asyncio.Future] = set()
+
+
+def _calculate_metrics(db: Session, fund_id: int) -> Dict[str, Any]:
+    with timed("metrics"):
+        return MetricsCalculator(db).calculate_all_metrics(fund_id)
+
+
+def _run_in_session(work: Callable[[Session], T]) -> T:
+    """Run blocking work on a session of its own (in a worker thread, which also closes it)."""
+    db = SessionLocal()
+    try:
+        return work(db)
+    finally:
+        db.close()
+
+
+@dataclass
+class Prepared:
+    """Outcome of the stages before generation"""
+    # Complete response when no generation is needed (metric route or answer cache)
+    response: Optional[Dict[str, Any]] = None
+    cache_key: Optional[str] = None
+    docs: List[Dict[str, Any]] = field(default_factory=list)
+    metrics: Optional[Dict[str, Any]] = None
+
 
 class QueryEngine:
-    """RAG-based query engine for fund analysis"""
-    
-    def __init__(self, db: Session):
-        self.db = db
-        self.vector_store = VectorStore(db=db)
-        self.metrics_calculator = MetricsCalculator(db)
-        self.llm = self._initialize_llm()
-    
+    """
+    RAG-based query engine for fund analysis. One instance lives for the
+    whole app (created in the FastAPI lifespan, see app.main) so the LLM
+    client and its connection pool are reused; the db session and fund
+    filter are passed to each process_query call.
+    """
+
+    def __init__(self, vector_store: Optional[VectorStore] = None, llm=None):
+        self.vector_store = vector_store or VectorStore()
+        self.llm = llm or self._initialize_llm()
+        self.prompt_builder = PromptBuilder()
+        # Generations beyond the limit wait here instead of piling onto the LLM server
+        self.llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+
     def _initialize_llm(self):
         """Initialize LLM"""
         if settings.OPENAI_API_KEY:
             return ChatOpenAI(
                 model=settings.OPENAI_MODEL,
                 temperature=0,
-                openai_api_key=settings.OPENAI_API_KEY
+                openai_api_key=settings.OPENAI_API_KEY,
+                # e.g. app.scripts.stub_server for offline load tests
+                openai_api_base=settings.OPENAI_BASE_URL or None,
+                request_timeout=settings.LLM_TIMEOUT_SECONDS
             )
         else:
             # Fallback to local LLM
-            return Ollama(
+            return OllamaLLM(
                 base_url=os.getenv("OLLAMA_BASE_URL", "http://ollama:11434"),
-                model=os.getenv("OLLAMA_MODEL", "llama3.2")
+                model=os.getenv("OLLAMA_MODEL", "llama3.2"),
+                timeout=settings.LLM_TIMEOUT_SECONDS
             )
-            # return Ollama(model="llama2")
+
+    async def aclose(self) -> None:
+        """Close the LLM client's connection pool (at shutdown)."""
+        if hasattr(self.llm, "aclose"):
+            await self.llm.aclose()
+
+    async def _acquire_llm_slot(self, timeout: float) -> None:
+        """
+        Take one of the LLM_MAX_CONCURRENCY slots, waiting at most timeout
+        seconds. The caller releases it.
+        """
+        acquire = asyncio.ensure_future(self.llm_semaphore.acquire())
+        try:
+            await asyncio.wait_for(asyncio.shield(acquire), timeout=timeout)
+        except BaseException:
+            # A pending acquire gives its slot back when cancelled; one that
+            # completed just as the wait timed out (or we were cancelled) has not
+            if not acquire.cancel() and not acquire.cancelled() and acquire.exception() is None:
+                self.llm_semaphore.release()
+            raise
+
+    async def _stream_llm(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Answer pieces as the LLM produces them, under the same concurrency
+        limit and deadline as _invoke_llm (the slot is held until the stream
+        ends). Closing the iterator (client disconnect) aborts the request.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.LLM_TIMEOUT_SECONDS
+        await self._acquire_llm_slot(settings.LLM_TIMEOUT_SECONDS)
+        try:
+            stream = self.llm.astream(prompt)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=max(deadline - loop.time(), 0))
+                    except StopAsyncIteration:
+                        return
+                    piece = chunk.content if hasattr(chunk, "content") else str(chunk)
+                    if piece:
+                        yield piece
+            finally:
+                await stream.aclose()
+        finally:
+            self.llm_semaphore.release()
+
+    async def _invoke_llm(self, prompt: str) -> str:
+        """
+        Call the LLM without blocking the event loop: at most
+        LLM_MAX_CONCURRENCY calls in flight, each bounded by
+        LLM_TIMEOUT_SECONDS including its wait for a slot. Cancelling the
+        caller (client disconnect) cancels the HTTP request.
+        """
+        async def invoke():
+            async with self.llm_semaphore:
+                return await self.llm.ainvoke(prompt)
+
+        response = await asyncio.wait_for(invoke(), timeout=settings.LLM_TIMEOUT_SECONDS)
+        if hasattr(response, "content"):
+            return response.content
+        return str(response)
     
+    # -------------------------------------------------------------------------
+    # Answer cache
+    # -------------------------------------------------------------------------
+    @property
+    def model_name(self) -> str:
+        return str(getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None)
+                   or type(self.llm).__name__)
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lowercase, single spaces, no trailing punctuation: 'What is the DPI?' == 'what is the dpi'."""
+        return _whitespace_pattern.sub(" ", query.lower()).strip().rstrip("?!. ")
+
+    def _answer_cache_key(
+            self,
+            query: str,
+            fund_id: Optional[int],
+            conversation_history: Optional[List[Dict[str, str]]],
+            filters: Optional[Dict[str, Any]],
+            use_cache: bool
+        ) -> Optional[str]:
+        """
+        Cache key of the answer, or None when it must not be cached: opted
+        out, follow-up questions (the answer depends on the conversation) and
+        Redis unavailable (no data version to key on).
+        """
+        if not (use_cache and settings.ANSWER_CACHE_ENABLED) or conversation_history:
+            return None
+        cache = get_answer_cache()
+        data_version = cache.index_version(fund_id, transactions=True)
+        if data_version is None:
+            return None
+        return cache.make_key(
+            query=self.normalize_query(query), fund_id=fund_id, filters=filters or {},
+            data_version=data_version, model=self.model_name, prompt_version=PROMPT_VERSION,
+        )
+
     async def process_query(
             self,
+            db: Session,
             query: str,
             fund_id: Optional[int] = None,
-            conversation_history: List[Dict[str, str]] = None
+            conversation_history: List[Dict[str, str]] = None,
+            filters: Optional[Dict[str, Any]] = None,
+            use_cache: bool = True,
+            conversation_summary: Optional[str] = None,
+            summarize: bool = False,
+            debug: bool = False
         ) -> Dict[str, Any]:
-        """Process a user query using RAG pipeline"""
+        """
+        Process a user query using RAG pipeline. conversation_history holds
+        the recent turns, older ones are passed as conversation_summary.
+        Metric questions and transaction listings are answered from SQL
+        without retrieval or the LLM (summarize=True adds a short LLM
+        summary to a listing); repeated questions are answered from the
+        answer cache until the fund's documents or transactions change
+        (use_cache=False forces a fresh answer). Stage timings are exported
+        to Prometheus, and returned as "timings" with debug=True.
+        """
         start_time = time.time()
+        timings = pipeline_timings.start()
 
-        # Step 1. Classify query intent
-        intent = await self._classify_intent(query)
-
-        # Step 2. Retrieve relevant chunks from pgvector
-        filter_metadata = {"fund_id": fund_id} if fund_id else None
-        relevant_docs = await self.vector_store.similarity_search(
-            query=query,
-            k=settings.TOP_K_RESULTS,
-            filter_metadata=filter_metadata
-        )
-
-        # Step 3. Calculate fund metrics if relevant
-        metrics = None
-        if intent == "calculation" and fund_id:
-            metrics = self.metrics_calculator.calculate_all_metrics(fund_id)
+        # Steps 1-3. Intent, then retrieval and metrics (unless answered without them)
+        prepared = await self._prepare(db, query, fund_id, conversation_history, filters, use_cache)
+        if prepared.response is not None:
+            response = prepared.response
+            summary = await self._summarize_listing(query, response) if summarize else None
+            if summary:
+                response = {**response, "answer": f"{response['answer']}\n\n{summary}"}
+            return self._finish({**response, "processing_time": round(time.time() - start_time, 2)},
+                                timings, debug)
 
         # Step 4. Generate final answer using context
         answer = await self._generate_response(
             query=query,
-            context=relevant_docs,
-            metrics=metrics,
-            conversation_history=conversation_history or []
+            context=prepared.docs,
+            metrics=prepared.metrics,
+            conversation_history=conversation_history or [],
+            conversation_summary=conversation_summary
         )
 
         processing_time = round(time.time() - start_time, 2)
 
         # Step 5. Return structured response
-        return {
+        response = {
             "answer": answer,
-            "sources": [
-                {
-                    "content": doc["content"],
-                    "page": doc.get("page"),
-                    "score": doc.get("score"),
-                    "metadata": {
-                        "document_id": doc.get("document_id"),
-                        "source_type": "database",
-                        "retrieved_at": time.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                }
-                for doc in relevant_docs
-            ],
-            "metrics": metrics,
-            "processing_time": processing_time
+            "sources": self._sources(prepared.docs),
+            "metrics": prepared.metrics,
+            "processing_time": processing_time,
+            "cached": False
         }
+        if prepared.cache_key is not None and not answer.startswith(ERROR_PREFIX):
+            get_answer_cache().set(prepared.cache_key, response)
+        return self._finish(dict(response), timings, debug)
+
+    @staticmethod
+    def _finish(response: Dict[str, Any], timings: pipeline_timings.StageTimings, debug: bool) -> Dict[str, Any]:
+        """Export the question's stage timings, and add them to the response in debug mode."""
+        timings.finish()
+        if debug:
+            response["timings"] = timings.as_dict()
+        return response
+
+    async def stream_query(
+            self,
+            db: Session,
+            query: str,
+            fund_id: Optional[int] = None,
+            conversation_history: List[Dict[str, str]] = None,
+            filters: Optional[Dict[str, Any]] = None,
+            use_cache: bool = True,
+            conversation_summary: Optional[str] = None,
+            summarize: bool = False,
+            debug: bool = False
+        ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        process_query as (event, data) pairs: "sources" (sources and metrics,
+        as soon as retrieval is done), then "token" for each piece of the
+        answer, then "done" with the full answer and processing time. A
+        cached or routed (metric or listing question) answer is sent as a
+        single token, followed by the listing summary if asked for. If
+        generation fails, "error" comes before "done", which then has
+        failed=True and the error text. With debug=True "done" carries the
+        stage timings.
+        """
+        start_time = time.time()
+        timings = pipeline_timings.start()
+
+        prepared = await self._prepare(db, query, fund_id, conversation_history, filters, use_cache)
+        if prepared.response is not None:
+            response = prepared.response
+            yield "sources", {"sources": response["sources"], "metrics": response["metrics"]}
+            yield "token", {"text": response["answer"]}
+            answer = response["answer"]
+            summary = await self._summarize_listing(query, response) if summarize else None
+            if summary:
+                yield "token", {"text": f"\n\n{summary}"}
+                answer = f"{answer}\n\n{summary}"
+            done = {
+                "answer": answer,
+                "processing_time": round(time.time() - start_time, 2),
+                "cached": response["cached"]
+            }
+            for key in ("calculation", "transactions"):
+                if response.get(key) is not None:
+                    done[key] = response[key]
+            yield "done", self._finish(done, timings, debug)
+            return
+
+        sources = self._sources(prepared.docs)
+        yield "sources", {"sources": sources, "metrics": prepared.metrics}
+
+        with timed("prompt"):
+            prompt = self.prompt_builder.build(
+                query, prepared.docs, prepared.metrics, conversation_history or [], conversation_summary
+            )
+        pieces = []
+        error = None
+        try:
+            # Includes the time the client takes to read each token
+            with timed("llm"):
+                async for piece in self._stream_llm(prompt):
+                    pieces.append(piece)
+                    yield "token", {"text": piece}
+        except asyncio.TimeoutError:
+            error = (f"{ERROR_PREFIX}: no answer within "
+                     f"{settings.LLM_TIMEOUT_SECONDS:g} seconds, please try again")
+        except Exception as e:
+            error = f"{ERROR_PREFIX}: {str(e)}"
+        if error is not None:
+            yield "error", {"detail": error}
+
+        answer = "".join(pieces)
+        timings.tokens_in = self.prompt_builder.count_tokens(prompt)
+        timings.tokens_out = self.prompt_builder.count_tokens(answer)
+        processing_time = round(time.time() - start_time, 2)
+        if prepared.cache_key is not None and error is None and answer:
+            get_answer_cache().set(prepared.cache_key, {
+                "answer": answer, "sources": sources, "metrics": prepared.metrics,
+                "processing_time": processing_time, "cached": False
+            })
+        done = {"answer": answer, "processing_time": processing_time, "cached": False}
+        if error is not None:
+            # answer is whatever was streamed before the failure
+            done.update(failed=True, error=error)
+        yield "done", self._finish(done, timings, debug)
+
+    # -------------------------------------------------------------------------
+    # Pipeline stages
+    # -------------------------------------------------------------------------
+    async def _prepare(
+            self,
+            db: Session,
+            query: str,
+            fund_id: Optional[int],
+            conversation_history: Optional[List[Dict[str, str]]],
+            filters: Optional[Dict[str, Any]],
+            use_cache: bool
+        ) -> Prepared:
+        """
+        Everything before generation, cheapest first: the metric and
+        transaction routes (see app.services.query_router), then the answer
+        cache, and only on a miss retrieval and the fund's metrics, which
+        run concurrently so this waits for the slower of the two rather
+        than their sum. Metrics calculated by a route that fell through are
+        reused, not calculated again.
+        """
+        # Step 1. Classify query intent (keyword match, instant). Questions
+        # restricted by filters to some documents or pages are about those
+        # documents, so they always use RAG
+        timings = pipeline_timings.current()
+        with timed("intent"):
+            intent = await self._classify_intent(query)
+            metric_names = metric_question(query) if fund_id and not filters else None
+            transaction_query = transaction_question(query) if metric_names is None and not filters else None
+        if timings is not None:
+            timings.intent = intent
+        if transaction_query is not None:
+            with timed("route"):
+                listed = await asyncio.to_thread(answer_transaction_question, db, fund_id, query, transaction_query)
+            if listed is not None:
+                if timings is not None:
+                    timings.intent = "listing"
+                return Prepared(response={**listed, "cached": False})
+
+        metrics = None
+        if metric_names is not None:
+            def route(session: Session) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+                calculated = _calculate_metrics(session, fund_id)
+                return answer_metric_question(session, fund_id, metric_names, calculated), calculated
+
+            with timed("route"):
+                routed, metrics = await asyncio.to_thread(route, db)
+            if routed is not None:
+                if timings is not None:
+                    timings.intent = "metric"
+                return Prepared(response={**routed, "cached": False})
+
+        with timed("cache"):
+            cache_key = await asyncio.to_thread(
+                self._answer_cache_key, query, fund_id, conversation_history, filters, use_cache
+            )
+            cached = await asyncio.to_thread(get_answer_cache().get, cache_key) if cache_key else None
+        if cached is not None:
+            return Prepared(response={**cached, "cached": True})
+
+        # Step 2. Retrieve relevant chunks from pgvector, while
+        # Step 3. calculating fund metrics if relevant
+        retrieval = asyncio.ensure_future(self._search(query, fund_id, filters))
+        try:
+            if metrics is None and intent == "calculation" and fund_id:
+                metrics = await asyncio.to_thread(
+                    _run_in_session, lambda session: _calculate_metrics(session, fund_id)
+                )
+            docs = await retrieval
+        finally:
+            # No-op once finished; stops waiting for retrieval if metrics failed
+            retrieval.cancel()
+        return Prepared(cache_key=cache_key, docs=docs, metrics=metrics)
+
+    async def _search(
+            self,
+            query: str,
+            fund_id: Optional[int],
+            filters: Optional[Dict[str, Any]]
+        ) -> List[Dict[str, Any]]:
+        """
+        similarity_search on its own session, so it can run next to the other
+        stages. Cancelling stops the wait; the search itself runs to the end
+        in the background (its worker thread cannot be interrupted while it
+        holds the session) and then closes the session.
+        """
+        filter_metadata = dict(filters or {})
+        if fund_id:
+            filter_metadata["fund_id"] = fund_id
+        db = SessionLocal()
+        search = asyncio.ensure_future(self.vector_store.similarity_search(
+            query=query,
+            k=settings.TOP_K_RESULTS,
+            filter_metadata=filter_metadata,
+            db=db
+        ))
+        _background.add(search)
+
+        def finished(task: asyncio.Future) -> None:
+            _background.discard(task)
+            db.close()
+
+        search.add_done_callback(finished)
+        with timed("retrieve"):
+            return await asyncio.shield(search)
+
+    @staticmethod
+    def _sources(relevant_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "content": doc["content"],
+                "page": doc.get("page"),
+                "score": doc.get("score"),
+                "metadata": {
+                    "document_id": doc.get("document_id"),
+                    "pages": doc.get("pages"),
+                    "source_type": "database",
+                    "retrieved_at": time.strftime("%Y-%m-%d %H:%M:%S")
+                }
+            }
+            for doc in relevant_docs
+        ]
 
     
     async def _classify_intent(self, query: str) -> str:
@@ -134,33 +509,69 @@ class QueryEngine:
             query: str,
             context: List[Dict[str, Any]],
             metrics: Optional[Dict[str, Any]],
-            conversation_history: List[Dict[str, str]]
+            conversation_history: List[Dict[str, str]],
+            conversation_summary: Optional[str] = None
         ) -> str:
         """Generate response using local LLM (Ollama)"""
-        context_text = "\n\n".join(
-            [f"[Page {doc.get('page', '?')}]\n{doc['content']}" for doc in context]
-        )
+        with timed("prompt"):
+            prompt = self.prompt_builder.build(query, context, metrics, conversation_history, conversation_summary)
+        timings = pipeline_timings.current()
+        if timings is not None:
+            timings.tokens_in = self.prompt_builder.count_tokens(prompt)
+        try:
+            with timed("llm"):
+                answer = await self._invoke_llm(prompt)
+            if timings is not None:
+                timings.tokens_out = self.prompt_builder.count_tokens(answer)
+            return answer
+        except asyncio.TimeoutError:
+            return (f"{ERROR_PREFIX}: no answer within "
+                    f"{settings.LLM_TIMEOUT_SECONDS:g} seconds, please try again")
+        except Exception as e:
+            return f"{ERROR_PREFIX}: {str(e)}"
 
+    async def _summarize_listing(self, query: str, response: Dict[str, Any]) -> Optional[str]:
+        """A few sentences on a transaction listing's rows, or None (no listing, no rows, LLM failure)."""
+        listing = response.get("transactions")
+        if not listing or not listing["count"]:
+            return None
         prompt = f"""
-You are a fund analysis assistant with access to financial documents.
+In at most three sentences, summarize these fund transactions for the question
+"{query}": totals, largest items, timing. Use only the figures listed.
 
-Use ONLY the following context extracted from PDF documents:
-{context_text}
+{response["answer"]}
+"""
+        try:
+            return (await self._invoke_llm(prompt)).strip() or None
+        except Exception as e:
+            print(f"[QueryEngine] Listing summary failed: {e}")
+            return None
 
-Metrics (if available): {metrics}
+    async def summarize_conversation(
+            self,
+            summary: Optional[str],
+            messages: List[Dict[str, str]]
+        ) -> Optional[str]:
+        """
+        Rolling summary: the previous summary updated with older turns that
+        leave the prompt's verbatim window. None if the LLM call fails (the
+        caller keeps the previous summary and tries again next turn).
+        """
+        turns = "\n".join(format_turn(message) for message in messages)
+        prompt = f"""
+Summarize this conversation between a user and a fund analysis assistant in
+at most {settings.CONVERSATION_SUMMARY_WORDS} words. Keep the funds, metrics,
+figures and dates discussed, and any open question.
 
-Previous conversation (if any): {conversation_history}
+Summary so far: {summary or "None"}
 
-Question: {query}
+New turns:
+{turns}
 
-Answer clearly and concisely based only on the provided context.
-If the context doesn't have enough information, say so explicitly.
+Updated summary:
 """
-
         try:
-            response = self.llm.invoke(prompt)
-            if hasattr(response, "content"):
-                return response.content
-            return str(response)
+            return (await self._invoke_llm(prompt)).strip() or None
         except Exception as e:
-            return f"Error generating response: {str(e)}"
\ No newline at end of file
+            print(f"[QueryEngine] Conversation summary failed: {e}")
+            return None
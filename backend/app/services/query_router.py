@@ -0,0 +1,353 @@
+"""
+Query router: deterministic answers to metric and transaction questions
+
+"What is the current DPI?" does not need retrieval or an LLM restating a
+number it was handed: MetricsCalculator already has the answer. QueryEngine
+asks metric_question() first; when it recognizes a plain "what is the value
+of <metric>" question about a known fund, answer_metric_question() replies
+from SQL with a templated answer and the calculation breakdown.
+
+Anything ambiguous falls through to RAG: definitions ("what does DPI mean"),
+methodology ("how is IRR calculated"), questions about a point in time ("DPI
+as of 2022"), comparisons, and metrics the calculator cannot compute yet
+(TVPI, RVPI, NAV), which the documents may still state.
+
+Listing questions ("show me all capital calls in 2024 over $1M") are parsed
+by transaction_question() into a TransactionQuery (transaction type, date
+range, amount bounds, fund named in the question) and answered by
+answer_transaction_question() with an indexed query on capital_calls,
+distributions or adjustments: exact rows in milliseconds instead of chunks
+an LLM has to transcribe. Only questions that ask for rows explicitly (list,
+show, display, how many) or filter them by date or amount are listings;
+"what are the capital call provisions in the LPA" goes to RAG.
+"""
+import re
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.fund import Fund
+from app.models.transaction import Adjustment, CapitalCall, Distribution
+from app.services.metrics_calculator import MetricsCalculator
+
+# Metric name -> question pattern; earlier patterns win, so "distributions to
+# paid-in capital" is DPI, not total distributions and PIC
+METRIC_PATTERNS = {
+    "tvpi": r"\btvpi\b|total value to paid[- ]in(?: capital)?",
+    "rvpi": r"\brvpi\b|residual value to paid[- ]in(?: capital)?",
+    "nav": r"\bnav\b|net asset value",
+    "dpi": r"\bdpi\b|distributions? to paid[- ]in(?: capital)?",
+    "irr": r"\birr\b|internal rate of return",
+    "pic": r"\bpic\b|paid[- ]in capital",
+    "total_distributions": r"\b(?:total|cumulative) distributions?\b|how much .*\bdistributed\b",
+}
+
+# Metrics MetricsCalculator computes (and can break down)
+ANSWERABLE = ("dpi", "irr", "pic", "total_distributions")
+
+_metric_patterns = [(name, re.compile(pattern)) for name, pattern in METRIC_PATTERNS.items()]
+
+# A request for the current value...
+_value_pattern = re.compile(
+    r"^(?:what(?:'s| is| are| was)|show|give|tell|calculate|compute|how much|get)\b|\bcurrent\b"
+)
+# ...and not one about its meaning, method, history or other funds
+_ambiguous_pattern = re.compile(
+    r"\b(?:mean|means|meaning|define|definition|explain|why|how (?:is|are|do|does|did|was)\b|"
+    r"formula|method|methodology|compare|compared|comparison|versus|vs|than|trend|over time|"
+    r"history|historical|change|changed|each|per|by year|quarter|quarterly|as of|at the end|"
+    r"before|after|between|since|forecast|expected|projected|target|benchmark|peers?|"
+    r"what is a)\b|\b(?:19|20)\d{2}\b"
+)
+
+
+def metric_question(query: str) -> Optional[List[str]]:
+    """
+    The metrics a query asks the current value of (in ANSWERABLE order), or
+    None when it should go through retrieval and the LLM.
+    """
+    text = " ".join(query.lower().split())
+    if not _value_pattern.search(text) or _ambiguous_pattern.search(text):
+        return None
+
+    found = set()
+    for name, pattern in _metric_patterns:
+        text, matches = pattern.subn(" ", text)
+        if matches:
+            found.add(name)
+    if not found or not found.issubset(ANSWERABLE):
+        return None
+    return [name for name in ANSWERABLE if name in found]
+
+
+def _money(value: Optional[float]) -> str:
+    return f"${value:,.2f}" if value is not None else "n/a"
+
+
+def _sentence(metric: str, breakdown: Dict[str, Any]) -> str:
+    result = breakdown.get("result")
+    if metric == "dpi":
+        return (f"DPI is {result:.2f}x: {_money(breakdown['total_distributions'])} distributed "
+                f"on {_money(breakdown['pic'])} of paid-in capital.")
+    if metric == "irr":
+        if result is None:
+            return "IRR cannot be calculated from the recorded cash flows."
+        return f"IRR is {result:.2f}%, calculated from {len(breakdown['cash_flows'])} cash flows."
+    if metric == "pic":
+        return (f"Paid-in capital is {_money(result)}: {_money(breakdown['total_calls'])} of capital "
+                f"calls less {_money(breakdown['total_adjustments'])} of adjustments.")
+    return (f"Total distributions are {_money(result)} across "
+            f"{len(breakdown['transactions']['distributions'])} distributions.")
+
+
+def answer_metric_question(
+    db: Session,
+    fund_id: int,
+    metric_names: List[str],
+    metrics: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Templated answer with metrics and per-metric calculation breakdown, or
+    None (fall through to RAG) when the fund is unknown or has no recorded
+    capital calls to calculate from. metrics, if given, are the fund's
+    already calculated calculate_all_metrics().
+    """
+    fund = db.query(Fund).filter(Fund.id == fund_id).first()
+    if fund is None:
+        return None
+    calculator = MetricsCalculator(db)
+    metrics = metrics or calculator.calculate_all_metrics(fund_id)
+    if not metrics["pic"]:
+        return None
+
+    calculation = {name: calculator.get_calculation_breakdown(fund_id, name) for name in metric_names}
+    answer = f"For {fund.name}: " + " ".join(_sentence(name, calculation[name]) for name in metric_names)
+    return {
+        "answer": answer,
+        "sources": [],
+        "metrics": metrics,
+        "calculation": calculation,
+    }
+
+
+# -----------------------------------------------------------------------------
+# Transaction listings
+# -----------------------------------------------------------------------------
+# Rows returned per listing, and rows written out in the answer text
+MAX_TRANSACTION_ROWS = 500
+MAX_LISTED_ROWS = 50
+
+# Transaction type -> (model, date column, type column)
+TRANSACTION_TABLES = {
+    "capital_calls": (CapitalCall, CapitalCall.call_date, CapitalCall.call_type),
+    "distributions": (Distribution, Distribution.distribution_date, Distribution.distribution_type),
+    "adjustments": (Adjustment, Adjustment.adjustment_date, Adjustment.adjustment_type),
+}
+
+_kind_patterns = {
+    "capital_calls": re.compile(r"\b(?:capital )?calls?\b|\bdrawdowns?\b"),
+    "distributions": re.compile(r"\bdistributions?\b"),
+    "adjustments": re.compile(r"\badjustments?\b"),
+}
+# A question is a listing when it asks for one explicitly, or filters the
+# rows by date or amount; "what are the capital call provisions" is neither
+_listing_pattern = re.compile(r"\b(?:list|show|display|how many)\b")
+# About documents, definitions or metrics rather than the rows themselves
+_not_listing_pattern = re.compile(
+    r"\b(?:why|explain|mean|means|meaning|define|definitions?|polic(?:y|ies)|terms|notices?|"
+    r"process|procedure|clauses?|provisions?|agreement|lpa|waterfall|recallable|return of capital|"
+    r"report|say|says|said|describe|summar(?:y|ize)|documents?|pages?|sections?|"
+    r"mention|mentions|mentioned|discuss|discusses|discussed|how (?:do|does|are|is|was)|"
+    r"dpi|irr|tvpi|rvpi|pic|nav)\b"
+)
+
+_date = r"(\d{4}(?:-\d{2}-\d{2})?)"
+_range_pattern = re.compile(rf"\b(?:between|from) {_date} (?:and|to|through|until) {_date}\b")
+_from_pattern = re.compile(rf"\b(since|after|from|starting) {_date}\b")
+_to_pattern = re.compile(rf"\b(before|until|through|prior to|up to) {_date}\b")
+_quarter_pattern = re.compile(r"\bq([1-4]) (\d{4})\b")
+_year_pattern = re.compile(r"\b((?:19|20)\d{2})\b")
+_amount_pattern = re.compile(
+    r"\b(over|above|more than|greater than|at least|exceeding|under|below|less than|at most) "
+    r"\$?(\d[\d,]*(?:\.\d+)?) ?(k|thousand|m|mm|million|bn|billion)?\b"
+)
+_multipliers = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mm": 1e6, "million": 1e6, "bn": 1e9, "billion": 1e9}
+
+
+@dataclass
+class TransactionQuery:
+    """Filters of a listing question (dates and amounts inclusive)"""
+    kind: str
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+
+def _period(token: str) -> Tuple[date, date]:
+    """First and last day of 'YYYY', or the day of 'YYYY-MM-DD'."""
+    if len(token) == 4:
+        return date(int(token), 1, 1), date(int(token), 12, 31)
+    day = date.fromisoformat(token)
+    return day, day
+
+
+def transaction_question(query: str) -> Optional[TransactionQuery]:
+    """
+    Filters of a question listing one type of transaction, or None when it
+    should go through retrieval and the LLM.
+    """
+    text = " ".join(query.lower().replace("$ ", "$").split()).rstrip("?!. ")
+    if _not_listing_pattern.search(text):
+        return None
+    explicit = _listing_pattern.search(text) is not None
+    kinds = [kind for kind, pattern in _kind_patterns.items() if pattern.search(text)]
+    if len(kinds) != 1:
+        return None
+    result = TransactionQuery(kind=kinds[0])
+
+    try:
+        for bound, amount, unit in _amount_pattern.findall(text):
+            value = float(amount.replace(",", "")) * _multipliers.get(unit, 1)
+            if bound in ("under", "below", "less than", "at most"):
+                result.max_amount = value
+            else:
+                result.min_amount = value
+        # Dates, once amounts (which may look like years) are out of the way
+        text = _amount_pattern.sub(" ", text)
+
+        match = _range_pattern.search(text)
+        if match:
+            result.date_from, result.date_to = _period(match.group(1))[0], _period(match.group(2))[1]
+            text = _range_pattern.sub(" ", text)
+        for word, token in _from_pattern.findall(text):
+            first, last = _period(token)
+            result.date_from = last + timedelta(days=1) if word == "after" else first
+        text = _from_pattern.sub(" ", text)
+        for word, token in _to_pattern.findall(text):
+            first, last = _period(token)
+            result.date_to = first - timedelta(days=1) if word in ("before", "prior to") else last
+        text = _to_pattern.sub(" ", text)
+
+        match = _quarter_pattern.search(text)
+        if match:
+            quarter, year = int(match.group(1)), int(match.group(2))
+            result.date_from = date(year, 3 * quarter - 2, 1)
+            result.date_to = (date(year + quarter // 4, 3 * quarter % 12 + 1, 1) - timedelta(days=1))
+            text = _quarter_pattern.sub(" ", text)
+        years = _year_pattern.findall(text)
+        if len(years) > 1:
+            return None
+        if years and result.date_from is None and result.date_to is None:
+            result.date_from, result.date_to = _period(years[0])
+    except ValueError:
+        # Not a real date ("2024-13-45"): let RAG deal with it
+        return None
+    if not explicit and result == TransactionQuery(kind=result.kind):
+        return None
+    return result
+
+
+def _fund_in_question(db: Session, query: str) -> Optional[Fund]:
+    """The fund whose name appears in the question, if exactly one does."""
+    text = query.lower()
+    funds = [fund for fund in db.query(Fund).all() if fund.name and fund.name.lower() in text]
+    return funds[0] if len(funds) == 1 else None
+
+
+def _describe(transaction_query: TransactionQuery, fund: Optional[Fund], plural: bool = True) -> str:
+    """'capital calls of Fund A from 2024-01-01 to 2024-12-31 of at least $1,000,000.00'"""
+    kind = transaction_query.kind.replace("_", " ")
+    parts = [kind if plural else kind[:-1]]
+    if fund is not None:
+        parts.append(f"of {fund.name}")
+    if transaction_query.date_from and transaction_query.date_to:
+        parts.append(f"from {transaction_query.date_from} to {transaction_query.date_to}")
+    elif transaction_query.date_from:
+        parts.append(f"from {transaction_query.date_from}")
+    elif transaction_query.date_to:
+        parts.append(f"until {transaction_query.date_to}")
+    if transaction_query.min_amount is not None:
+        parts.append(f"of at least {_money(transaction_query.min_amount)}")
+    if transaction_query.max_amount is not None:
+        parts.append(f"of at most {_money(transaction_query.max_amount)}")
+    return " ".join(parts)
+
+
+def answer_transaction_question(
+    db: Session,
+    fund_id: Optional[int],
+    query: str,
+    transaction_query: TransactionQuery,
+) -> Optional[Dict[str, Any]]:
+    """
+    The matching rows (date order, at most MAX_TRANSACTION_ROWS) with their
+    count and total, and an answer listing them. Without a fund_id the fund
+    named in the question is used, else all funds. None (fall through to
+    RAG) when fund_id is not a known fund.
+    """
+    if fund_id:
+        fund = db.query(Fund).filter(Fund.id == fund_id).first()
+        if fund is None:
+            return None
+    else:
+        fund = _fund_in_question(db, query)
+    model, date_column, type_column = TRANSACTION_TABLES[transaction_query.kind]
+
+    conditions = []
+    if fund is not None:
+        conditions.append(model.fund_id == fund.id)
+    if transaction_query.date_from is not None:
+        conditions.append(date_column >= transaction_query.date_from)
+    if transaction_query.date_to is not None:
+        conditions.append(date_column <= transaction_query.date_to)
+    if transaction_query.min_amount is not None:
+        conditions.append(model.amount >= transaction_query.min_amount)
+    if transaction_query.max_amount is not None:
+        conditions.append(model.amount <= transaction_query.max_amount)
+
+    count, total_amount = db.query(func.count(model.id), func.sum(model.amount)).filter(*conditions).one()
+    rows = db.query(
+        model.id, model.fund_id, date_column.label("date"), type_column.label("type"),
+        model.amount, model.description,
+    ).filter(*conditions).order_by(date_column, model.id).limit(MAX_TRANSACTION_ROWS).all()
+    items = [
+        {
+            "id": row.id,
+            "fund_id": row.fund_id,
+            "date": str(row.date),
+            "type": row.type,
+            "amount": float(row.amount),
+            "description": row.description,
+        }
+        for row in rows
+    ]
+
+    description = _describe(transaction_query, fund, plural=count != 1)
+    if not count:
+        answer = f"No {description} are recorded."
+    else:
+        lines = [f"{count} {description}, totalling {_money(float(total_amount or 0))}:"]
+        lines += [
+            f"- {item['date']}: {_money(item['amount'])}"
+            + (f" ({item['type']})" if item["type"] else "")
+            + (f" - {item['description']}" if item["description"] else "")
+            for item in items[:MAX_LISTED_ROWS]
+        ]
+        if count > MAX_LISTED_ROWS:
+            lines.append(f"... and {count - MAX_LISTED_ROWS} more.")
+        answer = "\n".join(lines)
+
+    return {
+        "answer": answer,
+        "sources": [],
+        "metrics": None,
+        "transactions": {
+            "filters": {**asdict(transaction_query), "fund_id": fund.id if fund is not None else None},
+            "count": count,
+            "total_amount": float(total_amount or 0),
+            "items": items,
+            "truncated": count > len(items),
+        },
+    }
@@ -3,21 +3,24 @@ RAG (Retrieval-Augmented Generation) Service
 Handles semantic search and contextual document retrieval
 """
 from sqlalchemy.orm import Session
-from sentence_transformers import SentenceTransformer, util
 import numpy as np
 from app.models.document import DocumentChunk
+from app.models.embedding import ChunkEmbedding
+from app.services.embedding_versions import get_active_version, get_embedding_service
 
 class RAGService:
     """Perform semantic search on document chunks"""
 
     def __init__(self, db: Session):
         self.db = db
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
 
     def search(self, query: str, top_k: int = 5):
         """
         Search for semantically similar chunks to the query.
 
+        Uses the active embedding version for both the query and the stored
+        vectors, so results stay consistent with VectorStore across model changes.
+
         Args:
             query (str): User query text
             top_k (int): Number of top results to return
@@ -25,23 +28,36 @@ class RAGService:
         Returns:
             List of matching document chunks with similarity scores
         """
-        # Encode query to embedding
-        query_embedding = self.model.encode([query])[0]
+        version = get_active_version(self.db)
+
+        # Encode query to embedding (unit length)
+        query_embedding = get_embedding_service(version).embed_text(query)
+        if query_embedding.size == 0:
+            return []
 
-        # Fetch document chunks
-        chunks = self.db.query(DocumentChunk).all()
+        # Fetch document chunks with their embeddings for this version
+        rows = (
+            self.db.query(DocumentChunk, ChunkEmbedding.embedding)
+            .join(ChunkEmbedding, ChunkEmbedding.chunk_id == DocumentChunk.id)
+            .filter(ChunkEmbedding.version_id == version.id)
+            .all()
+        )
+        if not rows:
+            return []
 
-        # Prepare embeddings & compute similarities
-        chunk_embeddings = np.array([np.array(c.embedding) for c in chunks])
-        similarities = util.cos_sim(query_embedding, chunk_embeddings)[0].cpu().numpy()
+        # Prepare embeddings & compute cosine similarities
+        chunk_embeddings = np.array([embedding for _, embedding in rows], dtype=np.float64)
+        norms = np.linalg.norm(chunk_embeddings, axis=1)
+        norms[norms == 0] = 1.0
+        similarities = (chunk_embeddings @ query_embedding) / norms
 
         # Sort and pick top results
         top_indices = np.argsort(similarities)[::-1][:top_k]
         results = [
             {
-                "chunk_id": chunks[i].id,
-                "page": chunks[i].page,
-                "content": chunks[i].content,
+                "chunk_id": rows[i][0].id,
+                "page": rows[i][0].page,
+                "content": rows[i][0].content,
                 "score": float(similarities[i])
             }
             for i in top_indices
@@ -0,0 +1,247 @@
+"""
+Retrieval result and answer caches
+
+similarity_search results only change when a fund's documents are ingested
+or deleted, or when the corpus is re-embedded. Results are cached under a key
+that includes the current index version of the searched scope, so a version
+bump makes every older entry unreachable instead of having to find and delete
+it:
+
+    index_version:epoch     bumped on corpus-wide changes (reindex, activation)
+    index_version:all       bumped on every change; scope of unfiltered searches
+    index_version:fund:<id> bumped when that fund's documents change
+    transactions_version:fund:<id>
+                            bumped when that fund's transactions change
+
+Generated answers (QueryEngine) also depend on the fund's transactions
+through its metrics; the answer cache is a second RetrievalCache whose keys
+include the transactions version as well.
+
+Versions live in Redis so all workers agree on them. A bump stores
+max(current + 1, time_ns), which stays monotonic even if Redis loses the key.
+Entries are kept in Redis (shared, with a TTL) and in a small in-process LRU
+in front of it. If Redis is unreachable, versions cannot be read and the
+cache is bypassed, so a stale result is never served. A bump that fails
+stays pending in the process and is replayed before the next version read;
+until it goes through, that process keeps bypassing the cache.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, List, Optional, Set
+from app.core.config import settings
+
+try:
+    import redis
+except ImportError:  # the cache is simply disabled without the client
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+EPOCH_KEY = "index_version:epoch"
+ALL_KEY = "index_version:all"
+
+# Version keys whose bump has not reached Redis yet (shared by both caches,
+# which read the same version keys)
+_pending_bumps: Set[str] = set()
+_pending_lock = Lock()
+
+# Atomic bump: max(current + 1, now)
+_BUMP_SCRIPT = """
+local now = tonumber(ARGV[1])
+for i, key in ipairs(KEYS) do
+    local current = tonumber(redis.call('GET', key) or '0')
+    redis.call('SET', key, math.max(current + 1, now))
+end
+return 1
+"""
+
+
+def fund_key(fund_id: int) -> str:
+    return f"index_version:fund:{fund_id}"
+
+
+def transactions_key(fund_id: int) -> str:
+    return f"transactions_version:fund:{fund_id}"
+
+
+class RetrievalCache:
+    """Two-tier (in-process LRU + Redis) cache of similarity_search results (or answers)"""
+
+    def __init__(self, redis_url: Optional[str] = None, lru_size: Optional[int] = None,
+                 ttl_seconds: Optional[int] = None, namespace: str = "retrieval"):
+        self.namespace = namespace
+        self.lru_size = lru_size if lru_size is not None else settings.RETRIEVAL_CACHE_LRU_SIZE
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.RETRIEVAL_CACHE_TTL_SECONDS
+        self._lru: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = Lock()
+        self._redis = None
+        self._redis_retry_at = 0.0
+        self._redis_url = redis_url or settings.REDIS_URL
+        self.stats = {"hits_local": 0, "hits_redis": 0, "misses": 0, "bypassed": 0}
+
+    def _client(self):
+        """Redis client, or None while Redis is unavailable (retried every 30s)."""
+        if redis is None:
+            return None
+        if self._redis is None and time.monotonic() >= self._redis_retry_at:
+            self._redis = redis.Redis.from_url(
+                self._redis_url, socket_timeout=0.2, socket_connect_timeout=0.2
+            )
+        return self._redis
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Redis unavailable, bypassing the {self.namespace} cache: {e}")
+        self._redis = None
+        self._redis_retry_at = time.monotonic() + 30
+
+    # -------------------------------------------------------------------------
+    # Index versions
+    # -------------------------------------------------------------------------
+    def index_version(self, fund_id: Optional[int], transactions: bool = False) -> Optional[str]:
+        """
+        '<epoch>.<scope version>' for a fund (or all funds), with the fund's
+        transactions version appended if asked, or None if unknown.
+        """
+        client = self._client()
+        if client is None or not self._replay_bumps(client):
+            return None
+        keys = [EPOCH_KEY, fund_key(fund_id) if fund_id else ALL_KEY]
+        if transactions and fund_id:
+            keys.append(transactions_key(fund_id))
+        try:
+            versions = client.mget(*keys)
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+        return ".".join(str(int(version or 0)) for version in versions)
+
+    def bump(self, fund_ids: List[Optional[int]] = (), corpus: bool = False,
+             transactions: bool = False) -> None:
+        """
+        Invalidate cached results of the given funds (and of unfiltered
+        searches), or with transactions=True only answers using their
+        transactions.
+        """
+        fund_ids = {fund_id for fund_id in fund_ids if fund_id}
+        if transactions:
+            keys = [transactions_key(fund_id) for fund_id in fund_ids]
+        else:
+            keys = [ALL_KEY] + [fund_key(fund_id) for fund_id in fund_ids]
+        if corpus:
+            keys.append(EPOCH_KEY)
+        self.clear_local()
+        if redis is None or not keys:
+            return
+        with _pending_lock:
+            _pending_bumps.update(keys)
+        client = self._client()
+        if client is not None:
+            self._replay_bumps(client)
+
+    def _replay_bumps(self, client) -> bool:
+        """Send the pending bumps to Redis; False if some are still pending."""
+        with _pending_lock:
+            keys = sorted(_pending_bumps)
+        if not keys:
+            return True
+        try:
+            client.eval(_BUMP_SCRIPT, len(keys), *keys, time.time_ns())
+        except Exception as e:
+            self._redis_failed(e)
+            return False
+        with _pending_lock:
+            _pending_bumps.difference_update(keys)
+        return True
+
+    def clear_local(self) -> None:
+        # Entries keyed by the old versions can no longer be reached; drop them
+        # from this process right away rather than waiting for LRU eviction
+        with self._lock:
+            self._lru.clear()
+
+    # -------------------------------------------------------------------------
+    # Entries
+    # -------------------------------------------------------------------------
+    def make_key(self, **parts: Any) -> str:
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return f"{self.namespace}:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.stats["hits_local"] += 1
+                return self._lru[key]
+
+        client = self._client()
+        if client is not None:
+            try:
+                raw = client.get(key)
+            except Exception as e:
+                self._redis_failed(e)
+                raw = None
+            if raw is not None:
+                results = json.loads(raw)
+                self._remember(key, results)
+                self.stats["hits_redis"] += 1
+                return results
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, results: Any) -> None:
+        self._remember(key, results)
+        client = self._client()
+        if client is None:
+            return
+        try:
+            client.set(key, json.dumps(results), ex=self.ttl_seconds)
+        except Exception as e:
+            self._redis_failed(e)
+
+    def _remember(self, key: str, results: Any) -> None:
+        if self.lru_size <= 0:
+            return
+        with self._lock:
+            self._lru[key] = results
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+
+_cache: Optional[RetrievalCache] = None
+_answer_cache: Optional[RetrievalCache] = None
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    global _cache
+    if _cache is None:
+        _cache = RetrievalCache()
+    return _cache
+
+
+def get_answer_cache() -> RetrievalCache:
+    """Cache of QueryEngine answers (same versions, plus the fund's transactions)."""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = RetrievalCache(
+            lru_size=settings.ANSWER_CACHE_LRU_SIZE,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            namespace="answer",
+        )
+    return _answer_cache
+
+
+def bump_index_version(*fund_ids: Optional[int], corpus: bool = False) -> None:
+    """Call after committing changes to searchable chunks or their embeddings."""
+    get_retrieval_cache().bump(list(fund_ids), corpus=corpus)
+    get_answer_cache().clear_local()
+
+
+def bump_transactions_version(*fund_ids: Optional[int]) -> None:
+    """Call after committing changes to a fund's capital calls, distributions or adjustments."""
+    get_answer_cache().bump(list(fund_ids), transactions=True)
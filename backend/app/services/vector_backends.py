@@ -0,0 +1,442 @@
+"""
+Vector search backends
+
+VectorStore delegates top-k search to one backend, chosen by
+settings.VECTOR_SEARCH_BACKEND:
+
+    pgvector    HNSW in PostgreSQL; filtered searches are exact in SQL (default)
+    memory      exact NumPy search over an in-process float32 matrix
+    mmap        exact NumPy search over a memory-mapped file shared by workers
+    faiss_ivf   FAISS IVF-Flat loaded from FAISS_INDEX_PATH
+    faiss_hnsw  FAISS HNSW loaded from FAISS_INDEX_PATH
+    int8        in-process int8 codes, best candidates rescored exactly in SQL
+    binary      in-process 1-bit codes (Hamming), rescored the same way
+
+Every backend returns (chunk_id, cosine similarity) pairs, best first;
+VectorStore reads the winning chunk rows. Persisted indexes are built with
+app.scripts.build_vector_index.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+from pgvector.sqlalchemy import Vector
+from app.core.config import settings
+from app.models.embedding import EmbeddingVersion
+from app.services import faiss_vector_index
+from app.services.mmap_vector_index import get_mmap_index, refresh_mmap_index
+from app.services.vector_index import get_vector_index, snapshot as memory_snapshot, write_index_snapshot
+
+Hits = List[Tuple[int, float]]
+
+
+@dataclass
+class ChunkFilter:
+    """Metadata filter on document_chunks, applied before vector scoring"""
+    fund_id: Optional[int] = None
+    document_id: Optional[int] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+    chunk_types: Optional[List[str]] = None
+    chunk_ids: Optional[List[int]] = None
+
+    @classmethod
+    def from_metadata(cls, filter_metadata: Optional[Dict[str, Any]]) -> "ChunkFilter":
+        """
+        Build from filter_metadata keys: fund_id, document_id, page_from,
+        page_to and table_type (a type or list of types, e.g. "capital_call";
+        "text" selects prose chunks).
+        """
+        if not filter_metadata:
+            return cls()
+        chunk_types = filter_metadata.get("table_type")
+        if isinstance(chunk_types, str):
+            chunk_types = [chunk_types]
+        return cls(
+            fund_id=filter_metadata.get("fund_id"),
+            document_id=filter_metadata.get("document_id"),
+            page_from=filter_metadata.get("page_from"),
+            page_to=filter_metadata.get("page_to"),
+            chunk_types=list(chunk_types) if chunk_types else None,
+        )
+
+    def __bool__(self) -> bool:
+        return any(value is not None for value in (
+            self.fund_id, self.document_id, self.page_from, self.page_to,
+            self.chunk_types, self.chunk_ids,
+        ))
+
+    @property
+    def document_only(self) -> bool:
+        """True when the in-memory document_id arrays can apply the filter alone."""
+        return self.document_id is not None and self == ChunkFilter(document_id=self.document_id)
+
+    @property
+    def chunk_ids_only(self) -> bool:
+        """True when the filter is just an explicit candidate set."""
+        return self.chunk_ids is not None and self == ChunkFilter(chunk_ids=self.chunk_ids)
+
+    def where_sql(self, alias: str = "dc") -> Tuple[str, Dict[str, Any]]:
+        """SQL conditions on document_chunks (served by its fund/document + page indexes)."""
+        conditions, params = [], {}
+        if self.fund_id is not None:
+            conditions.append(f"{alias}.fund_id = :filter_fund_id")
+            params["filter_fund_id"] = self.fund_id
+        if self.document_id is not None:
+            conditions.append(f"{alias}.document_id = :filter_document_id")
+            params["filter_document_id"] = self.document_id
+        if self.page_from is not None or self.page_to is not None:
+            params.update({
+                name: value for name, value in
+                (("filter_page_from", self.page_from), ("filter_page_to", self.page_to))
+                if value is not None
+            })
+            # A deduplicated chunk matches if any of its pages is in range
+            conditions.append(
+                f"({self._page_in_range(f'{alias}.page')} OR ({alias}.pages IS NOT NULL AND EXISTS "
+                f"(SELECT 1 FROM unnest({alias}.pages) p WHERE {self._page_in_range('p')})))"
+            )
+        if self.chunk_types:
+            conditions.append(f"{alias}.chunk_type = ANY(:filter_chunk_types)")
+            params["filter_chunk_types"] = self.chunk_types
+        if self.chunk_ids is not None:
+            conditions.append(f"{alias}.id = ANY(:filter_chunk_ids)")
+            params["filter_chunk_ids"] = list(self.chunk_ids)
+        return " AND ".join(conditions) or "TRUE", params
+
+    def _page_in_range(self, column: str) -> str:
+        bounds = []
+        if self.page_from is not None:
+            bounds.append(f"{column} >= :filter_page_from")
+        if self.page_to is not None:
+            bounds.append(f"{column} <= :filter_page_to")
+        return " AND ".join(bounds)
+
+    def resolve(self, db: Session) -> List[int]:
+        """Ids of the matching chunks, through the document_chunks indexes."""
+        if self.chunk_ids_only:
+            return list(self.chunk_ids)
+        where_clause, params = self.where_sql("dc")
+        return db.execute(
+            text(f"SELECT dc.id FROM document_chunks dc WHERE {where_clause}"), params
+        ).scalars().all()
+
+
+# -------------------------------------------------------------------------
+# Backends
+# -------------------------------------------------------------------------
+class VectorBackend(ABC):
+    """
+    Top-k cosine search over one embedding version's vectors. Backends
+    implement search(); the other hooks have working defaults.
+    """
+
+    name = ""
+    # Whether ingestion and deletes should rebuild the persisted index right away
+    rebuild_on_write = False
+
+    @abstractmethod
+    def search(
+        self,
+        db: Session,
+        version: EmbeddingVersion,
+        query_embedding: np.ndarray,
+        k: int,
+        chunk_filter: ChunkFilter,
+        min_score: float,
+    ) -> Hits:
+        """Top-k (chunk_id, cosine similarity) pairs, best first."""
+
+    def search_batch(
+        self,
+        db: Session,
+        version: EmbeddingVersion,
+        query_embeddings: np.ndarray,
+        k: int,
+        chunk_filter: ChunkFilter,
+        min_score: float,
+    ) -> List[Hits]:
+        """search() for each row of a query matrix; backends override this to score them together."""
+        return [
+            self.search(db, version, query_embedding, k, chunk_filter, min_score)
+            for query_embedding in query_embeddings
+        ]
+
+    def load(self, db: Session, version: EmbeddingVersion) -> None:
+        """Load the index this process searches, so the first query does not pay for it."""
+
+    def build(self, db: Session, version: EmbeddingVersion, full: bool = False) -> None:
+        """Build or refresh the persisted index, for backends that have one."""
+        print(f"[VectorIndex] The {self.name} backend has no persisted index to build")
+
+    def snapshot(self, db: Session, version: EmbeddingVersion) -> str:
+        """
+        Token for the data this process would search right now. Backends that
+        sync with a lag change it when they catch up, so results cached from a
+        lagging view are not served once the view is current.
+        """
+        return "live"
+
+
+class PgvectorBackend(VectorBackend):
+    name = "pgvector"
+
+    def search(self, db, version, query_embedding, k, chunk_filter, min_score) -> Hits:
+        """Top-k in SQL: HNSW for unfiltered searches, exact over the filtered chunks otherwise."""
+        params = {
+            "version_id": version.id,
+            "query_vec": query_embedding,
+            "max_distance": 1 - min_score,
+            "k": k,
+        }
+        dimension = int(version.dimension)
+        distance = f"(ce.embedding::vector({dimension}) <=> :query_vec)"
+
+        if chunk_filter:
+            # Resolve the filter through the document_chunks indexes first and
+            # score only those vectors. HNSW with a post-filter would visit the
+            # whole graph and can return fewer than k rows for a small fund.
+            where_clause, filter_params = chunk_filter.where_sql("dc")
+            params.update(filter_params)
+            search_sql = text(f"""
+                WITH candidates AS MATERIALIZED (
+                    SELECT dc.id FROM document_chunks dc WHERE {where_clause}
+                )
+                SELECT ce.chunk_id, 1 - {distance} AS score
+                FROM candidates c
+                JOIN chunk_embeddings ce
+                  ON ce.chunk_id = c.id AND ce.version_id = :version_id
+                WHERE {distance} <= :max_distance
+                ORDER BY {distance}
+                LIMIT :k
+            """).bindparams(bindparam("query_vec", type_=Vector(dimension)))
+        else:
+            # The ORDER BY expression matches the partial index expression,
+            # so the planner uses the version's HNSW index.
+            search_sql = text(f"""
+                SELECT ce.chunk_id, 1 - {distance} AS score
+                FROM chunk_embeddings ce
+                WHERE ce.version_id = :version_id
+                  AND {distance} <= :max_distance
+                ORDER BY {distance}
+                LIMIT :k
+            """).bindparams(bindparam("query_vec", type_=Vector(dimension)))
+            # HNSW returns at most ef_search candidates per scan
+            db.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(settings.HNSW_EF_SEARCH), k)}"))
+
+        rows = db.execute(search_sql, params).fetchall()
+        return [(row.chunk_id, float(row.score)) for row in rows]
+
+
+def _index_filter(db: Session, chunk_filter: ChunkFilter) -> Dict[str, Any]:
+    """Filter arguments for InMemoryVectorIndex / MmapVectorIndex searches."""
+    if not chunk_filter:
+        return {}
+    if chunk_filter.document_only:
+        return {"document_id": chunk_filter.document_id}
+    return {"chunk_ids": chunk_filter.resolve(db)}
+
+
+def _search_exact_index(index, db: Session, query_embedding, k, chunk_filter: ChunkFilter, min_score) -> Hits:
+    """Exact top-k in an InMemoryVectorIndex or MmapVectorIndex, filters applied in the index."""
+    return index.search(query_embedding, k, min_score=min_score, **_index_filter(db, chunk_filter))
+
+
+class MemoryBackend(VectorBackend):
+    name = "memory"
+
+    def search(self, db, version, query_embedding, k, chunk_filter, min_score) -> Hits:
+        index = get_vector_index(db, version)
+        return _search_exact_index(index, db, query_embedding, k, chunk_filter, min_score)
+
+    def search_batch(self, db, version, query_embeddings, k, chunk_filter, min_score) -> List[Hits]:
+        index = get_vector_index(db, version)
+        return index.search_batch(query_embeddings, k, min_score=min_score,
+                                  **_index_filter(db, chunk_filter))
+
+    def load(self, db, version) -> None:
+        get_vector_index(db, version)
+
+    def build(self, db, version, full=False) -> None:
+        write_index_snapshot(db, version)
+
+    def snapshot(self, db, version) -> str:
+        get_vector_index(db, version)
+        return memory_snapshot()
+
+
+class MmapBackend(VectorBackend):
+    name = "mmap"
+    rebuild_on_write = True
+
+    def search(self, db, version, query_embedding, k, chunk_filter, min_score) -> Hits:
+        index = get_mmap_index(version)
+        if index is None:
+            print("[VectorStore] No mmap index built yet, falling back to pgvector")
+            return PgvectorBackend().search(db, version, query_embedding, k, chunk_filter, min_score)
+        return _search_exact_index(index, db, query_embedding, k, chunk_filter, min_score)
+
+    def search_batch(self, db, version, query_embeddings, k, chunk_filter, min_score) -> List[Hits]:
+        index = get_mmap_index(version)
+        if index is None:
+            return super().search_batch(db, version, query_embeddings, k, chunk_filter, min_score)
+        return index.search_batch(query_embeddings, k, min_score=min_score,
+                                  **_index_filter(db, chunk_filter))
+
+    def load(self, db, version) -> None:
+        get_mmap_index(version)
+
+    def build(self, db, version, full=False) -> None:
+        refresh_mmap_index(db, version, full=full)
+
+    def snapshot(self, db, version) -> str:
+        index = get_mmap_index(version)
+        return index.path if index is not None else "live"
+
+
+class QuantizedBackend(VectorBackend):
+    """
+    Candidates from compressed in-process codes, then exact cosine scores for
+    the best QUANTIZED_RESCORE_CANDIDATES of them from the full-precision
+    vectors in chunk_embeddings (one primary-key lookup per query).
+    """
+
+    def __init__(self, method: str):
+        self.method = method
+        self.name = method
+
+    def search(self, db, version, query_embedding, k, chunk_filter, min_score) -> Hits:
+        index = get_vector_index(db, version, quantization=self.method)
+        candidate_ids = index.candidates(
+            query_embedding, max(k, settings.QUANTIZED_RESCORE_CANDIDATES),
+            **_index_filter(db, chunk_filter),
+        )
+        if len(candidate_ids) == 0:
+            return []
+
+        dimension = int(version.dimension)
+        distance = f"(ce.embedding::vector({dimension}) <=> :query_vec)"
+        rescore_sql = text(f"""
+            SELECT ce.chunk_id, 1 - {distance} AS score
+            FROM chunk_embeddings ce
+            WHERE ce.version_id = :version_id
+              AND ce.chunk_id = ANY(:candidate_ids)
+              AND {distance} <= :max_distance
+            ORDER BY {distance}
+            LIMIT :k
+        """).bindparams(bindparam("query_vec", type_=Vector(dimension)))
+        rows = db.execute(rescore_sql, {
+            "version_id": version.id,
+            "query_vec": query_embedding,
+            "candidate_ids": candidate_ids.tolist(),
+            "max_distance": 1 - min_score,
+            "k": k,
+        }).fetchall()
+        return [(row.chunk_id, float(row.score)) for row in rows]
+
+    def load(self, db, version) -> None:
+        get_vector_index(db, version, quantization=self.method)
+
+    def build(self, db, version, full=False) -> None:
+        write_index_snapshot(db, version, quantization=self.method)
+
+    def snapshot(self, db, version) -> str:
+        get_vector_index(db, version, quantization=self.method)
+        return memory_snapshot(self.method)
+
+
+class FaissBackend(VectorBackend):
+    """
+    Approximate search for unfiltered queries. Filtered queries are answered
+    exactly in SQL: HNSW with an id selector drops matches it cannot reach
+    through the graph, and fund-sized candidate sets are cheap to score.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.name = f"faiss_{kind}"
+
+    def search(self, db, version, query_embedding, k, chunk_filter, min_score) -> Hits:
+        index = None if chunk_filter else faiss_vector_index.get_faiss_index(db, version, self.kind)
+        if index is None:
+            if not chunk_filter:
+                print(f"[VectorStore] No FAISS {self.kind} index built yet, falling back to pgvector")
+            return PgvectorBackend().search(db, version, query_embedding, k, chunk_filter, min_score)
+
+        # Over-fetch: hits of deleted chunks are dropped below
+        return self._live_hits(db, version, [index.search(query_embedding, 2 * k)], k, min_score)[0]
+
+    def search_batch(self, db, version, query_embeddings, k, chunk_filter, min_score) -> List[Hits]:
+        index = None if chunk_filter else faiss_vector_index.get_faiss_index(db, version, self.kind)
+        if index is None:
+            return super().search_batch(db, version, query_embeddings, k, chunk_filter, min_score)
+        return self._live_hits(db, version, index.search_batch(query_embeddings, 2 * k), k, min_score)
+
+    @staticmethod
+    def _live_hits(db, version, results: List[Hits], k: int, min_score: float) -> List[Hits]:
+        """Drop hits of chunks deleted since the build (one PK lookup for all queries)."""
+        live = set(db.execute(
+            text("""
+                SELECT chunk_id FROM chunk_embeddings
+                WHERE version_id = :version_id AND chunk_id = ANY(:ids)
+            """),
+            {"version_id": version.id, "ids": list({chunk_id for hits in results for chunk_id, _ in hits})},
+        ).scalars())
+        return [[hit for hit in hits if hit[0] in live and hit[1] >= min_score][:k] for hits in results]
+
+    def load(self, db, version) -> None:
+        faiss_vector_index.get_faiss_index(db, version, self.kind)
+
+    def build(self, db, version, full=False) -> None:
+        faiss_vector_index.build_faiss_index(db, version, self.kind)
+
+    def snapshot(self, db, version) -> str:
+        index = faiss_vector_index.get_faiss_index(db, version, self.kind)
+        if index is None:
+            return "live"
+        return f"{index.manifest['built_at']}:{index.watermark}:{len(index.delta)}"
+
+
+BACKENDS = {
+    "pgvector": PgvectorBackend,
+    "memory": MemoryBackend,
+    "mmap": MmapBackend,
+    "faiss_ivf": lambda: FaissBackend("ivf"),
+    "faiss_hnsw": lambda: FaissBackend("hnsw"),
+    "int8": lambda: QuantizedBackend("int8"),
+    "binary": lambda: QuantizedBackend("binary"),
+}
+_instances: Dict[str, VectorBackend] = {}
+
+
+def get_backend(name: Optional[str] = None) -> VectorBackend:
+    """Backend by name (default: settings.VECTOR_SEARCH_BACKEND)."""
+    name = name or settings.VECTOR_SEARCH_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown vector search backend: {name} (choose from {', '.join(BACKENDS)})")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def refresh_active_index() -> None:
+    """
+    After ingestion or deletes, rebuild the configured backend's persisted
+    index for the active version in its own session (for background tasks).
+    """
+    backend = get_backend()
+    if not backend.rebuild_on_write:
+        return
+
+    from app.db.session import SessionLocal
+    from app.services.embedding_versions import get_active_version
+
+    db = SessionLocal()
+    try:
+        backend.build(db, get_active_version(db))
+    except Exception as e:
+        print(f"[VectorIndex] Failed to refresh {backend.name} index: {e}")
+    finally:
+        db.close()
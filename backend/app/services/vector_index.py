@@ -0,0 +1,430 @@
+"""
+In-process exact vector index
+
+All embeddings of the active version are held L2-normalized in one contiguous
+float32 matrix with parallel id/document arrays. A search is a single
+matrix-vector product followed by argpartition for the top k, so exact search
+over ~1M chunks takes tens of milliseconds. The index is updated in place when
+documents are ingested or deleted, and periodically synced with the database
+to pick up writes made by other processes.
+
+The same machinery keeps a QuantizedVectorIndex (int8 or binary codes) per
+quantization method for the quantized backends.
+
+Loaded indexes are saved as versioned snapshot files under
+VECTOR_STORE_PATH/snapshots (every VECTOR_INDEX_SNAPSHOT_SECONDS and at
+shutdown). A restarting process loads the snapshot and replays only the rows
+written or deleted since its watermark instead of reading every embedding.
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from threading import Lock, RLock, Thread
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.document import DocumentChunk
+from app.models.embedding import ChunkEmbedding, EmbeddingVersion
+from app.services.quantized_vector_index import QuantizedVectorIndex
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, ids: np.ndarray, k: int, min_score: float) -> List[Tuple[int, float]]:
+    """Best k (id, score) pairs by argpartition, highest score first."""
+    if scores.size == 0 or k <= 0:
+        return []
+    k = min(k, scores.size)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(ids[i]), float(scores[i])) for i in top if scores[i] >= min_score]
+
+
+def top_k_batch(
+    queries: np.ndarray, vectors: np.ndarray, ids: np.ndarray, k: int, min_score: float, block: int = 16
+) -> List[List[Tuple[int, float]]]:
+    """top_k for many normalized queries; scores are computed for a block of queries at a time."""
+    if len(vectors) == 0 or k <= 0:
+        return [[] for _ in range(len(queries))]
+    k = min(k, len(vectors))
+    results = []
+    for start in range(0, len(queries), block):
+        scores = queries[start:start + block] @ vectors.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        results.extend(
+            [(int(ids[i]), float(score)) for i, score in zip(row, row_scores) if score >= min_score]
+            for row, row_scores in zip(top, top_scores)
+        )
+    return results
+
+
+class InMemoryVectorIndex:
+    """Exact cosine-similarity index over a contiguous float32 matrix"""
+
+    def __init__(self, dimension: int, capacity: int = 1024):
+        self.dimension = dimension
+        self._vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._document_ids = np.zeros(capacity, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self._size = 0
+        self._lock = RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return chunk_id in self._positions
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= len(self._ids):
+            return
+        new_capacity = max(capacity, 2 * len(self._ids))
+        vectors = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        document_ids = np.zeros(new_capacity, dtype=np.int64)
+        document_ids[:self._size] = self._document_ids[:self._size]
+        self._vectors, self._ids, self._document_ids = vectors, ids, document_ids
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray, document_ids: Iterable[int]) -> None:
+        """Insert or replace vectors by chunk id."""
+        ids = list(ids)
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(vectors).reshape(len(ids), self.dimension))
+        document_ids = list(document_ids)
+
+        with self._lock:
+            self._reserve(self._size + len(ids))
+            for chunk_id, vector, document_id in zip(ids, vectors, document_ids):
+                row = self._positions.get(chunk_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._positions[chunk_id] = row
+                    self._ids[row] = chunk_id
+                self._vectors[row] = vector
+                self._document_ids[row] = document_id or 0
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """Remove vectors by chunk id (swap with the last row). Returns the number removed."""
+        removed = 0
+        with self._lock:
+            for chunk_id in ids:
+                row = self._positions.pop(int(chunk_id), None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    self._vectors[row] = self._vectors[last]
+                    self._ids[row] = self._ids[last]
+                    self._document_ids[row] = self._document_ids[last]
+                    self._positions[int(self._ids[row])] = row
+                self._size -= 1
+                removed += 1
+        return removed
+
+    def remove_document(self, document_id: int) -> int:
+        with self._lock:
+            ids = self._ids[:self._size][self._document_ids[:self._size] == document_id]
+            return self.remove(ids.tolist())
+
+    def export(self) -> Dict[str, np.ndarray]:
+        """Copies of the stored rows, for snapshots."""
+        with self._lock:
+            return {
+                "ids": self._ids[:self._size].copy(),
+                "document_ids": self._document_ids[:self._size].copy(),
+                "vectors": self._vectors[:self._size].copy(),
+            }
+
+    def restore(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Replace the contents with exported rows."""
+        with self._lock:
+            self._ids = np.array(arrays["ids"], dtype=np.int64)
+            self._document_ids = np.array(arrays["document_ids"], dtype=np.int64)
+            self._vectors = np.array(arrays["vectors"], dtype=np.float32).reshape(-1, self.dimension)
+            self._size = len(self._ids)
+            self._positions = {int(chunk_id): row for row, chunk_id in enumerate(self._ids.tolist())}
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        min_score: float = -1.0,
+        document_id: Optional[int] = None,
+        chunk_ids: Optional[Iterable[int]] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (chunk_id, cosine similarity) pairs, best first. With chunk_ids,
+        only those candidates are scored.
+        """
+        query = _normalize(np.asarray(query).reshape(self.dimension))
+        with self._lock:
+            if self._size == 0:
+                return []
+            if chunk_ids is not None:
+                rows = [self._positions[i] for i in chunk_ids if i in self._positions]
+                rows = np.asarray(rows, dtype=np.int64)
+                if document_id is not None:
+                    rows = rows[self._document_ids[rows] == document_id]
+                return top_k(self._vectors[rows] @ query, self._ids[rows], k, min_score)
+
+            scores = self._vectors[:self._size] @ query
+            ids = self._ids[:self._size]
+            if document_id is not None:
+                candidates = np.flatnonzero(self._document_ids[:self._size] == document_id)
+                scores, ids = scores[candidates], ids[candidates]
+            return top_k(scores, ids, k, min_score)
+
+    def search_batch(
+        self,
+        queries: np.ndarray,
+        k: int,
+        min_score: float = -1.0,
+        document_id: Optional[int] = None,
+        chunk_ids: Optional[Iterable[int]] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """search() for many queries with one matrix product over the candidates."""
+        queries = _normalize(np.asarray(queries).reshape(-1, self.dimension))
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(len(queries))]
+            if chunk_ids is not None:
+                rows = np.asarray([self._positions[i] for i in chunk_ids if i in self._positions],
+                                  dtype=np.int64)
+            else:
+                rows = np.arange(self._size)
+            if document_id is not None:
+                rows = rows[self._document_ids[rows] == document_id]
+            if len(rows) == self._size:
+                vectors, ids = self._vectors[:self._size], self._ids[:self._size]
+            else:
+                vectors, ids = self._vectors[rows], self._ids[rows]
+            return top_k_batch(queries, vectors, ids, k, min_score)
+
+
+# -------------------------------------------------------------------------
+# Process-wide index of the active embedding version
+# -------------------------------------------------------------------------
+class _IndexState:
+    def __init__(self, version: EmbeddingVersion, quantization: str = "none"):
+        self.version_id = version.id
+        self.dimension = int(version.dimension)
+        self.quantization = quantization
+        if quantization == "none":
+            self.index = InMemoryVectorIndex(version.dimension)
+        else:
+            self.index = QuantizedVectorIndex(version.dimension, quantization)
+        self.watermark: Optional[datetime] = None
+        self.synced_at = 0.0
+        self.snapshot_at = time.monotonic()
+        self.snapshot_token: Optional[str] = None
+
+
+# One loaded index per quantization ("none" = float32)
+_states: Dict[str, _IndexState] = {}
+_state_lock = RLock()
+
+
+def iter_embedding_batches(db: Session, version_id: int, since: Optional[datetime], batch_size: int = 10000):
+    """Yield (chunk_ids, document_ids, vectors, max_updated_at) batches by keyset pagination."""
+    last_id = 0
+    while True:
+        stmt = (
+            select(ChunkEmbedding.chunk_id, DocumentChunk.document_id,
+                   ChunkEmbedding.embedding, ChunkEmbedding.updated_at)
+            .join(DocumentChunk, DocumentChunk.id == ChunkEmbedding.chunk_id)
+            .where(ChunkEmbedding.version_id == version_id, ChunkEmbedding.chunk_id > last_id)
+            .order_by(ChunkEmbedding.chunk_id)
+            .limit(batch_size)
+        )
+        if since is not None:
+            stmt = stmt.where(ChunkEmbedding.updated_at > since)
+        rows = db.execute(stmt).all()
+        if not rows:
+            return
+        last_id = rows[-1].chunk_id
+        yield (
+            [row.chunk_id for row in rows],
+            [row.document_id for row in rows],
+            np.array([row.embedding for row in rows], dtype=np.float32),
+            max((row.updated_at for row in rows if row.updated_at), default=None),
+        )
+
+
+def _sync(db: Session, state: _IndexState) -> None:
+    """Apply rows written since the watermark, and drop rows deleted elsewhere."""
+    # Overlap the watermark a little: rows committed late with an earlier
+    # updated_at are re-read (adds are idempotent) rather than missed
+    watermark = state.watermark - timedelta(seconds=30) if state.watermark else None
+    for chunk_ids, document_ids, vectors, updated_at in iter_embedding_batches(db, state.version_id, watermark):
+        state.index.add(chunk_ids, vectors, document_ids)
+        if updated_at and (state.watermark is None or updated_at > state.watermark):
+            state.watermark = updated_at
+
+    stored = db.execute(
+        select(func.count()).select_from(ChunkEmbedding)
+        .where(ChunkEmbedding.version_id == state.version_id)
+    ).scalar()
+    if stored != len(state.index):
+        live = {
+            row.chunk_id for row in db.execute(
+                select(ChunkEmbedding.chunk_id).where(ChunkEmbedding.version_id == state.version_id)
+            )
+        }
+        state.index.remove([i for i in state.index.ids.tolist() if i not in live])
+    state.synced_at = time.monotonic()
+
+
+# -------------------------------------------------------------------------
+# Snapshots
+# -------------------------------------------------------------------------
+SNAPSHOT_FORMAT = 1
+
+_snapshot_lock = Lock()
+
+
+def snapshot_path(version_id: int, quantization: str) -> str:
+    return os.path.join(settings.VECTOR_STORE_PATH, "snapshots", f"v{version_id}_{quantization}.npz")
+
+
+def save_index_snapshot(state: _IndexState) -> Optional[str]:
+    """Write the state's rows and watermark to its snapshot file, atomically."""
+    with _snapshot_lock:
+        token = snapshot(state.quantization)
+        if token == state.snapshot_token:
+            return None
+        started = time.time()
+        # Watermark before rows: rows added in between are replayed again, never lost
+        watermark = state.watermark
+        arrays = state.index.export()
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "version_id": state.version_id,
+            "quantization": state.quantization,
+            "dimension": state.dimension,
+            "count": len(arrays["ids"]),
+            "watermark": watermark.isoformat() if watermark else None,
+            "saved_at": datetime.utcnow().isoformat(),
+        }
+        path = snapshot_path(state.version_id, state.quantization)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(path + ".tmp", path)
+        state.snapshot_at = time.monotonic()
+        state.snapshot_token = token
+        print(f"[VectorIndex] Saved snapshot of {meta['count']} vectors ({state.quantization}) "
+              f"in {time.time() - started:.1f}s")
+        return path
+
+
+def _load_index_snapshot(state: _IndexState) -> bool:
+    """Fill a fresh state from its snapshot file, if one matches the version and format."""
+    path = snapshot_path(state.version_id, state.quantization)
+    if not os.path.exists(path):
+        return False
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if (meta.get("format") != SNAPSHOT_FORMAT or meta.get("version_id") != state.version_id
+                    or meta.get("dimension") != state.dimension):
+                print(f"[VectorIndex] Ignoring incompatible snapshot {path}")
+                return False
+            state.index.restore({name: data[name] for name in data.files if name != "meta"})
+    except Exception as e:
+        print(f"[VectorIndex] Failed to load snapshot {path}: {e}")
+        return False
+    state.watermark = datetime.fromisoformat(meta["watermark"]) if meta.get("watermark") else None
+    return True
+
+
+def _maybe_save_snapshot(state: _IndexState) -> None:
+    """Snapshot in the background once VECTOR_INDEX_SNAPSHOT_SECONDS have passed."""
+    interval = settings.VECTOR_INDEX_SNAPSHOT_SECONDS
+    if interval <= 0 or time.monotonic() - state.snapshot_at < interval or _snapshot_lock.locked():
+        return
+    state.snapshot_at = time.monotonic()
+    Thread(target=save_index_snapshot, args=(state,), daemon=True).start()
+
+
+def save_index_snapshots() -> None:
+    """Snapshot every loaded index (e.g. at shutdown)."""
+    for state in list(_states.values()):
+        try:
+            save_index_snapshot(state)
+        except Exception as e:
+            print(f"[VectorIndex] Failed to save snapshot: {e}")
+
+
+def write_index_snapshot(db: Session, version: EmbeddingVersion, quantization: str = "none") -> Optional[str]:
+    """Load (or sync) the version's index and snapshot it now."""
+    get_vector_index(db, version, quantization)
+    return save_index_snapshot(_states[quantization])
+
+
+def get_vector_index(db: Session, version: EmbeddingVersion, quantization: str = "none"):
+    """
+    Index for the given (active) version, loaded on first use and rebuilt when
+    the active version changes. Synced with the database at most every
+    VECTOR_INDEX_SYNC_SECONDS. With a quantization ("int8" or "binary") this
+    is a QuantizedVectorIndex, otherwise an InMemoryVectorIndex.
+    """
+    with _state_lock:
+        state = _states.get(quantization)
+        if state is None or state.version_id != version.id:
+            started = time.time()
+            state = _IndexState(version, quantization)
+            # From the snapshot, only rows changed since its watermark are replayed
+            restored = _load_index_snapshot(state)
+            _sync(db, state)
+            _states[quantization] = state
+            print(f"[VectorIndex] Loaded {len(state.index)} vectors ({quantization} quantization) "
+                  f"for version {version.id}{' from snapshot' if restored else ''} "
+                  f"in {time.time() - started:.1f}s")
+        elif time.monotonic() - state.synced_at > settings.VECTOR_INDEX_SYNC_SECONDS:
+            _sync(db, state)
+            _maybe_save_snapshot(state)
+        return state.index
+
+
+def snapshot(quantization: str = "none") -> str:
+    """Token identifying the loaded index contents (version, sync watermark, size)."""
+    state = _states.get(quantization)
+    if state is None:
+        return "empty"
+    return f"{state.version_id}:{state.watermark}:{len(state.index)}"
+
+
+def index_embeddings(version_id: int, chunk_ids: List[int], document_ids: List[int], embeddings) -> None:
+    """Incrementally add freshly saved embeddings to the indexes of that version loaded here."""
+    if not chunk_ids:
+        return
+    for state in list(_states.values()):
+        if state.version_id == version_id:
+            state.index.add(chunk_ids, np.asarray(embeddings, dtype=np.float32), document_ids)
+
+
+def remove_document(document_id: int) -> None:
+    """Drop a deleted document's vectors from the loaded indexes."""
+    for state in list(_states.values()):
+        state.index.remove_document(document_id)
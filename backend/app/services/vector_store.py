@@ -1,130 +1,342 @@
 """
 Vector store service using pgvector (PostgreSQL extension)
 
-TODO: Implement vector storage using pgvector
-- Create embeddings table in PostgreSQL
-- Store document chunks with vector embeddings
-- Implement similarity search using pgvector operators
-- Handle metadata filtering
+Embeddings live in chunk_embeddings as pgvector values, with one partial
+HNSW (cosine) index per embedding version. The top-k itself is computed by
+the backend selected with VECTOR_SEARCH_BACKEND (pgvector, exact in-process
+or memory-mapped NumPy, FAISS; see app.services.vector_backends), and only
+the k winning chunks are then read from the database.
+
+Metadata filters (fund, document, page range, table type) are pushed down:
+filtered searches resolve the matching chunks through the document_chunks
+indexes first and score only those vectors.
+
+Exact-token queries ("Call 7", "2024-03-15") are served by Postgres
+full-text search over document_chunks.content_tsv (GIN index). In hybrid mode
+the lexical and vector rankings are computed concurrently and merged with
+reciprocal rank fusion; in prefilter mode the lexical hits become the vector
+candidate set.
+
+Results are cached per fund index version (app.services.retrieval_cache).
 """
-from typing import List, Dict, Any, Optional
+import asyncio
+from dataclasses import asdict
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-import numpy as np
-from app.services.local_embedding_service import LocalEmbeddingService
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.embedding import EmbeddingVersion
+from app.services.embedding_versions import get_active_version, get_embedding_service
+from app.services.pipeline_timings import timed
+from app.services.vector_backends import ChunkFilter, get_backend
+from app.services.retrieval_cache import get_retrieval_cache
+
+# Minimum cosine similarity for a chunk to be returned
+DEFAULT_MIN_SCORE = 0.3
+
+# Must match the content_tsv generated column
+TEXT_SEARCH_CONFIG = "english"
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[int]], k: int, rrf_k: int = 60
+) -> List[Tuple[int, float]]:
+    """Merge ranked id lists: score(id) = sum of 1 / (rrf_k + rank). Best k first."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
 
 
 class VectorStore:
-    """pgvector-based vector store for document chunks"""
+    """
+    pgvector-based vector store for document chunks. Holds no per-request
+    state: one instance serves the whole app and each call gets its db
+    session (VectorStore(db) still binds a default session).
+    """
 
     def __init__(self, db: Session = None):
         self.db = db
-        self.embedding_service = LocalEmbeddingService()
+
+    def warm_up(self) -> None:
+        """Load the active version's embedding model and search index (at startup)."""
+        db = SessionLocal()
+        try:
+            version = get_active_version(db)
+            get_embedding_service(version)
+            get_backend().load(db, version)
+        except Exception as e:
+            print(f"[VectorStore] Warm-up failed, loading on first search instead: {e}")
+        finally:
+            db.close()
 
     async def similarity_search(
         self,
         query: str,
         k: int = 5,
-        filter_metadata: Optional[Dict[str, Any]] = None
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        min_score: float = DEFAULT_MIN_SCORE,
+        mode: Optional[str] = None,
+        db: Optional[Session] = None,
     ) -> List[Dict[str, Any]]:
         """
-        Search for similar chunks using cosine similarity via pgvector (manual float8[] version)
-        with full debug logging.
+        Search for similar chunks, using the active embedding version and the
+        configured backend. mode is "vector", "hybrid" or "prefilter"
+        (default: settings.RETRIEVAL_MODE). In hybrid mode "score" is the
+        fused RRF score rather than a cosine similarity.
         """
+        mode = mode or settings.RETRIEVAL_MODE
+        db = db or self.db
         try:
-            # Step 1: Generate embedding for the query
-            query_embedding = self.embedding_service.embed_text(query)
-
-            if query_embedding is None or len(query_embedding) == 0:
-                return []
-
-            query_vec = np.array(query_embedding, dtype=np.float64)
-
-            # Step 2: Build WHERE clause (fund_id → document_id mapping)
-            where_clause = ""
-            params = {}
-            if filter_metadata:
-                if "fund_id" in filter_metadata:
-                    where_clause = "WHERE document_id = :doc_id"
-                    params["doc_id"] = filter_metadata["fund_id"]
-                elif "document_id" in filter_metadata:
-                    where_clause = "WHERE document_id = :doc_id"
-                    params["doc_id"] = filter_metadata["document_id"]
-
-            # Step 3: Query chunks from DB
-            fetch_sql = text(f"""
-                SELECT id, document_id, page, content, embedding
-                FROM document_chunks
-                {where_clause}
-            """)
-
-            rows = self.db.execute(fetch_sql, params).fetchall()
-
-            if not rows:
-                return []
-
-            results = []
-
-            # Step 4: Process each row
-            for idx, row in enumerate(rows):
-                embedding_value = row.embedding
-
-                if embedding_value is None:
-                    continue
-
-                # Handle memoryview (psycopg2 behavior)
-                if isinstance(embedding_value, memoryview):
-                    try:
-                        embedding_value = np.frombuffer(embedding_value, dtype=np.float64).tolist()
-                    except Exception as err:
-                        continue
-
-                # Handle string literal (misalnya "{0.1,0.2,0.3}")
-                elif isinstance(embedding_value, str):
-                    try:
-                        embedding_value = [
-                            float(x) for x in embedding_value.strip("{}").split(",") if x
-                        ]
-                    except Exception as err:
-                        continue
-
-                # Handle nested list [[...]]
-                elif isinstance(embedding_value, list):
-                    if len(embedding_value) == 1 and isinstance(embedding_value[0], list):
-                        embedding_value = embedding_value[0]
-
-                # Convert to numpy
-                try:
-                    doc_vec = np.array(embedding_value, dtype=np.float64)
-                except Exception as conv_err:
-                    continue
-
-                if doc_vec.size == 0 or np.linalg.norm(doc_vec) == 0:
-                    continue
-
-                # Step 5: Cosine similarity
-                try:
-                    similarity = float(np.dot(query_vec, doc_vec) /
-                                       (np.linalg.norm(query_vec) * np.linalg.norm(doc_vec)))
-                except Exception as err:
-                    continue
-
-
-                # Step 6: Apply threshold
-                if similarity >= 0.3:
-                    results.append({
-                        "id": row.id,
-                        "document_id": row.document_id,
-                        "page": row.page,
-                        "content": row.content,
-                        "score": round(similarity, 3)
-                    })
-
-            # Step 7: Sort results
-            results.sort(key=lambda x: x["score"], reverse=True)
-
-            return results[:k]
+            chunk_filter = ChunkFilter.from_metadata(filter_metadata)
+            # Repeated questions are answered from the cache while the
+            # searched fund's index version is unchanged
+            version, keys, cached = await asyncio.to_thread(
+                self._cache_lookup, db, [query], k, chunk_filter, min_score, mode
+            )
+            if cached[0] is not None:
+                return cached[0]
+            cache_key = keys[0]
+
+            if mode == "hybrid":
+                hits = await self._hybrid_search(db, version, query, k, chunk_filter, min_score)
+            elif mode == "prefilter":
+                hits = await self._prefiltered_search(db, version, query, k, chunk_filter, min_score)
+            else:
+                # Embedding and scoring are CPU-bound: keep them off the event loop
+                hits = await asyncio.to_thread(self._vector_search, db, version, query, k, chunk_filter, min_score)
+
+            results = await asyncio.to_thread(self._fetch_chunks, db, hits)
+            if cache_key is not None:
+                await asyncio.to_thread(get_retrieval_cache().set, cache_key, results)
+            return results
 
         except Exception as e:
             print(f"[ERROR] Terjadi kesalahan di similarity_search: {e}")
+            db.rollback()
+            return []
+
+    async def batch_similarity_search(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        min_score: float = DEFAULT_MIN_SCORE,
+        db: Optional[Session] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        similarity_search (vector mode) for many queries, results in query
+        order. Cached queries are answered from the cache; the rest are
+        embedded in one forward pass and scored together by the backend.
+        """
+        db = db or self.db
+        try:
+            chunk_filter = ChunkFilter.from_metadata(filter_metadata)
+            version, keys, results = await asyncio.to_thread(
+                self._cache_lookup, db, queries, k, chunk_filter, min_score, "vector"
+            )
+            missing = [i for i, cached in enumerate(results) if cached is None]
+            if missing:
+                # Embedding, scoring and the chunk fetch block: keep them off the event loop
+                found = await asyncio.to_thread(
+                    self._vector_search_batch, db, version, [queries[i] for i in missing],
+                    k, chunk_filter, min_score,
+                )
+                for i, result in zip(missing, found):
+                    results[i] = result
+                await asyncio.to_thread(self._cache_store, [
+                    (keys[i], results[i]) for i in missing if keys[i] is not None
+                ])
+            return results
+
+        except Exception as e:
+            print(f"[ERROR] Terjadi kesalahan di batch_similarity_search: {e}")
+            db.rollback()
+            return [[] for _ in queries]
+
+    def _cache_lookup(
+        self,
+        db: Session,
+        queries: List[str],
+        k: int,
+        chunk_filter: ChunkFilter,
+        min_score: float,
+        mode: str,
+    ) -> Tuple[EmbeddingVersion, List[Optional[str]], List[Optional[List[Dict[str, Any]]]]]:
+        """
+        Active version, cache keys and cached results (None on a miss) per
+        query. Blocking (Redis, and the backend snapshot may sync its index
+        from the database): run in a worker thread.
+        """
+        # The version is resolved per search so an activation switch applies immediately
+        version = get_active_version(db)
+        keys = self._cache_keys(db, version, queries, k, chunk_filter, min_score, mode)
+        cache = get_retrieval_cache()
+        return version, keys, [cache.get(key) if key is not None else None for key in keys]
+
+    @staticmethod
+    def _cache_store(entries: List[Tuple[str, List[Dict[str, Any]]]]) -> None:
+        cache = get_retrieval_cache()
+        for key, results in entries:
+            cache.set(key, results)
+
+    def _cache_keys(
+        self,
+        db: Session,
+        version: EmbeddingVersion,
+        queries: List[str],
+        k: int,
+        chunk_filter: ChunkFilter,
+        min_score: float,
+        mode: str,
+    ) -> List[Optional[str]]:
+        """Cache key per query, or None when results must not be cached."""
+        cache = get_retrieval_cache() if settings.RETRIEVAL_CACHE_ENABLED else None
+        index_version = cache.index_version(chunk_filter.fund_id) if cache is not None else None
+        if index_version is None:
+            return [None] * len(queries)
+        snapshot = get_backend().snapshot(db, version)
+        return [
+            cache.make_key(
+                query=query, filter=asdict(chunk_filter), k=k, min_score=min_score,
+                mode=mode, backend=settings.VECTOR_SEARCH_BACKEND,
+                embedding_version=version.id, index_version=index_version,
+                snapshot=snapshot,
+            )
+            for query in queries
+        ]
+
+    # -------------------------------------------------------------------------
+    # Search modes
+    # -------------------------------------------------------------------------
+    def _vector_search(
+        self, db: Session, version: EmbeddingVersion, query: str, k: int, chunk_filter: ChunkFilter, min_score: float
+    ) -> List[Tuple[int, float]]:
+        query_embedding = self._embed_query(version, query)
+        with timed("search"):
+            return self._vector_hits(db, version, query_embedding, k, chunk_filter, min_score)
+
+    def _vector_search_batch(
+        self, db: Session, version: EmbeddingVersion, queries: List[str], k: int, chunk_filter: ChunkFilter, min_score: float
+    ) -> List[List[Dict[str, Any]]]:
+        """Results for many queries: one embedding pass, one backend pass, one chunk fetch."""
+        with timed("embed"):
+            embeddings = get_embedding_service(version).embed_texts(queries)
+        with timed("search"):
+            hits_per_query = get_backend().search_batch(db, version, embeddings, k, chunk_filter, min_score)
+        rows = self._load_rows(db, [chunk_id for hits in hits_per_query for chunk_id, _ in hits])
+        return [
+            [self._to_result(rows[chunk_id], score) for chunk_id, score in hits if chunk_id in rows]
+            for hits in hits_per_query
+        ]
+
+    def _embed_query(self, version: EmbeddingVersion, query: str) -> np.ndarray:
+        with timed("embed"):
+            return get_embedding_service(version).embed_text(query)
+
+    async def _hybrid_search(
+        self, db: Session, version: EmbeddingVersion, query: str, k: int, chunk_filter: ChunkFilter, min_score: float
+    ) -> List[Tuple[int, float]]:
+        """Vector and lexical rankings in parallel, merged by reciprocal rank fusion."""
+        limit = max(k, settings.HYBRID_CANDIDATES)
+        vector_hits, lexical_ids = await asyncio.gather(
+            asyncio.to_thread(self._vector_search, db, version, query, limit, chunk_filter, min_score),
+            asyncio.to_thread(self._lexical_search, query, limit, chunk_filter),
+        )
+        return reciprocal_rank_fusion(
+            [[chunk_id for chunk_id, _ in vector_hits], lexical_ids], k, settings.RRF_K
+        )
+
+    async def _prefiltered_search(
+        self, db: Session, version: EmbeddingVersion, query: str, k: int, chunk_filter: ChunkFilter, min_score: float
+    ) -> List[Tuple[int, float]]:
+        """Vector search restricted to the lexical hits (query embedding overlaps the lexical query)."""
+        query_embedding, candidate_ids = await asyncio.gather(
+            asyncio.to_thread(self._embed_query, version, query),
+            asyncio.to_thread(self._lexical_search, query, settings.LEXICAL_PREFILTER_LIMIT, chunk_filter),
+        )
+        if candidate_ids:
+            chunk_filter = ChunkFilter(chunk_ids=candidate_ids)
+        # No lexical match (e.g. a paraphrased question): plain vector search
+        with timed("search"):
+            return self._vector_hits(db, version, query_embedding, k, chunk_filter, min_score)
+
+    def _lexical_search(self, query: str, limit: int, chunk_filter: ChunkFilter) -> List[int]:
+        """
+        Chunk ids matching any query term, best ts_rank_cd first. Runs on its
+        own session so it can overlap with the vector search.
+        """
+        where_clause, params = chunk_filter.where_sql("dc")
+        params.update({"query": query, "limit": limit})
+        # plainto_tsquery ANDs the terms; OR them so partial matches still rank
+        lexical_sql = text(f"""
+            SELECT dc.id
+            FROM document_chunks dc,
+                 (SELECT replace(plainto_tsquery('{TEXT_SEARCH_CONFIG}', :query)::text,
+                                 ' & ', ' | ')::tsquery AS q) tsq
+            WHERE dc.content_tsv @@ tsq.q
+              AND {where_clause}
+            ORDER BY ts_rank_cd(dc.content_tsv, tsq.q) DESC, dc.id
+            LIMIT :limit
+        """)
+        db = SessionLocal()
+        try:
+            with timed("lexical"):
+                return db.execute(lexical_sql, params).scalars().all()
+        finally:
+            db.close()
+
+    def _vector_hits(
+        self,
+        db: Session,
+        version: EmbeddingVersion,
+        query_embedding: np.ndarray,
+        k: int,
+        chunk_filter: ChunkFilter,
+        min_score: float,
+    ) -> List[Tuple[int, float]]:
+        """Top-k (chunk_id, cosine similarity) from the configured backend."""
+        if query_embedding is None or len(query_embedding) == 0:
             return []
+        return get_backend().search(db, version, query_embedding, k, chunk_filter, min_score)
+
+    # -------------------------------------------------------------------------
+    # Results
+    # -------------------------------------------------------------------------
+    def _load_rows(self, db: Session, chunk_ids: List[int]) -> Dict[int, Any]:
+        """Chunk rows by id, in one query."""
+        if not chunk_ids:
+            return {}
+        rows = db.execute(
+            text("""
+                SELECT id, document_id, page, pages, content
+                FROM document_chunks
+                WHERE id = ANY(:ids)
+            """),
+            {"ids": list(set(chunk_ids))},
+        ).fetchall()
+        return {row.id: row for row in rows}
+
+    def _fetch_chunks(self, db: Session, hits: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Load content for (chunk_id, score) hits, keeping their order."""
+        by_id = self._load_rows(db, [chunk_id for chunk_id, _ in hits])
+        return [
+            self._to_result(by_id[chunk_id], score)
+            for chunk_id, score in hits
+            if chunk_id in by_id
+        ]
+
+    @staticmethod
+    def _to_result(row, score: float) -> Dict[str, Any]:
+        return {
+            "id": row.id,
+            "document_id": row.document_id,
+            "page": row.page,
+            # All pages of a deduplicated chunk, for citations
+            "pages": row.pages or [row.page],
+            "content": row.content,
+            "score": round(float(score), 3)
+        }
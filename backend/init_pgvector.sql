@@ -1 +1 @@
-CREATE EXTENSION IF NOT EXISTS vector;
\ No newline at end of file
+CREATE EXTENSION IF NOT EXISTS vector;
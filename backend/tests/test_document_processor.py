@@ -62,4 +62,26 @@ def test_chunk_text_creates_chunks():
     assert len(chunks) > 0
     assert "chunk" in chunks[0]
     assert "metadata" in chunks[0]
-    assert "page" in chunks[0]["metadata"]
\ No newline at end of file
+    assert "page" in chunks[0]["metadata"]
+
+def test_dedup_collapses_repeated_boilerplate():
+    """A footer repeated on every page is stored once, with all its pages"""
+    from app.services.chunk_dedup import dedup_chunks
+
+    footer = ("This report is confidential and intended solely for the limited partners of the fund. "
+              "Past performance is not indicative of future results. Page {} of 3")
+    chunks = [
+        {"chunk": footer.format(page), "metadata": {"page": page, "type": "text"}}
+        for page in (1, 2, 3)
+    ] + [
+        {"chunk": "Capital call 7 was issued for working capital.", "metadata": {"page": 2, "type": "text"}},
+        {"chunk": "2024-03-15 | Call 7 | 1,000,000", "metadata": {"page": 2, "type": "capital_call"}},
+        {"chunk": "2024-06-15 | Call 8 | 1,000,000", "metadata": {"page": 3, "type": "capital_call"}},
+    ]
+
+    deduped = dedup_chunks(chunks)
+
+    assert len(deduped) == 4
+    assert deduped[0]["metadata"]["pages"] == [1, 2, 3]
+    # Table rows that differ in one value stay separate
+    assert [c["metadata"]["type"] for c in deduped].count("capital_call") == 2
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from app.services.embedding_reducer import EmbeddingReducer
+
+
+def _unit_rows(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(size=(n, dim))
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def test_truncate_reduces_and_normalizes():
+    """Truncation keeps the leading components at unit length"""
+    vectors = _unit_rows(10, 768)
+    reduced = EmbeddingReducer("truncate", 128).transform(vectors)
+
+    assert reduced.shape == (10, 128)
+    assert np.allclose(np.linalg.norm(reduced, axis=1), 1.0)
+
+    single = EmbeddingReducer("truncate", 128).transform(vectors[0])
+    assert single.shape == (128,)
+
+
+def test_pca_round_trip(tmp_path):
+    """A saved PCA projection transforms exactly like the fitted one"""
+    vectors = _unit_rows(300, 64)
+    reducer = EmbeddingReducer("pca", 16).fit(vectors)
+
+    path = str(tmp_path / "pca.npz")
+    reducer.save(path)
+    loaded = EmbeddingReducer.load(path)
+
+    assert loaded.dimension == 16
+    assert np.allclose(loaded.transform(vectors), reducer.transform(vectors))
+
+
+def test_pca_requires_enough_samples():
+    """PCA cannot produce more components than samples"""
+    with pytest.raises(ValueError):
+        EmbeddingReducer("pca", 128).fit(_unit_rows(10, 768))
+
+
+def test_missing_pca_projection_is_an_error(tmp_path, monkeypatch):
+    """Without a fitted projection the model must not fall back to full-dimension vectors"""
+    monkeypatch.setattr("app.services.embedding_reducer.settings.VECTOR_STORE_PATH", str(tmp_path))
+    with pytest.raises(RuntimeError, match="embedding_reduction fit"):
+        EmbeddingReducer.load_for_model("intfloat/multilingual-e5-base", 16)
+
+    EmbeddingReducer("pca", 16).fit(_unit_rows(300, 64)).save(
+        EmbeddingReducer.default_path("intfloat/multilingual-e5-base", 16)
+    )
+    assert EmbeddingReducer.load_for_model("intfloat/multilingual-e5-base", 16).dimension == 16
@@ -0,0 +1,44 @@
+import httpx
+import pytest
+from app.scripts.stub_server import StubConfig, create_app, stub_embedding
+from app.services.embedding_service import EmbeddingService
+
+
+def _service(stub_app, **kwargs):
+    """EmbeddingService talking to the stub in-process (no network)"""
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_app), base_url="http://stub")
+    return EmbeddingService(base_url="http://stub/v1", api_key="test", http_client=client, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_generate_embeddings_batches_and_preserves_order():
+    """Inputs are split under the token budget, run concurrently and returned in order"""
+    stub = create_app(StubConfig(dimension=8, latency_ms=5, per_input_latency_ms=0))
+    service = _service(stub, max_concurrency=3, max_batch_tokens=50, max_batch_size=10)
+    service.count_tokens = lambda text: len(text) // 4 + 1
+
+    texts = [f"chunk number {i} " * (1 + i % 5) for i in range(200)]
+    embeddings = await service.generate_embeddings(texts)
+    await service.close()
+
+    assert embeddings == [stub_embedding(t, 8) for t in texts]
+    assert stub.state.stats["requests"] > 1
+    assert stub.state.stats["max_batch"] <= 10
+    assert stub.state.stats["max_in_flight"] <= 3
+
+
+@pytest.mark.asyncio
+async def test_generate_embeddings_retries_rate_limits():
+    """429/500 responses are retried until every batch succeeds"""
+    stub = create_app(StubConfig(dimension=4, latency_ms=0, per_input_latency_ms=0,
+                                 error_rate=0.3, seed=7))
+    service = _service(stub, max_concurrency=4, max_batch_size=5, max_retries=20)
+    service._backoff = lambda attempt, error: 0
+
+    texts = [f"text {i}" for i in range(100)]
+    embeddings = await service.generate_embeddings(texts)
+    await service.close()
+
+    assert embeddings == [stub_embedding(t, 4) for t in texts]
+    assert stub.state.stats["failures"] > 0
+    assert service.stats["retries"] == stub.state.stats["failures"]
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import httpx
+import pytest
+from app.services.llm_client import OllamaLLM
+
+
+@pytest.mark.asyncio
+async def test_ollama_generate_and_cancel():
+    """Completions come from /api/generate; cancelling the caller aborts a slow call"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        if payload["prompt"] == "slow":
+            await asyncio.sleep(10)
+        return httpx.Response(200, json={"model": payload["model"], "response": f"echo: {payload['prompt']}"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ollama")
+    llm = OllamaLLM(base_url="http://ollama", model="llama3.2", http_client=client)
+
+    assert await llm.ainvoke("hello") == "echo: hello"
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(llm.ainvoke("slow"), timeout=0.1)
+    await llm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ollama_stream_yields_pieces_in_order():
+    """Streamed NDJSON lines are yielded as answer pieces until done"""
+    lines = [{"response": piece, "done": False} for piece in ("The ", "DPI ", "is 1.2")]
+    lines.append({"response": "", "done": True})
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content="\n".join(json.dumps(line) for line in lines).encode())
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ollama")
+    llm = OllamaLLM(base_url="http://ollama", model="llama3.2", http_client=client)
+
+    assert [piece async for piece in llm.astream("dpi?")] == ["The ", "DPI ", "is 1.2"]
+    await llm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_stub_server_ollama_and_openai_completions():
+    """The stub LLM answers deterministically, streamed or not, in both APIs"""
+    import openai
+    from app.scripts.stub_server import StubConfig, create_app, stub_completion
+
+    stub = create_app(StubConfig(ttft_ms=0, tokens_per_second=0, completion_tokens=12))
+    expected = "".join(stub_completion("What is the DPI?", 12))
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub), base_url="http://stub")
+    llm = OllamaLLM(base_url="http://stub", model="llama3.2", http_client=client)
+    assert await llm.ainvoke("What is the DPI?") == expected
+    assert "".join([piece async for piece in llm.astream("What is the DPI?")]) == expected
+
+    openai_client = openai.AsyncOpenAI(base_url="http://stub/v1", api_key="test", http_client=client)
+    messages = [{"role": "user", "content": "What is the DPI?"}]
+    completion = await openai_client.chat.completions.create(model="gpt-4", messages=messages)
+    assert completion.choices[0].message.content == expected
+    chunks = await openai_client.chat.completions.create(model="gpt-4", messages=messages, stream=True)
+    assert "".join([chunk.choices[0].delta.content or "" async for chunk in chunks]) == expected
+    assert stub.state.stats["completions"] == 4
+    await llm.aclose()
@@ -0,0 +1,25 @@
+import asyncio
+import time
+from app.services import pipeline_timings
+from app.services.pipeline_timings import timed
+
+
+def test_stages_recorded_across_tasks_and_threads():
+    """Stages timed in tasks and worker threads count toward the question that started them"""
+    def embed():
+        with timed("embed"):
+            time.sleep(0.01)
+
+    async def question():
+        timings = pipeline_timings.start()
+        with timed("retrieve"):
+            await asyncio.gather(asyncio.to_thread(embed), asyncio.to_thread(embed))
+        return timings.as_dict()
+
+    breakdown = asyncio.run(question())
+    assert set(breakdown["stages_ms"]) == {"retrieve", "embed"}
+    # Both embeddings are summed
+    assert breakdown["stages_ms"]["embed"] >= 20
+
+    with timed("embed"):  # outside a question: no-op
+        pass
@@ -0,0 +1,37 @@
+from app.services.prompt_builder import PromptBuilder
+
+
+def _words(text):
+    return len(text.split())
+
+
+def test_budget_filled_by_priority():
+    """Metrics first, then the best chunks, then the newest turns; the rest is left out"""
+    builder = PromptBuilder(budget_tokens=120, count_tokens=_words)
+    context = [
+        {"content": "best chunk " * 10, "page": 1},
+        {"content": "second chunk " * 10, "page": 2},
+        {"content": "third chunk " * 10, "page": 3},
+    ]
+    history = [
+        {"role": "user", "content": "oldest question", "timestamp": "2024-01-01"},
+        {"role": "assistant", "content": "oldest answer " * 20},
+        {"role": "user", "content": "newest question"},
+    ]
+    prompt = builder.build("What is the DPI?", context, {"dpi": 0.5, "tvpi": None}, history, "earlier summary")
+
+    assert '{"dpi": 0.5}' in prompt
+    assert "[Page 1]" in prompt and "[Page 2]" in prompt
+    assert "[Page 3]" not in prompt
+    assert "User: newest question" in prompt
+    assert "oldest" not in prompt and "2024-01-01" not in prompt
+    assert _words(prompt) <= 120
+
+
+def test_prompt_size_flat_for_long_conversations():
+    """Prompt size is bounded by the budget however long the history is"""
+    builder = PromptBuilder(budget_tokens=200, count_tokens=_words)
+    history = [{"role": "user", "content": f"question {i} " * 5} for i in range(500)]
+    prompt = builder.build("What is the IRR?", [], None, history)
+    assert _words(prompt) <= 200
+    assert "question 499" in prompt
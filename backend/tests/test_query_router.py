@@ -0,0 +1,81 @@
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.services.query_router import answer_transaction_question, metric_question, transaction_question
+
+
+def test_metric_questions_are_routed():
+    """Plain questions about current metric values skip RAG"""
+    assert metric_question("What is the current DPI?") == ["dpi"]
+    assert metric_question("what's the IRR") == ["irr"]
+    assert metric_question("Show me the paid-in capital") == ["pic"]
+    assert metric_question("What is the distributions to paid-in capital ratio?") == ["dpi"]
+    assert metric_question("How much has the fund distributed?") == ["total_distributions"]
+    assert metric_question("What are the DPI and IRR?") == ["dpi", "irr"]
+
+
+def test_ambiguous_questions_fall_through():
+    """Definitions, methodology, points in time and uncomputed metrics go to RAG"""
+    assert metric_question("What does DPI mean?") is None
+    assert metric_question("How is IRR calculated?") is None
+    assert metric_question("What was the DPI as of 2022?") is None
+    assert metric_question("What is the TVPI?") is None
+    assert metric_question("What are the DPI and TVPI?") is None
+    assert metric_question("Summarize the latest capital call notice") is None
+
+
+def test_transaction_listing_filters():
+    """Listing questions become a transaction type, date range and amount bounds"""
+    listing = transaction_question("Show me all capital calls in 2024 over $1,000,000")
+    assert listing.kind == "capital_calls"
+    assert (listing.date_from, listing.date_to) == (date(2024, 1, 1), date(2024, 12, 31))
+    assert (listing.min_amount, listing.max_amount) == (1_000_000, None)
+
+    listing = transaction_question("Which distributions in Q4 2023 were under 2.5m?")
+    assert listing.kind == "distributions"
+    assert (listing.date_from, listing.date_to) == (date(2023, 10, 1), date(2023, 12, 31))
+    assert listing.max_amount == 2_500_000
+
+    listing = transaction_question("List adjustments before 2023-06-30")
+    assert (listing.date_from, listing.date_to) == (None, date(2023, 6, 29))
+
+    assert transaction_question("What does the capital call notice say?") is None
+    assert transaction_question("List capital calls and distributions in 2024") is None
+    assert transaction_question("What is the DPI in 2024?") is None
+
+
+def test_document_questions_are_not_listings():
+    """Questions about terms or concepts that mention a transaction type go to RAG"""
+    assert transaction_question("What is the distribution waterfall?") is None
+    assert transaction_question("What are the capital call provisions in the LPA?") is None
+    assert transaction_question("Which distributions were recallable?") is None
+    assert transaction_question("What is the return of capital in distributions?") is None
+    assert transaction_question("What were all the distributions?") is None
+    assert transaction_question("list the documents that mention capital calls") is None
+    assert transaction_question("show me which pages discuss distributions") is None
+    assert transaction_question("Show the section on adjustments") is None
+
+    assert transaction_question("How many capital calls were there?").kind == "capital_calls"
+    assert transaction_question("What were the distributions in 2024?").date_from == date(2024, 1, 1)
+
+
+def test_unknown_fund_is_not_listed_unfiltered():
+    """A fund_id that does not resolve falls through instead of listing every fund"""
+    from app.db.base import Base
+    import app.models.document  # noqa: F401
+    from app.models.fund import Fund
+    from app.models.transaction import Adjustment, CapitalCall, Distribution
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        Fund.__table__, CapitalCall.__table__, Distribution.__table__, Adjustment.__table__,
+    ])
+    db = sessionmaker(bind=engine)()
+    db.add(Fund(id=1, name="Fund A"))
+    db.add(CapitalCall(fund_id=1, call_date=date(2024, 3, 1), call_type="Capital Call", amount=100))
+    db.commit()
+
+    listing = transaction_question("List capital calls in 2024")
+    assert answer_transaction_question(db, 2, "List capital calls in 2024", listing) is None
+    assert answer_transaction_question(db, 1, "List capital calls in 2024", listing)["transactions"]["count"] == 1
+    db.close()
@@ -0,0 +1,78 @@
+from app.services.retrieval_cache import RetrievalCache
+
+
+def _cache(**kwargs):
+    # Nothing listens on port 1: every Redis call fails fast
+    return RetrievalCache(redis_url="redis://127.0.0.1:1/0", **kwargs)
+
+
+def test_unknown_index_version_bypasses_cache():
+    """Without Redis the index version is unknown, so callers must not use the cache"""
+    cache = _cache()
+    assert cache.index_version(fund_id=1) is None
+    cache.bump([1])  # must not raise
+
+
+def test_lru_tier_and_keys():
+    """Keys depend on every part; the local tier evicts least recently used entries"""
+    cache = _cache(lru_size=2)
+    key_a = cache.make_key(query="What is the DPI?", k=5, index_version="1.1")
+    assert key_a == cache.make_key(k=5, index_version="1.1", query="What is the DPI?")
+    assert key_a != cache.make_key(query="What is the DPI?", k=5, index_version="1.2")
+
+    cache.set("a", [{"id": 1}])
+    cache.set("b", [{"id": 2}])
+    assert cache.get("a") == [{"id": 1}]
+    cache.set("c", [{"id": 3}])  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == [{"id": 1}]
+    assert cache.stats["hits_local"] == 2
+
+    cache.bump([7])
+    assert cache.get("a") is None
+
+
+def test_answer_cache_namespace():
+    """Answer keys never collide with retrieval keys; transaction bumps only reach answers"""
+    retrieval, answers = _cache(), _cache(namespace="answer")
+    parts = dict(query="what is the dpi", fund_id=1, data_version="1.1.1")
+    assert answers.make_key(**parts).startswith("answer:")
+    assert answers.make_key(**parts) != retrieval.make_key(**parts)
+    assert answers.index_version(fund_id=1, transactions=True) is None
+
+    answers.set("a", {"answer": "1.2x"})
+    retrieval.set("a", [{"id": 1}])
+    answers.bump([1], transactions=True)
+    assert answers.get("a") is None
+    assert retrieval.get("a") == [{"id": 1}]
+
+
+def test_failed_bump_is_replayed(monkeypatch):
+    """A bump lost while Redis is down is applied before versions are read again"""
+    from app.services import retrieval_cache
+
+    monkeypatch.setattr(retrieval_cache, "_pending_bumps", set())
+
+    class FakeRedis:
+        def __init__(self, up):
+            self.up, self.versions = up, {}
+
+        def eval(self, script, count, *args):
+            if not self.up:
+                raise ConnectionError("down")
+            for key in args[:count]:
+                self.versions[key] = self.versions.get(key, 0) + 1
+
+        def mget(self, *keys):
+            return [self.versions.get(key) for key in keys]
+
+    cache = _cache()
+    cache._redis = FakeRedis(up=False)
+    cache.bump([3])
+    assert cache.index_version(fund_id=3) is None
+
+    redis_back = FakeRedis(up=True)
+    cache._redis, cache._redis_retry_at = redis_back, 0.0
+    assert cache.index_version(fund_id=3) == "0.1"
+    assert redis_back.versions == {"index_version:all": 1, "index_version:fund:3": 1}
+    assert cache.index_version(fund_id=3) == "0.1"  # replayed once
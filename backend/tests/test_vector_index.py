@@ -0,0 +1,251 @@
+from types import SimpleNamespace
+import pytest
+import numpy as np
+from app.services.vector_index import InMemoryVectorIndex
+
+
+def _random_vectors(n, dim, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_search_matches_brute_force():
+    """Top-k equals a full cosine-similarity sort"""
+    vectors = _random_vectors(500, 32)
+    index = InMemoryVectorIndex(dimension=32, capacity=16)
+    index.add(range(1, 501), vectors, [i % 5 for i in range(500)])
+
+    query = _random_vectors(1, 32, seed=1)[0]
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:10] + 1
+
+    hits = index.search(query, k=10)
+    assert [chunk_id for chunk_id, _ in hits] == expected.tolist()
+    assert hits[0][1] >= hits[-1][1]
+
+
+def test_incremental_add_remove_and_filter():
+    """Upserts replace rows, removals compact the matrix, filters restrict candidates"""
+    index = InMemoryVectorIndex(dimension=4)
+    index.add([1, 2, 3], np.eye(4)[:3], [10, 10, 20])
+    assert len(index) == 3
+
+    # Re-adding chunk 1 replaces its vector instead of duplicating it
+    index.add([1], np.eye(4)[3:4], [10])
+    assert len(index) == 3
+    assert index.search(np.eye(4)[3], k=1) == [(1, 1.0)]
+
+    assert index.remove_document(10) == 2
+    assert index.ids.tolist() == [3]
+    assert index.search(np.eye(4)[2], k=5, document_id=10) == []
+    assert index.search(np.eye(4)[2], k=5, document_id=20) == [(3, 1.0)]
+
+
+def test_mmap_generation_roundtrip(tmp_path, monkeypatch):
+    """A published generation is served by the mmap reader with the same results"""
+    from app.core.config import settings
+    from app.services import mmap_vector_index as mmap_index
+
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path))
+    version = SimpleNamespace(id=7, dimension=32)
+    assert mmap_index.get_mmap_index(version) is None
+
+    vectors = _random_vectors(300, 32)
+    base = mmap_index.index_dir(version.id)
+    writer = mmap_index._GenerationWriter(f"{base}/gen_1", 32)
+    writer.write(list(range(1, 301)), [i % 3 for i in range(300)], vectors)
+    writer.close(version.id, None)
+    mmap_index._publish(base, f"{base}/gen_1")
+
+    memory = InMemoryVectorIndex(dimension=32)
+    memory.add(range(1, 301), vectors, [i % 3 for i in range(300)])
+    query = _random_vectors(1, 32, seed=2)[0]
+
+    reader = mmap_index.get_mmap_index(version)
+    assert len(reader) == 300
+    assert [i for i, _ in reader.search(query, k=5)] == [i for i, _ in memory.search(query, k=5)]
+    assert [i for i, _ in reader.search(query, k=5, document_id=1)] == \
+        [i for i, _ in memory.search(query, k=5, document_id=1)]
+    candidates = list(range(50, 120))
+    assert [i for i, _ in reader.search(query, k=5, chunk_ids=candidates)] == \
+        [i for i, _ in memory.search(query, k=5, chunk_ids=candidates)]
+
+
+def test_mmap_refresh_appends_new_chunks(tmp_path, monkeypatch):
+    """Adding chunks appends to the shared vector file; a delete rewrites it"""
+    import os
+    from datetime import datetime, timedelta
+    from app.core.config import settings
+    from app.services import mmap_vector_index as mmap_index
+
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path))
+    vectors = _random_vectors(130, 16)
+    rows = {}  # chunk_id -> (document_id, vector, updated_at)
+
+    def fake_batches(db, version_id, since):
+        ids = sorted(i for i, row in rows.items() if since is None or row[2] > since)
+        if ids:
+            yield ids, [rows[i][0] for i in ids], np.stack([rows[i][1] for i in ids]), \
+                max(rows[i][2] for i in ids)
+
+    monkeypatch.setattr(mmap_index, "iter_embedding_batches", fake_batches)
+    db = SimpleNamespace(execute=lambda stmt: [SimpleNamespace(chunk_id=i) for i in rows])
+    version = SimpleNamespace(id=3, dimension=16)
+    start = datetime(2024, 1, 1)
+
+    rows.update({i: (i % 4, vectors[i - 1], start + timedelta(seconds=i)) for i in range(1, 101)})
+    first = mmap_index.refresh_mmap_index(db, version)
+    # New chunks, plus rows re-read because of the watermark overlap
+    rows.update({i: (9, vectors[i - 1], start + timedelta(seconds=200 + i)) for i in range(101, 131)})
+    second = mmap_index.refresh_mmap_index(db, version)
+
+    assert os.path.samefile(f"{first}/vectors.f32", f"{second}/vectors.f32")
+    memory = InMemoryVectorIndex(dimension=16)
+    memory.add(list(rows), np.stack([row[1] for row in rows.values()]), [row[0] for row in rows.values()])
+    reader = mmap_index.MmapVectorIndex(second)
+    query = _random_vectors(1, 16, seed=5)[0]
+    assert len(reader) == 130
+    assert [i for i, _ in reader.search(query, k=10)] == [i for i, _ in memory.search(query, k=10)]
+    assert len(mmap_index.MmapVectorIndex(first)) == 100
+
+    del rows[5]
+    third = mmap_index.refresh_mmap_index(db, version)
+    assert not os.path.samefile(f"{second}/vectors.f32", f"{third}/vectors.f32")
+    assert 5 not in mmap_index.MmapVectorIndex(third).ids
+    assert len(mmap_index.MmapVectorIndex(third)) == 129
+
+
+def test_candidate_chunk_ids_restrict_search():
+    """Filtered searches score only the candidate chunks"""
+    index = InMemoryVectorIndex(dimension=4)
+    index.add([1, 2, 3], np.eye(4)[:3], [10, 10, 20])
+
+    query = np.array([1.0, 0.5, 0.2, 0.0])
+
+    assert [i for i, _ in index.search(query, k=3)] == [1, 2, 3]
+    assert [i for i, _ in index.search(query, k=3, chunk_ids=[3, 2, 99])] == [2, 3]
+    assert [i for i, _ in index.search(query, k=3, chunk_ids=[2, 3], document_id=20)] == [3]
+    assert index.search(query, k=3, chunk_ids=[]) == []
+
+
+def test_chunk_filter_sql():
+    """filter_metadata keys become indexed document_chunks conditions"""
+    from app.services.vector_backends import ChunkFilter
+
+    assert not ChunkFilter.from_metadata(None)
+    assert ChunkFilter.from_metadata({"document_id": 3}).document_only
+    chunk_filter = ChunkFilter.from_metadata(
+        {"fund_id": 1, "page_from": 2, "page_to": 5, "table_type": "distribution"}
+    )
+    assert not chunk_filter.document_only
+    where_clause, params = chunk_filter.where_sql("dc")
+    assert where_clause == (
+        "dc.fund_id = :filter_fund_id "
+        "AND (dc.page >= :filter_page_from AND dc.page <= :filter_page_to OR (dc.pages IS NOT NULL "
+        "AND EXISTS (SELECT 1 FROM unnest(dc.pages) p WHERE p >= :filter_page_from AND p <= :filter_page_to))) "
+        "AND dc.chunk_type = ANY(:filter_chunk_types)"
+    )
+    assert params["filter_chunk_types"] == ["distribution"]
+
+
+def test_reciprocal_rank_fusion():
+    """Ids ranked well by both lists beat ids ranked first by only one"""
+    from app.services.vector_store import reciprocal_rank_fusion
+
+    fused = reciprocal_rank_fusion([[1, 2, 3], [4, 2, 5]], k=3, rrf_k=60)
+    assert [chunk_id for chunk_id, _ in fused] == [2, 1, 4]
+    assert fused[0][1] == 1 / 62 + 1 / 62
+    assert reciprocal_rank_fusion([[], []], k=3) == []
+
+
+def test_faiss_index_merges_delta(tmp_path):
+    """Rows written after the build are served from the exact delta, overriding stale vectors"""
+    faiss = pytest.importorskip("faiss")
+    from app.services import faiss_vector_index
+
+    vectors = _random_vectors(400, 16)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    path = str(tmp_path / "v1_hnsw")
+    faiss.write_index(faiss_vector_index.create_index("hnsw", vectors, np.arange(1, 401)), path + ".faiss")
+    with open(path + ".json", "w") as f:
+        f.write('{"version_id": 1, "kind": "hnsw", "dimension": 16, "count": 400, "watermark": null}')
+
+    index = faiss_vector_index.FaissVectorIndex(path, "hnsw")
+    assert index.search(vectors[9], k=1)[0][0] == 10
+
+    # Chunk 10 re-embedded to point elsewhere, chunk 500 added since the build
+    index.delta.add([10, 500], np.stack([-vectors[9], vectors[9]]), [1, 1])
+    hits = dict(index.search(vectors[9], k=5))
+    assert hits[500] == pytest.approx(1.0)
+    assert 10 not in hits
+
+
+def test_batch_search_matches_single_queries():
+    """One matrix product over many queries returns the same top-k as per-query search"""
+    vectors = _random_vectors(300, 16)
+    index = InMemoryVectorIndex(dimension=16)
+    index.add(range(1, 301), vectors, [i % 4 for i in range(300)])
+    queries = _random_vectors(40, 16, seed=3)
+
+    for kwargs in ({}, {"document_id": 2, "chunk_ids": range(1, 150)}):
+        batched = index.search_batch(queries, k=5, **kwargs)
+        for query, hits in zip(queries, batched):
+            single = index.search(query, k=5, **kwargs)
+            # Near-ties may swap order across BLAS code paths; the top-k set may not change
+            assert {i for i, _ in hits} == {i for i, _ in single}
+            assert [s for _, s in hits] == pytest.approx([s for _, s in single], abs=1e-5)
+
+
+def test_quantized_candidates_contain_exact_top_k():
+    """int8 and binary candidates rescored exactly give the exact top-k"""
+    from app.services.quantized_vector_index import QuantizedVectorIndex
+    from app.services.vector_index import top_k
+
+    vectors = _random_vectors(2000, 64)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = InMemoryVectorIndex(dimension=64)
+    exact.add(range(2000), vectors, [i % 5 for i in range(2000)])
+    query = _random_vectors(1, 64, seed=4)[0]
+
+    for method in ("int8", "binary"):
+        index = QuantizedVectorIndex(dimension=64, method=method)
+        index.add(range(2000), vectors, [i % 5 for i in range(2000)])
+        candidates = index.candidates(query, 400)
+        rescored = top_k(vectors[candidates] @ query, candidates, 5, -1.0)
+        assert [i for i, _ in rescored] == [i for i, _ in exact.search(query, 5)]
+
+        # Filters restrict the candidate set like in InMemoryVectorIndex
+        assert set(index.candidates(query, 50, document_id=3).tolist()) <= set(range(3, 2000, 5))
+        assert index.remove_document(3) == 400 and len(index) == 1600
+
+
+def test_index_snapshot_restore(tmp_path, monkeypatch):
+    """A restored snapshot has the same rows, and its watermark bounds the replay"""
+    from datetime import datetime
+    from app.core.config import settings
+    from app.services import vector_index
+
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path))
+    monkeypatch.setattr(vector_index, "_states", {})
+    version = SimpleNamespace(id=7, dimension=16)
+    vectors = _random_vectors(50, 16)
+
+    for quantization in ("none", "int8"):
+        state = vector_index._IndexState(version, quantization)
+        state.index.add(range(1, 51), vectors, [i % 3 for i in range(50)])
+        state.watermark = datetime(2026, 1, 2, 3, 4, 5)
+        vector_index._states[quantization] = state
+        assert vector_index.save_index_snapshot(state)
+        # Unchanged since the last snapshot: nothing is rewritten
+        assert vector_index.save_index_snapshot(state) is None
+
+        restored = vector_index._IndexState(version, quantization)
+        assert vector_index._load_index_snapshot(restored)
+        assert restored.watermark == state.watermark
+        assert restored.index.ids.tolist() == state.index.ids.tolist()
+        assert 42 in restored.index and len(restored.index) == 50
+        assert restored.index.remove_document(1) == 17
+
+    query = _random_vectors(1, 16, seed=5)[0]
+    assert restored.index.candidates(query, 5).size == 5
+    # A snapshot of another version is ignored
+    assert not vector_index._load_index_snapshot(vector_index._IndexState(SimpleNamespace(id=8, dimension=16)))